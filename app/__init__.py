@@ -98,6 +98,38 @@ def create_app():
     except Exception as idx_err:
         app.logger.warning(f"Could not create trade_marketplace indexes: {idx_err}")
     
+    # TTL de las claves de idempotencia de apertura de cofres
+    try:
+        from app.utils.idempotency import IDEMPOTENCY_TTL
+        mongo.idempotency_keys.create_index(
+            "created_at",
+            expireAfterSeconds=IDEMPOTENCY_TTL,
+            background=True,
+        )
+    except Exception as idx_err:
+        app.logger.warning(f"Could not create idempotency_keys index: {idx_err}")
+    
+    # Historial de cambios de inventario (delta sync)
+    try:
+        from app.utils.inventory import INVENTORY_LOG_TTL
+        mongo.inventory_log.create_index(
+            [("email", 1), ("version", 1)],
+            unique=True,
+            background=True,
+        )
+        mongo.inventory_log.create_index(
+            "at",
+            expireAfterSeconds=INVENTORY_LOG_TTL,
+            background=True,
+        )
+    except Exception as idx_err:
+        app.logger.warning(f"Could not create inventory_log indexes: {idx_err}")
+    
+    # Precargar cachés compartidas para que no las pague el primer usuario
+    from app.utils.warmup import WARMUP_ENABLED, run_warmup
+    if WARMUP_ENABLED:
+        run_warmup()
+    
     # Registrar template helpers para optimización de imágenes
     from app.utils.template_helpers import register_template_helpers
     register_template_helpers(app)
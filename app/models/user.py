@@ -1,34 +1,133 @@
 from flask_login import UserMixin
 from app import mongo, bcrypt, login_manager
 from bson.objectid import ObjectId
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timezone
+from collections import OrderedDict
 import logging
+import os
+import threading
+import time
+
+from app.utils.cache_manager import NEGATIVE
+from app.utils.cache_metrics import payload_size
 
 logger = logging.getLogger(__name__)
 
 # Caché in-process para user_loader (evita hit a MongoDB en cada request)
 # En Vercel serverless se pierde en cold starts, pero dentro de una misma
 # instancia (que puede manejar múltiples requests) ahorra ~50-200ms/req.
-_user_cache: Dict[str, Dict[str, Any]] = {}
+# Guarda solo el registro de login (``LOGIN_PROJECTION``), no el documento
+# con los ``coleccionables`` de cada guild; LRU con TTL y tope de bytes.
 _USER_CACHE_MAX = 200  # Máximo de usuarios en caché
+USER_CACHE_TTL: int = int(os.getenv("USER_CACHE_TTL", "300"))
+USER_CACHE_MAX_BYTES: int = int(os.getenv("USER_CACHE_MAX_BYTES", str(512 * 1024)))
 
+# Ids sin usuario (cookies de cuentas borradas, clientes con sesiones viejas):
+# se recuerdan como ``NEGATIVE`` un rato para no consultar MongoDB en cada request
+MISSING_USER_TTL: int = 60
 
-def _cache_user(user_id: str, user_data: Dict[str, Any]) -> None:
-    """Almacena datos de usuario en caché in-process."""
-    if len(_user_cache) >= _USER_CACHE_MAX:
-        # Evictar la primera entrada (FIFO simple)
-        try:
-            first_key = next(iter(_user_cache))
-            del _user_cache[first_key]
-        except StopIteration:
-            pass
-    _user_cache[user_id] = user_data
+# Campos que necesita ``current_user``; los guilds van sin ``coleccionables``
+LOGIN_PROJECTION: Dict[str, int] = {
+    "username": 1,
+    "email": 1,
+    "password": 1,
+    "is_admin": 1,
+    "discord_id": 1,
+    "pfp": 1,
+    "registration_method": 1,
+    "deny_code_reward": 1,
+    "guilds.id": 1,
+    "guilds.name": 1,
+    "guilds.icon": 1,
+}
+
+
+class _LoginRecordCache:
+    """LRU de registros de login con TTL y presupuesto aproximado en bytes (thread-safe)."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, user_id: str) -> Any:
+        """Registro cacheado, ``NEGATIVE`` si se sabe que no existe, o None."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            record, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                self._pop(user_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            if record is NEGATIVE:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return record
+
+    def set(self, user_id: str, record: Any, ttl: Optional[int] = None) -> None:
+        size = payload_size(record) or 0
+        with self._lock:
+            self._pop(user_id)
+            if size > self.max_bytes:
+                return
+            self._entries[user_id] = (record, time.monotonic() + (ttl or self.ttl), size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, user_id: str) -> None:
+        with self._lock:
+            self._pop(user_id)
+
+    def _pop(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.negative_hits) * 100 / lookups, 2) if lookups else 0.0,
+            }
+
+
+_user_cache = _LoginRecordCache(_USER_CACHE_MAX, USER_CACHE_MAX_BYTES, USER_CACHE_TTL)
 
 
 def invalidate_user_cache(user_id: str) -> None:
     """Invalida la caché de un usuario específico. Llamar tras update de perfil."""
-    _user_cache.pop(str(user_id), None)
+    _user_cache.delete(str(user_id))
+
+
+def get_user_cache_stats() -> Dict[str, Any]:
+    """Aciertos, fallos, bytes y expulsiones de la caché de ``user_loader``."""
+    return _user_cache.stats()
 
 
 class User(UserMixin):
@@ -63,19 +162,26 @@ class User(UserMixin):
 
     @staticmethod
     def get_by_id(user_id: str) -> Optional['User']:
-        """Obtiene un usuario por su ID, usando caché in-process."""
+        """Obtiene un usuario por su ID, usando caché in-process.
+
+        El usuario devuelto lleva el registro de login (``LOGIN_PROJECTION``):
+        sus guilds no incluyen ``coleccionables``.
+        """
         user_id_str = str(user_id)
         
         # Intentar caché primero
         cached = _user_cache.get(user_id_str)
+        if cached is NEGATIVE:
+            return None
         if cached is not None:
             return User._from_dict(cached)
         
         try:
-            user_data = mongo.users.find_one({"_id": ObjectId(user_id)})
+            user_data = mongo.users.find_one({"_id": ObjectId(user_id)}, LOGIN_PROJECTION)
             if user_data:
-                _cache_user(user_id_str, user_data)
+                _user_cache.set(user_id_str, user_data)
                 return User._from_dict(user_data)
+            _user_cache.set(user_id_str, NEGATIVE, ttl=MISSING_USER_TTL)
         except Exception as e:
             logger.error(f"Error en get_by_id: {e}")
         return None
@@ -165,7 +271,11 @@ class User(UserMixin):
         return None
     
     def get_top_servers(self, limit: int = 6) -> List[Dict[str, Any]]:
-        """Devuelve los servidores con más coleccionables."""
+        """Devuelve los servidores con más coleccionables.
+
+        Requiere el documento completo (``get_by_email``...): el usuario de
+        ``user_loader`` no trae los ``coleccionables``.
+        """
         sorted_servers = sorted(
             self.guilds,
             key=lambda x: len(x.get('coleccionables', [])),
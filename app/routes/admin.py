@@ -5,15 +5,32 @@ from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
 from typing import Any, Dict, List
 
-from flask import Blueprint, current_app, render_template, request, jsonify
+from flask import Blueprint, Response, current_app, render_template, request, jsonify
 from flask_login import login_required, current_user
 from bson.objectid import ObjectId
 
 from app import mongo, bcrypt
 from app.utils.adminRequired import admin_required
 from app.utils.images import get_images
-from app.utils.cache_manager import safe_memoize, safe_delete_memoized
+from app.utils.cache_manager import (
+    get_cache_metrics,
+    get_cache_metrics_prometheus,
+    invalidate_user_caches,
+    safe_memoize,
+    safe_delete_memoized,
+    shared_cache_enabled,
+)
 from app.models.user import invalidate_user_cache
+from app.utils.catalog import bump_catalog_version, get_catalog, get_catalog_version
+from app.utils.http_cache import PRIVATE_REVALIDATE, etag_cached
+from app.utils.chest_inventory import (
+    get_chest_counts,
+    migrate_all_chest_inventories,
+    reset_chest_updates,
+    total_chests,
+)
+from app.utils.inventory import apply_inventory_update
+from app.utils.write_behind import get_write_behind_stats
 
 
 MADRID_TZ = ZoneInfo("Europe/Madrid")
@@ -40,38 +57,23 @@ GITHUB_BRANCH = os.environ.get("GITHUB_BRANCH", "development")
 admin_bp = Blueprint("admin", __name__)
 
 
-@safe_memoize(timeout=600)  # 10 minutos de caché
-def get_all_cards_cached():
-    """Obtiene todas las cartas con caché para admin"""
-    try:
-        cards = list(mongo.collectables.find())
-        # Serializar ObjectIds
-        for card in cards:
-            card["_id"] = str(card["_id"])
-        return cards
-    except Exception as e:
-        current_app.logger.error(f"Error getting cards: {e}")
-        return []
-
-
-@safe_memoize(timeout=1200)  # 20 minutos de caché
 def get_all_collections_cached():
-    """Obtiene todas las colecciones con caché para admin"""
+    """Obtiene todas las colecciones para admin desde el snapshot del catálogo"""
     try:
-        collections = list(mongo.collections.find())
-        
-        # Serializar ObjectIds
-        for collection in collections:
-            if collection.get("_id"):
-                collection["_id"] = str(collection["_id"])
-        
-        return collections
+        return get_catalog().collections
     except Exception as e:
         current_app.logger.error(f"Error getting collections: {e}")
         return []
 
 
-@safe_memoize(timeout=300)  # 5 minutos de caché
+# Lista grande y poco leída: comprimida ocupa menos de la mitad en disco, pero
+# en memoria solo añadiría una descompresión por lectura
+@safe_memoize(
+    timeout=900,
+    soft_ttl=300,
+    serializer="pickle+zlib" if shared_cache_enabled() else None,
+    max_bytes=8 * 1024 * 1024,
+)  # 5 min frescos, 15 min como máximo
 def get_all_users_cached():
     """Obtiene todos los usuarios con caché para admin"""
     try:
@@ -81,21 +83,19 @@ def get_all_users_cached():
         # Serializar ObjectIds
         for user in users:
             user["_id"] = str(user["_id"])
+            user["chest_total"] = total_chests(user)
         return users
     except Exception as e:
         current_app.logger.error(f"Error getting users: {e}")
         return []
 
 
-def invalidate_cards_cache():
-    """Invalida el caché de cartas cuando se modifican"""
-    safe_delete_memoized(get_all_cards_cached)
-    safe_delete_memoized(get_all_collections_cached)
-
+def invalidate_catalog():
+    """Publica una nueva versión del catálogo tras modificar cartas o colecciones.
 
-def invalidate_collections_cache():
-    """Invalida el caché de colecciones cuando se modifican"""
-    safe_delete_memoized(get_all_collections_cached)
+    Llamar una sola vez por mutación: cada llamada recarga el snapshot completo.
+    """
+    bump_catalog_version()
 
 
 def invalidate_users_cache():
@@ -114,31 +114,27 @@ def admin_panel():
 @admin_bp.route("/api/admin/cartas", methods=['GET'])
 @login_required
 @admin_required
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
 def api_cartas():
-    """API para obtener cartas con caché. Pre-carga colecciones para evitar N+1."""
+    """API para obtener cartas desde el snapshot del catálogo, con su colección embebida."""
     try:
-        cartas = get_all_cards_cached()
+        catalog = get_catalog()
+        cartas = catalog.cards
         
         # Filtrar por colección si se especifica
         coleccion_id = request.args.get('coleccion')
         if coleccion_id:
-            try:
-                from bson import ObjectId
-                coleccion_oid = ObjectId(coleccion_id)
-                cartas = [carta for carta in cartas if carta.get('coleccion') == coleccion_oid]
-            except Exception:
-                pass
+            cartas = catalog.cards_by_collection.get(coleccion_id, [])
         
-        # Pre-cargar TODAS las colecciones en un dict para evitar N+1
-        all_collections = list(mongo.collections.find({}))
-        collections_map = {}
-        for col in all_collections:
-            collections_map[col['_id']] = {
-                'id': str(col['_id']),
+        collections_map = {
+            col_id: {
+                'id': col_id,
                 'nombre': col['nombre'],
                 'descripcion': col.get('descripcion'),
                 'image': col.get('image')
             }
+            for col_id, col in catalog.collections_by_id.items()
+        }
         
         no_collection = {
             'id': None,
@@ -147,13 +143,11 @@ def api_cartas():
             'image': None
         }
         
-        # Mapear colecciones a cartas usando el dict pre-cargado
-        for carta in cartas:
-            col_id = carta.get('coleccion')
-            if col_id and col_id in collections_map:
-                carta['coleccion'] = collections_map[col_id]
-            else:
-                carta['coleccion'] = no_collection
+        # Copias con la colección embebida (el snapshot es compartido)
+        cartas = [
+            {**carta, 'coleccion': collections_map.get(carta.get('coleccion'), no_collection)}
+            for carta in cartas
+        ]
         
         return jsonify(cartas), 200
     except Exception as e:
@@ -163,6 +157,7 @@ def api_cartas():
 
 @admin_bp.route("/api/collections", methods=['GET'])
 @login_required
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
 def api_collections():
     """API para obtener colecciones con caché"""
     try:
@@ -236,6 +231,7 @@ def serialize_object_id(obj):
 
 @admin_bp.route("/api/colecciones", methods=["GET"])
 @login_required
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
 def obtener_colecciones():
     try:
         colecciones = get_all_collections_cached()
@@ -275,7 +271,7 @@ def crear_carta():
         result = mongo.collectables.insert_one(nueva_carta)
         
         # Invalidar caché después de crear
-        invalidate_cards_cache()
+        invalidate_catalog()
         
         return jsonify({"message": "Carta creada", "id": str(result.inserted_id)}), 201
     except ValueError as ve:
@@ -323,7 +319,7 @@ def actualizar_carta(id):
             )
             
             # Invalidar caché después de actualizar
-            invalidate_cards_cache()
+            invalidate_catalog()
             
             if result.modified_count == 0:
                 # Verificar si la carta existe pero no se modificó
@@ -355,7 +351,7 @@ def crear_coleccion():
         result = mongo.collections.insert_one(nueva_coleccion)
         
         # Invalidar caché después de crear
-        invalidate_collections_cache()
+        invalidate_catalog()
         
         return jsonify(
             {"message": "Colección creada", "id": str(result.inserted_id)}
@@ -421,6 +417,7 @@ def api_coleccion(id):
                         return jsonify(
                             {"error": "No se pudo actualizar la colección"}
                         ), 400
+                invalidate_catalog()
                 return jsonify({"message": "Colección actualizada", "id": id}), 200
             else:
                 return jsonify(
@@ -438,6 +435,7 @@ def api_coleccion(id):
             return jsonify({"error": "No se pudo eliminar la colección"}), 400
         # Eliminar todas las cartas asociadas a esta colección
         mongo.collectables.delete_many({"coleccion": ObjectId(id)})
+        invalidate_catalog()
         return jsonify({"message": "Colección y cartas asociadas eliminadas"})
     # Ensure a valid response is always returned
     return jsonify({"error": "Método no permitido"}), 405
@@ -575,19 +573,19 @@ def upload_image():
                 {"_id": ObjectId(id)}, {"$set": {"image": image_url}}
             )
             # Invalidar caché después de actualizar imagen de colección
-            invalidate_collections_cache()
+            invalidate_catalog()
         elif tipo == "carta_reverso":
             mongo.collectables.update_one(
                 {"_id": ObjectId(id)}, {"$set": {"reverso": image_url}}
             )
             # Invalidar caché después de actualizar imagen de reverso
-            invalidate_cards_cache()
+            invalidate_catalog()
         else:
             mongo.collectables.update_one(
                 {"_id": ObjectId(id)}, {"$set": {"image": image_url}}
             )
             # Invalidar caché después de actualizar imagen de carta
-            invalidate_cards_cache()
+            invalidate_catalog()
 
         return jsonify({"message": "Imagen subida exitosamente", "url": image_url})
     except Exception as e:
@@ -626,7 +624,7 @@ def eliminar_carta(id):
         mongo.collectables.delete_one({"_id": ObjectId(id)})
         
         # Invalidar caché después de eliminar
-        invalidate_cards_cache()
+        invalidate_catalog()
         
         return jsonify({"message": "Carta eliminada"})
     return jsonify({"error": "Carta no encontrada"}), 404
@@ -647,8 +645,7 @@ def eliminar_coleccion(id):
         mongo.collectables.delete_many({"coleccion": ObjectId(id)})
         
         # Invalidar caché después de eliminar
-        invalidate_collections_cache()
-        invalidate_cards_cache()  # También invalidar cartas porque se eliminaron cartas asociadas
+        invalidate_catalog()  # Una sola versión nueva cubre la colección y sus cartas
         
         return jsonify({"message": "Colección y cartas asociadas eliminadas"})
     return jsonify({"error": "Colección no encontrada"}), 404
@@ -883,9 +880,12 @@ def reset_usuario(id: str) -> tuple:
         summary: Dict[str, int] = {}
 
         if reset_type in ("chests", "all"):
-            old_chests = user.get("chests", [])
-            summary["chests_removed"] = len(old_chests)
-            updates["chests"] = []
+            summary["chests_removed"] = sum(
+                amount
+                for by_rarity in get_chest_counts(user).values()
+                for amount in by_rarity.values()
+            )
+            updates.update(reset_chest_updates())
 
         if reset_type in ("cards", "all"):
             total_cards = 0
@@ -896,7 +896,15 @@ def reset_usuario(id: str) -> tuple:
             summary["cards_removed"] = total_cards
             updates["guilds"] = guilds
 
-        if updates:
+        if updates and "guilds" in updates:
+            apply_inventory_update(
+                {"_id": ObjectId(id)},
+                {"$set": updates},
+                user["email"],
+                None,
+                reset=True,
+            )
+        elif updates:
             mongo.users.update_one(
                 {"_id": ObjectId(id)},
                 {"$set": updates},
@@ -904,6 +912,7 @@ def reset_usuario(id: str) -> tuple:
 
         invalidate_users_cache()
         invalidate_user_cache(id)
+        invalidate_user_caches(user["email"])
 
         return jsonify({"message": "Datos reseteados", "summary": summary}), 200
 
@@ -912,6 +921,41 @@ def reset_usuario(id: str) -> tuple:
         return jsonify({"error": "Error interno del servidor"}), 500
 
 
+@admin_bp.route("/api/admin/chests/migrate", methods=["POST"])
+@login_required
+@admin_required
+def migrate_chest_inventories() -> tuple:
+    """Migra el array legado ``chests`` de todos los usuarios a contadores."""
+    try:
+        summary = migrate_all_chest_inventories()
+        invalidate_users_cache()
+        return jsonify({"message": "Migración completada", "summary": summary}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error migrating chest inventories: {e}", exc_info=True)
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+
+@admin_bp.route("/api/admin/write-behind/stats", methods=["GET"])
+@login_required
+@admin_required
+def write_behind_stats() -> tuple:
+    """Profundidad y latencia de vaciado del buffer de logs."""
+    return jsonify(get_write_behind_stats()), 200
+
+
+@admin_bp.route("/api/admin/cache/metrics", methods=["GET"])
+@login_required
+@admin_required
+def cache_metrics():
+    """Métricas de caché por función; ``?format=prometheus`` para texto de Prometheus."""
+    if request.args.get("format") == "prometheus":
+        return Response(
+            get_cache_metrics_prometheus(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+    return jsonify(get_cache_metrics()), 200
+
+
 # =============================================================================
 # EVENTOS – CRUD
 # =============================================================================
@@ -11,12 +11,18 @@ from flask import (
     jsonify,
 )
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models.user import User
+from app.models.user import User, invalidate_user_cache
 from app import bcrypt, mongo
 import logging
 
 from app.utils.validation_utils import validate_user_input
 from app.utils.images import get_images
+from app.utils.cache_manager import invalidate_user_caches
+from app.utils.inventory import VERSION_FIELD, apply_inventory_update, version_guard
+
+logger = logging.getLogger(__name__)
+
+_GUILD_SYNC_MAX_RETRIES = 5
 
 # Permitir OAuth sin HTTPS en desarrollo
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
@@ -29,6 +35,41 @@ API_BASE_URL = "https://discord.com/api"
 auth_bp = Blueprint("auth", __name__)
 
 
+def _sync_discord_guilds(user: User, discord_data, guilds_data) -> bool:
+    """Guarda los guilds de Discord del usuario conservando sus coleccionables.
+
+    El array ``guilds`` se reescribe entero (con las cartas de cada guild),
+    así que la escritura exige la versión de inventario leída y la sube; los
+    guilds que el usuario abandonó se llevan sus cartas, lo que se anota como
+    un reset para que clientes y estadísticas se resincronicen.
+    """
+    for _ in range(_GUILD_SYNC_MAX_RETRIES):
+        user_doc = mongo.users.find_one({"_id": user._id}, {"guilds": 1, VERSION_FIELD: 1})
+        if not user_doc:
+            return False
+        user.guilds = user_doc.get("guilds") or []
+        user.update_discord_info(discord_data, guilds_data)
+
+        kept = {guild["id"] for guild in user.guilds}
+        dropped_cards = any(
+            guild.get("coleccionables")
+            for guild in user_doc.get("guilds") or []
+            if guild.get("id") not in kept
+        )
+        version = apply_inventory_update(
+            {"_id": user._id, **version_guard(int(user_doc.get(VERSION_FIELD, 0) or 0))},
+            {"$set": {"discord_id": user.discord_id, "pfp": user.pfp, "guilds": user.guilds}},
+            user.email,
+            None,
+            reset=dropped_cards,
+        )
+        if version is not None:
+            return True
+
+    logger.warning(f"Could not sync Discord guilds for {user.email} after retries")
+    return False
+
+
 def token_updater(token):
     session["oauth2_token"] = token
 
@@ -160,17 +201,9 @@ def discord_callback():
         if existing_user:
             # Actualizar información del usuario existente
             existing_user.discord_id = user_data["id"]
-            existing_user.update_discord_info(user_data, guilds_data)
-            mongo.users.update_one(
-                {"_id": existing_user._id},
-                {
-                    "$set": {
-                        "discord_id": existing_user.discord_id,
-                        "pfp": existing_user.pfp,
-                        "guilds": existing_user.guilds,
-                    }
-                },
-            )
+            _sync_discord_guilds(existing_user, user_data, guilds_data)
+            invalidate_user_cache(existing_user._id)
+            invalidate_user_caches(existing_user.email)
             login_user(existing_user)
         else:
             new_user = User.create_from_discord(user_data)
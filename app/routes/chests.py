@@ -1,21 +1,33 @@
 # File: app/routes/chests.py
 from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required, current_user
-import random
 from datetime import datetime, timezone
 from bson import ObjectId
-from collections import Counter
 import logging
 from typing import Dict, Any, List, Optional
 
 from app.utils.images import get_images
-from app.utils.cache_manager import safe_memoize, safe_delete_memoized
-from app.routes.coleccion import get_user_collectibles_data
+from app.utils.cache_manager import invalidate_user_caches
+from app.utils.card_pool import get_card_pool
+from app.utils.catalog import get_catalog_version
+from app.utils.chest_draws import draw_cards_bulk
+from app.utils.chest_inventory import (
+    available_chests,
+    consume_chests,
+    counts_to_entries,
+    fold_legacy_chests,
+    get_chest_counts,
+)
+from app.utils.transactions import run_in_transaction, supports_transactions
+from app.utils.idempotency import idempotent
+from app.utils.http_cache import PUBLIC_SHORT, etag_cached
+from app.utils.write_behind import buffered_insert
 from app.utils.game_config import (
     get_chest_config as _yaml_chest_config,
-    get_card_rarities as _yaml_card_rarities,
+    get_chest_sampler as _yaml_chest_sampler,
     get_rarity_colors as _yaml_rarity_colors,
     get_chest_images as _yaml_chest_images,
+    get_game_config_version as _yaml_config_version,
 )
 from app import mongo, cache
 
@@ -40,40 +52,37 @@ def serialize_doc(doc):
         return doc
 
 
-@safe_memoize(timeout=600)  # Cache por 10 minutos
+_CHEST_SUMMARY_PROJECTION = {
+    "chests": 1,
+    "chest_counts": 1,
+    "guilds.id": 1,
+    "guilds.name": 1,
+    "guilds.icon": 1,
+}
+
+
 def get_user_chests_data(email: str) -> Dict[str, Any]:
-    """Obtiene los datos de cofres del usuario con caché"""
-    user_data = mongo.users.find_one({"email": email})
-    if not user_data or "chests" not in user_data:
+    """Obtiene los cofres del usuario desde el resumen materializado ``chest_counts``.
+
+    Es una sola lectura proyectada (sin ``coleccionables``), así que no se
+    memoiza: las aperturas, recompensas y resets se ven al instante.
+    """
+    user_data = mongo.users.find_one({"email": email}, _CHEST_SUMMARY_PROJECTION)
+    if not user_data:
         return {"user_chests": [], "guild_mapping": {}}
+
+    if user_data.get("chests"):
+        # Cofres concedidos por el bot al array legado: se pliegan una vez
+        if fold_legacy_chests({"_id": user_data["_id"]}):
+            user_data = mongo.users.find_one(
+                {"_id": user_data["_id"]}, _CHEST_SUMMARY_PROJECTION
+            ) or user_data
     
     rarity_colors = _yaml_rarity_colors()
 
-    # Obtener cofres con conteo
-    chest_id_list: List[str] = user_data.get("chests", [])
-    chest_counts: Dict[str, int] = dict(Counter(chest_id_list))
-    unique_ids = [ObjectId(_id) for _id in chest_counts.keys()]
-    chests_docs = list(mongo.chests.find({"_id": {"$in": unique_ids}}))
-    
-    # Procesar datos de cofres
-    grouped: Dict[tuple, Dict[str, Any]] = {}
-    for chest in chests_docs:
-        rarity = chest.get("rarity")
-        servidor = chest.get("servidor")
-        key = (rarity, servidor)
-        count = chest_counts.get(str(chest["_id"]), 0)
-        
-        if key in grouped:
-            grouped[key]["count"] += count
-        else:
-            grouped[key] = {
-                "chest_type": rarity,
-                "servidor": servidor,
-                "count": count,
-                "image": _get_image_url(rarity),
-            }
-    
-    user_chests: List[Dict[str, Any]] = list(grouped.values())
+    user_chests: List[Dict[str, Any]] = counts_to_entries(get_chest_counts(user_data))
+    for chest in user_chests:
+        chest["image"] = _get_image_url(chest["chest_type"])
     
     # Crear mapeo de servidores
     guild_mapping: Dict[str, Dict[str, str]] = {
@@ -127,6 +136,7 @@ def chests():
 
 @chest_bp.route("/api/open_chests", methods=["POST"])
 @login_required
+@idempotent("open_chests")
 def open_chests():
     """API para abrir cofres (síncrono)."""
     data = request.get_json(silent=True)
@@ -140,15 +150,12 @@ def open_chests():
     if chest_type not in _yaml_chest_config():
         return jsonify({"error": "Tipo de cofre inválido"}), 400
 
-    # Invalidar caché del usuario después de abrir cofre
-    safe_delete_memoized(get_user_chests_data, current_user.email)
-    safe_delete_memoized(get_user_collectibles_data, current_user.email)
+    # Invalidar caché de colección del usuario después de abrir cofre
+    invalidate_user_caches(current_user.email)
 
     try:
         result = _open_chests_sync(current_user.email, chest_type, server, quantity=1)
-        if "error" in result:
-            return jsonify(result), 400
-        return jsonify(result)
+        return _open_response(result, data.get("format") == "compact")
     except Exception as e:
         logger.error(f"Error opening chest: {e}", exc_info=True)
         return jsonify({"error": "Error interno al abrir cofre"}), 500
@@ -156,6 +163,7 @@ def open_chests():
 
 @chest_bp.route("/api/open_chests_multi", methods=["POST"])
 @login_required
+@idempotent("open_chests_multi")
 def open_chests_multi():
     """API para abrir 1 o N cofres del mismo tipo y servidor."""
     data = request.get_json(silent=True)
@@ -178,209 +186,194 @@ def open_chests_multi():
     if quantity < 1:
         return jsonify({"error": "La cantidad de cofres debe ser mayor a 0"}), 400
 
-    safe_delete_memoized(get_user_chests_data, current_user.email)
-    safe_delete_memoized(get_user_collectibles_data, current_user.email)
+    invalidate_user_caches(current_user.email)
 
     try:
         result = _open_chests_sync(current_user.email, chest_type, server, quantity=quantity)
-        if "error" in result:
-            return jsonify(result), 400
-        return jsonify(result)
+        return _open_response(result, data.get("format") == "compact")
     except Exception as e:
         logger.error(f"Error opening multiple chests: {e}", exc_info=True)
         return jsonify({"error": "Error interno al abrir cofres"}), 500
 
 
-def _open_chest_sync(email: str, chest_type: str, server: str) -> dict:
-    """Wrapper legado para abrir un cofre."""
-    return _open_chests_sync(email, chest_type, server, quantity=1)
-
-
-def _get_matching_user_chests(
-    user_chest_ids: List[str], chest_type: str, server: str
-) -> List[str]:
-    """Devuelve todas las ocurrencias de IDs de cofres del usuario que coinciden con tipo+servidor."""
-    if not user_chest_ids:
-        return []
-
-    object_ids: List[ObjectId] = []
-    for chest_id in set(user_chest_ids):
-        try:
-            object_ids.append(ObjectId(chest_id))
-        except Exception:
-            logger.warning(f"Invalid chest id found for user inventory: {chest_id}")
-
-    if not object_ids:
-        return []
-
-    matching_docs = list(
-        mongo.chests.find(
-            {
-                "_id": {"$in": object_ids},
-                "rarity": chest_type,
-                "servidor": server,
-            },
-            {"_id": 1},
-        )
-    )
+def _compact_results(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Formato compacto: IDs únicos con su número de copias y conteo por rareza.
+
+    Los datos completos de cada carta se obtienen del catálogo versionado
+    (``/api/catalog/cartas``); ``catalog_version`` indica qué versión usar.
+    """
+    id_counts: Dict[str, int] = {}
+    rarity_counts: Dict[str, int] = {}
+    missing: Dict[str, int] = {}
+    for card in results["cards"]:
+        rarity = card.get("rareza", "")
+        rarity_counts[rarity] = rarity_counts.get(rarity, 0) + 1
+        card_id = card.get("_id")
+        if card_id:
+            id_counts[card_id] = id_counts.get(card_id, 0) + 1
+        else:
+            missing[rarity] = missing.get(rarity, 0) + 1
+
+    return {
+        "format": "compact",
+        "chest_type": results["chest_type"],
+        "chests_opened": results["chests_opened"],
+        "catalog_version": get_catalog_version(),
+        "card_ids": list(id_counts.keys()),
+        "card_counts": list(id_counts.values()),
+        "rarity_counts": rarity_counts,
+        "missing": missing,
+    }
 
-    matching_id_set = {str(doc["_id"]) for doc in matching_docs}
-    if not matching_id_set:
-        return []
 
-    return [chest_id for chest_id in user_chest_ids if chest_id in matching_id_set]
+def _open_response(result: Dict[str, Any], compact: bool):
+    """Serializa el resultado de apertura en el formato pedido."""
+    if "error" in result:
+        return jsonify(result), 400
+    if compact:
+        return jsonify({"results": _compact_results(result["results"])})
+    return jsonify(result)
 
 
-def _remove_chest_occurrences(chest_ids: List[str], ids_to_remove: List[str]) -> List[str]:
-    """Elimina exactamente N ocurrencias de IDs, respetando duplicados."""
-    removal_counter: Dict[str, int] = dict(Counter(ids_to_remove))
-    remaining_ids: List[str] = []
-    for chest_id in chest_ids:
-        current_count = removal_counter.get(chest_id, 0)
-        if current_count > 0:
-            removal_counter[chest_id] = current_count - 1
-            continue
-        remaining_ids.append(chest_id)
-    return remaining_ids
+def _open_chest_sync(email: str, chest_type: str, server: str) -> dict:
+    """Wrapper legado para abrir un cofre."""
+    return _open_chests_sync(email, chest_type, server, quantity=1)
 
 
 def _draw_cards_for_chests(chest_type: str, chest_count: int) -> Dict[str, Any]:
-    """Sortea las cartas de N cofres usando la misma lógica de probabilidades actual."""
-    chest_cfg = _yaml_chest_config()
-    card_rarities = _yaml_card_rarities()
-    config = chest_cfg[chest_type]
+    """Sortea las cartas de N cofres en un único lote (multinomial por rareza)."""
+    config = _yaml_chest_config()[chest_type]
+    sampler = _yaml_chest_sampler(chest_type)
+    if sampler is None:
+        raise ValueError(f"No hay muestreador compilado para el cofre {chest_type}")
 
     total_cards = config["cards"] * chest_count
-    cards: List[Dict[str, Any]] = []
-    received_card_ids: List[str] = []
-
-    for _ in range(total_cards):
-        roll = random.uniform(0, 100)
-        cumulative = 0.0
-        selected_rarity = card_rarities[-1] if card_rarities else "comun"
-
-        for rarity, prob in zip(card_rarities, config["probabilities"]):
-            cumulative += prob
-            if roll <= cumulative:
-                selected_rarity = rarity
-                break
-
-        pipeline = [{"$match": {"rareza": selected_rarity}}, {"$sample": {"size": 1}}]
-        results = list(mongo.collectables.aggregate(pipeline))
-        if results:
-            card_doc = serialize_doc(results[0])
-            cards.append(card_doc)
-            if isinstance(card_doc, dict) and "_id" in card_doc:
-                received_card_ids.append(card_doc["_id"])
-        else:
-            cards.append({"nombre": f"Sin carta {selected_rarity}", "rareza": selected_rarity})
+    cards: List[Dict[str, Any]] = draw_cards_bulk(get_card_pool(), sampler, total_cards)
+    received_card_ids: List[str] = [card["_id"] for card in cards if "_id" in card]
 
     return {"cards": cards, "received_card_ids": received_card_ids}
 
 
-def _save_opening_history(
+def _build_opening_history(
     email: str,
     chest_type: str,
     server: str,
     cards: List[Dict[str, Any]],
     chests_opened: int,
-) -> None:
+) -> Dict[str, Any]:
+    """Construye la entrada de historial de una operación de apertura."""
+    history_cards: List[Dict[str, Any]] = []
+    for card in cards:
+        history_cards.append({
+            "card_id": card.get("_id", ""),
+            "nombre": card.get("nombre", ""),
+            "rareza": card.get("rareza", ""),
+            "coleccion": str(card.get("coleccion", "")),
+            "image": card.get("image", ""),
+        })
+
+    return {
+        "user_email": email,
+        "chest_type": chest_type,
+        "chest_source": server,
+        "chests_opened": chests_opened,
+        "cards_received": history_cards,
+        "opened_at": datetime.now(timezone.utc),
+    }
+
+
+def _save_opening_history(history_doc: Dict[str, Any]) -> None:
     """Guarda una sola entrada de historial por operación de apertura."""
     try:
-        history_cards: List[Dict[str, Any]] = []
-        for card in cards:
-            history_cards.append({
-                "card_id": card.get("_id", ""),
-                "nombre": card.get("nombre", ""),
-                "rareza": card.get("rareza", ""),
-                "coleccion": str(card.get("coleccion", "")),
-                "image": card.get("image", ""),
-            })
-
-        mongo.opening_history.insert_one({
-            "user_email": email,
-            "chest_type": chest_type,
-            "chest_source": server,
-            "chests_opened": chests_opened,
-            "cards_received": history_cards,
-            "opened_at": datetime.now(timezone.utc),
-        })
+        buffered_insert("opening_history", history_doc)
     except Exception as history_err:
         logger.warning(f"Failed to log chest opening history: {history_err}")
 
 
-def _open_chests_sync(email: str, chest_type: str, server: str, quantity: int) -> dict:
-    """Abre N cofres de forma síncrona con control básico de concurrencia."""
-    if quantity < 1:
-        return {"error": "Cantidad de cofres inválida"}
+class _ChestsChanged(Exception):
+    """El inventario cambió entre la lectura y la escritura; aborta la transacción."""
 
-    max_retries = 3
-    chest_ids_to_remove: List[str] = []
-    chests_to_open = 0
 
-    for attempt in range(max_retries):
-        user_data = mongo.users.find_one({"email": email}, {"chests": 1})
-        if not user_data:
-            return {"error": "Usuario no encontrado"}
+def _apply_opening(
+    email: str,
+    chest_type: str,
+    server: str,
+    chests_to_open: int,
+    received_card_ids: List[str],
+    history_doc: Dict[str, Any],
+) -> bool:
+    """Descuenta los cofres, entrega las cartas y guarda el historial.
+
+    Con transacciones las tres escrituras van en un único commit. En un
+    servidor standalone el descuento y la entrega siguen siendo una única
+    escritura atómica y el historial va por el buffer write-behind.
+
+    Returns:
+        True si se aplicó; False si el inventario cambió entretanto.
+    """
+    if not supports_transactions():
+        if not consume_chests(email, server, chest_type, chests_to_open, received_card_ids):
+            return False
+        _save_opening_history(history_doc)
+        return True
+
+    def _txn(session) -> None:
+        if not consume_chests(
+            email, server, chest_type, chests_to_open, received_card_ids, session=session
+        ):
+            raise _ChestsChanged()
+        mongo.opening_history.insert_one(history_doc, session=session)
 
-        user_chest_ids: List[str] = user_data.get("chests", [])
-        matching_user_chests = _get_matching_user_chests(user_chest_ids, chest_type, server)
-        if not matching_user_chests:
-            return {"error": "No tienes el cofre indicado"}
+    try:
+        run_in_transaction(_txn)
+        return True
+    except _ChestsChanged:
+        return False
 
-        chests_to_open = min(quantity, len(matching_user_chests))
-        chest_ids_to_remove = matching_user_chests[:chests_to_open]
-        updated_chests = _remove_chest_occurrences(user_chest_ids, chest_ids_to_remove)
 
-        update_result = mongo.users.update_one(
-            {"email": email, "chests": user_chest_ids},
-            {"$set": {"chests": updated_chests}},
-        )
-        if update_result.modified_count == 1:
-            break
-
-        if attempt == max_retries - 1:
-            return {
-                "error": "Tu inventario cambió mientras abrías cofres. Inténtalo de nuevo"
-            }
+def _open_chests_sync(email: str, chest_type: str, server: str, quantity: int) -> dict:
+    """Abre N cofres: sorteo en memoria y una única escritura (o transacción)."""
+    if quantity < 1:
+        return {"error": "Cantidad de cofres inválida"}
 
-    try:
-        draw_result = _draw_cards_for_chests(chest_type, chests_to_open)
-        cards: List[Dict[str, Any]] = draw_result["cards"]
-        received_card_ids: List[str] = [
-            str(card_id)
-            for card_id in draw_result["received_card_ids"]
-            if card_id
-        ]
-
-        guild_update = mongo.users.update_one(
-            {"email": email, "guilds.id": server},
-            {"$push": {"guilds.$.coleccionables": {"$each": received_card_ids}}},
-        )
+    max_retries = 3
+    for _ in range(max_retries):
+        available = available_chests(email, server, chest_type)
+        chests_to_open = min(quantity, available)
+        if chests_to_open <= 0:
+            return {"error": "No tienes el cofre indicado"}
 
-        if guild_update.matched_count == 0:
-            mongo.users.update_one(
-                {"email": email},
-                {"$push": {"chests": {"$each": chest_ids_to_remove}}},
+        try:
+            draw_result = _draw_cards_for_chests(chest_type, chests_to_open)
+            cards: List[Dict[str, Any]] = draw_result["cards"]
+            received_card_ids: List[str] = [
+                str(card_id)
+                for card_id in draw_result["received_card_ids"]
+                if card_id
+            ]
+            history_doc = _build_opening_history(
+                email, chest_type, server, cards, chests_to_open
             )
-            return {"error": "Servidor no encontrado para el usuario"}
 
-        _save_opening_history(email, chest_type, server, cards, chests_to_open)
+            if _apply_opening(
+                email, chest_type, server, chests_to_open, received_card_ids, history_doc
+            ):
+                return {
+                    "results": {
+                        "chest_type": chest_type,
+                        "chests_opened": chests_to_open,
+                        "cards": cards,
+                    }
+                }
+        except Exception as open_err:
+            logger.error(f"Error during chest opening flow: {open_err}", exc_info=True)
+            return {"error": "Error interno al abrir cofre"}
+
+        # El filtro no casó: o no pertenece al servidor o el contador cambió
+        if not mongo.users.find_one({"email": email, "guilds.id": server}, {"_id": 1}):
+            return {"error": "Servidor no encontrado para el usuario"}
 
-        return {
-            "results": {
-                "chest_type": chest_type,
-                "chests_opened": chests_to_open,
-                "cards": cards,
-            }
-        }
-    except Exception as open_err:
-        mongo.users.update_one(
-            {"email": email},
-            {"$push": {"chests": {"$each": chest_ids_to_remove}}},
-        )
-        logger.error(f"Error during chest opening flow: {open_err}", exc_info=True)
-        return {"error": "Error interno al abrir cofre"}
+    return {"error": "Tu inventario cambió mientras abrías cofres. Inténtalo de nuevo"}
 
 
 @chest_bp.route("/api/chests/data", methods=["GET"])
@@ -401,6 +394,7 @@ def get_chests_data():
 
 
 @chest_bp.route("/api/chests/config", methods=["GET"])
+@etag_cached("config", _yaml_config_version, PUBLIC_SHORT)
 def get_chests_config_api():
     """API endpoint para obtener configuración de cofres con caché"""
     try:
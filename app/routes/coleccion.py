@@ -1,11 +1,22 @@
-from flask import Blueprint, render_template, jsonify
+from flask import Blueprint, render_template, jsonify, request
 from flask_login import login_required, current_user
 from bson import ObjectId
 from typing import List, Dict, Any, Optional
 import logging
 
 from app.utils.images import get_images
-from app.utils.cache_manager import safe_memoize
+from app.utils.cache_manager import safe_memoize, user_tag
+from app.utils.http_cache import PRIVATE_REVALIDATE, etag_cached
+from app.utils.inventory import VERSION_FIELD, get_inventory_delta
+from app.utils.collection_stats import get_collection_stats
+from app.utils.catalog import (
+    get_card,
+    get_cards,
+    get_catalog,
+    get_catalog_version,
+    get_collection,
+    get_collection_card_list,
+)
 from app import mongo, cache
 
 logger = logging.getLogger(__name__)
@@ -13,123 +24,90 @@ logger = logging.getLogger(__name__)
 collections_bp = Blueprint("collections", __name__)
 
 
-@safe_memoize(timeout=1800)  # 30 minutos de caché
 def get_all_collections() -> List[Dict[str, Any]]:
-    """Obtiene todas las colecciones con conteo de cartas via agregación (sin N+1)."""
+    """Obtiene todas las colecciones con su número de cartas desde el catálogo."""
     try:
-        collections = list(mongo.collections.find({}))
-        
-        # Batch: contar cartas por colección con un solo pipeline de agregación
-        card_counts_pipeline = [
-            {"$group": {"_id": "$coleccion", "count": {"$sum": 1}}}
+        catalog = get_catalog()
+        return [
+            {**collection, "count": len(catalog.cards_by_collection.get(collection["_id"], []))}
+            for collection in catalog.collections
         ]
-        card_counts_raw = list(mongo.collectables.aggregate(card_counts_pipeline))
-        card_counts: Dict[str, int] = {str(item["_id"]): item["count"] for item in card_counts_raw}
-        
-        for collection in collections:
-            original_id = str(collection["_id"])
-            collection["_id"] = original_id
-            collection["count"] = card_counts.get(original_id, 0)
-        
-        return collections
     except Exception as e:
         logger.error(f"Error getting collections: {e}")
         return []
 
 
-@safe_memoize(timeout=900)  # 15 minutos de caché
+def _build_collectibles(user_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Convierte el documento de usuario en ``{version, guilds: [{..., counts}]}``."""
+    if not user_data:
+        return {"version": 0, "guilds": []}
+
+    version = int(user_data.get(VERSION_FIELD, 0))
+    guilds = user_data.get("guilds")
+    if not guilds or not isinstance(guilds, list):
+        return {"version": version, "guilds": []}
+
+    processed_guilds: List[Dict[str, Any]] = []
+    for guild in guilds:
+        counts: Dict[str, int] = {}
+        collectables_ids = guild.get("coleccionables", [])
+        if collectables_ids and isinstance(collectables_ids, list):
+            for id_str in collectables_ids:
+                if isinstance(id_str, str):
+                    counts[id_str] = counts.get(id_str, 0) + 1
+
+        processed_guilds.append({
+            "id": guild.get("id", ""),
+            "name": guild.get("name", ""),
+            "icon": guild.get("icon", ""),
+            "counts": counts,
+            "collectables_count": sum(counts.values()),
+        })
+
+    return {"version": version, "guilds": processed_guilds}
+
+
+@safe_memoize(
+    timeout=1800, soft_ttl=900, tags=(user_tag,), max_bytes=16 * 1024 * 1024
+)  # 15 min frescos, 30 min como máximo
 def get_user_collectibles_data(user_email: str) -> Dict[str, Any]:
-    """Obtiene datos de coleccionables del usuario con batch query (sin N+1 por guild)."""
+    """Obtiene los coleccionables del usuario como ``{card_id: copias}`` por guild.
+
+    Solo se cachean IDs y conteos; los datos de cada carta los añade
+    ``api_user_collectibles`` desde el catálogo, una vez por carta distinta.
+    """
     try:
-        user_data = mongo.users.find_one({"email": user_email})
-        if not user_data:
-            return {"guilds": []}
-            
-        guilds = user_data.get("guilds")
-        if not guilds or not isinstance(guilds, list):
-            return {"guilds": []}
-        
-        # Recolectar TODOS los IDs de coleccionables de TODAS las guilds en un solo set
-        all_ids: Dict[str, List[str]] = {}  # guild_id -> list of collectable string ids
-        all_object_ids = set()
-        
-        for guild in guilds:
-            collectables_ids = guild.get("coleccionables", [])
-            valid_ids = []
-            if collectables_ids and isinstance(collectables_ids, list):
-                for id_str in collectables_ids:
-                    if isinstance(id_str, str) and ObjectId.is_valid(id_str):
-                        valid_ids.append(id_str)
-                        all_object_ids.add(ObjectId(id_str))
-            all_ids[guild.get("id", "")] = valid_ids
-        
-        # UNA SOLA query para todos los coleccionables de todas las guilds
-        collectables_map: Dict[str, Dict[str, Any]] = {}
-        if all_object_ids:
-            all_collectables = list(mongo.collectables.find({"_id": {"$in": list(all_object_ids)}}))
-            for item in all_collectables:
-                item_id = str(item["_id"])
-                item["_id"] = item_id
-                if "coleccion" in item and item["coleccion"]:
-                    item["coleccion"] = str(item["coleccion"])
-                collectables_map[item_id] = item
-        
-        # Distribuir coleccionables a cada guild
-        processed_guilds: List[Dict[str, Any]] = []
-        for guild in guilds:
-            guild_data = guild.copy()
-            guild_id = guild.get("id", "")
-            guild_collectable_ids = all_ids.get(guild_id, [])
-            
-            details = [collectables_map[cid] for cid in guild_collectable_ids if cid in collectables_map]
-            guild_data["collectables_details"] = details
-            guild_data["collectables_count"] = len(details)
-            processed_guilds.append(guild_data)
-        
-        return {"guilds": processed_guilds}
+        user_data = mongo.users.find_one(
+            {"email": user_email},
+            {
+                "guilds.id": 1,
+                "guilds.name": 1,
+                "guilds.icon": 1,
+                "guilds.coleccionables": 1,
+                VERSION_FIELD: 1,
+            },
+        )
+        return _build_collectibles(user_data)
     except Exception as e:
         logger.error(f"Error getting user collectibles: {e}")
-        return {"guilds": []}
+        return {"version": 0, "guilds": []}
+
+
+def _owned_cards(guilds: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Datos de catálogo de las cartas distintas presentes en ``guilds``."""
+    owned_ids = {card_id for guild in guilds for card_id in guild.get("counts", {})}
+    return get_cards(list(owned_ids))
 
 
-@safe_memoize(timeout=1200)  # 20 minutos de caché
 def get_collection_cards(collection_id):
-    """Obtiene todas las cartas de una colección específica con caché"""
-    try:
-        if not ObjectId.is_valid(collection_id):
-            logger.warning(f"ID de colección inválido: {collection_id}")
-            return []
-            
-        cards = list(mongo.collectables.find({"coleccion": ObjectId(collection_id)}))
-        
-        # Serializar ObjectIds y agregar datos de colección
-        for card in cards:
-            card["_id"] = str(card["_id"])
-            if "coleccion" in card:
-                card["coleccion"] = str(card["coleccion"])
-        
-        return cards
-    except Exception as e:
-        logger.error(f"Error getting collection cards: {e}")
-        return []
+    """Obtiene todas las cartas de una colección desde el catálogo."""
+    return list(get_collection_card_list(collection_id))
 
 
-@safe_memoize(timeout=600)  # 10 minutos de caché  
 def get_card_details(card_id):
-    """Obtiene detalles de una carta específica con caché"""
-    try:
-        if not ObjectId.is_valid(card_id):
-            return None
-        
-        card = mongo.collectables.find_one({"_id": ObjectId(card_id)})
-        if card:
-            card["_id"] = str(card["_id"])
-            if "coleccion" in card and card["coleccion"]:
-                card["coleccion"] = str(card["coleccion"])
-        return card
-    except Exception as e:
-        logger.error(f"Error getting card details: {e}")
-        return None
+    """Obtiene los detalles de una carta desde el catálogo."""
+    card = get_card(card_id)
+    return dict(card) if card else None
 
 # Rutas para páginas HTML
 @collections_bp.route("/mi-coleccion")
@@ -152,13 +130,93 @@ def api_user_collectibles():
             return jsonify({"error": "Usuario no autenticado"}), 401
             
         user_data = get_user_collectibles_data(current_user.email)
-        return jsonify(user_data)
+        catalog = get_catalog()
+        response: Dict[str, Any] = {
+            "guilds": user_data["guilds"],
+            "version": user_data.get("version", 0),
+            "catalog_version": catalog.version,
+        }
+
+        # Si el cliente ya tiene esta versión del catálogo basta con los IDs
+        if request.args.get("catalog_version") != str(catalog.version):
+            response["cards"] = _owned_cards(user_data["guilds"])
+
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Error en api_user_collectibles: {e}", exc_info=True)
         return jsonify({"error": "Error interno del servidor"}), 500
 
+@collections_bp.route("/api/coleccion/usuario/delta")
+@login_required
+def api_user_collectibles_delta():
+    """Cambios del inventario desde la versión ``since`` que tiene el cliente.
+
+    Devuelve ``{full: False, version, added, removed}`` (conteos por guild y
+    carta) o, si el historial no alcanza o el cliente guardaba la colección de
+    otro usuario, la misma instantánea que ``/api/coleccion/usuario`` con
+    ``full: True``.
+    """
+    try:
+        if not current_user or not current_user.email:
+            return jsonify({"error": "Usuario no autenticado"}), 401
+
+        email = current_user.email
+        user_id = current_user.get_id()
+        catalog = get_catalog()
+        since = request.args.get("since", type=int)
+
+        # Con otro usuario u otra versión del catálogo la copia local no sirve
+        delta = None
+        if (
+            since is not None
+            and request.args.get("user") == user_id
+            and request.args.get("catalog_version") == str(catalog.version)
+        ):
+            user_doc = mongo.users.find_one({"email": email}, {VERSION_FIELD: 1})
+            current = int(user_doc.get(VERSION_FIELD, 0)) if user_doc else 0
+            delta = get_inventory_delta(email, since, current)
+
+        if delta is not None:
+            return jsonify({
+                "full": False,
+                "user": user_id,
+                "catalog_version": catalog.version,
+                **delta,
+                "cards": _owned_cards([{"counts": c} for c in delta["added"].values()]),
+            })
+
+        user_data = get_user_collectibles_data(email)
+        return jsonify({
+            "full": True,
+            "user": user_id,
+            "version": user_data.get("version", 0),
+            "guilds": user_data["guilds"],
+            "catalog_version": catalog.version,
+            "cards": _owned_cards(user_data["guilds"]),
+        })
+    except Exception as e:
+        logger.error(f"Error en api_user_collectibles_delta: {e}", exc_info=True)
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@collections_bp.route("/api/coleccion/usuario/stats")
+@login_required
+def api_user_collection_stats():
+    """Compleción de la colección del usuario (por colección, por rareza y total)."""
+    try:
+        if not current_user or not current_user.email:
+            return jsonify({"error": "Usuario no autenticado"}), 401
+
+        stats = get_collection_stats(current_user.email)
+        if stats is None:
+            return jsonify({"error": "Usuario no encontrado"}), 404
+        return jsonify(stats)
+    except Exception as e:
+        logger.error(f"Error en api_user_collection_stats: {e}", exc_info=True)
+        return jsonify({"error": "Error interno del servidor"}), 500
+
 @collections_bp.route("/api/colecciones")
 @login_required  
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
 def api_collections():
     """API para obtener todas las colecciones con caché"""
     collections = get_all_collections()
@@ -166,6 +224,7 @@ def api_collections():
 
 @collections_bp.route("/api/colecciones/<collection_id>/cartas")
 @login_required
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
 def api_collection_cards(collection_id: str):
     """API para obtener cartas de una colección específica usando función cacheada."""
     try:
@@ -187,38 +246,41 @@ def api_collection_details(collection_id):
         if not ObjectId.is_valid(collection_id):
             return jsonify({"error": "ID de colección inválido"}), 400
             
-        collection = mongo.collections.find_one({"_id": ObjectId(collection_id)})
+        collection = get_collection(collection_id)
         if not collection:
             return jsonify({"error": "Colección no encontrada"}), 404
             
-        # Serializar ObjectId y contar cartas
-        collection["_id"] = str(collection["_id"])
-        card_count = mongo.collectables.count_documents({"coleccion": ObjectId(collection_id)})
-        collection["count"] = card_count
-        
-        return jsonify(collection)
+        return jsonify({
+            **collection,
+            "count": len(get_collection_card_list(collection_id)),
+        })
     except Exception as e:
         logger.error(f"Error getting collection details: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
 @collections_bp.route("/api/cartas")
 @login_required
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
 def api_all_cards():
     """API para obtener todas las cartas"""
     try:
-        cards = list(mongo.collectables.find({}))
-        
-        # Serializar ObjectIds y poblar datos de colección
-        for card in cards:
-            card["_id"] = str(card["_id"])
-            if "coleccion" in card and card["coleccion"]:
-                card["coleccion"] = str(card["coleccion"])
-                
-        return jsonify(cards)
+        return jsonify(get_catalog().cards)
     except Exception as e:
         logger.error(f"Error getting all cards: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
+@collections_bp.route("/api/catalog/cartas")
+@login_required
+@etag_cached("catalog", get_catalog_version, PRIVATE_REVALIDATE)
+def api_card_catalog():
+    """Catálogo completo de cartas con su versión (para el formato compacto de cofres)."""
+    try:
+        catalog = get_catalog()
+        return jsonify({"version": catalog.version, "cards": catalog.cards})
+    except Exception as e:
+        logger.error(f"Error getting card catalog: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
 @collections_bp.route("/api/cartas/<card_id>")
 @login_required
 def api_card_details(card_id):
@@ -237,7 +299,7 @@ def api_related_cards(card_id):
         if not ObjectId.is_valid(card_id):
             return jsonify({"error": "ID de carta inválido"}), 400
             
-        card = mongo.collectables.find_one({"_id": ObjectId(card_id)})
+        card = get_card(card_id)
         if not card:
             return jsonify({"error": "Carta no encontrada"}), 404
         
@@ -245,17 +307,12 @@ def api_related_cards(card_id):
         if not collection_id:
             return jsonify([])
         
-        # Obtener cartas de la misma colección, excluyendo la actual
-        related_cards = list(mongo.collectables.find({
-            "coleccion": collection_id,
-            "_id": {"$ne": ObjectId(card_id)}
-        }))
-        
-        # Serializar ObjectIds
-        for related_card in related_cards:
-            related_card["_id"] = str(related_card["_id"])
-            related_card["coleccion"] = str(related_card["coleccion"])
-            
+        # Cartas de la misma colección, excluyendo la actual
+        related_cards = [
+            related_card
+            for related_card in get_collection_card_list(collection_id)
+            if related_card["_id"] != card_id
+        ]
         return jsonify(related_cards)
     except Exception as e:
         logger.error(f"Error getting related cards: {e}", exc_info=True)
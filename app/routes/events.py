@@ -17,9 +17,14 @@ from flask_login import login_required, current_user
 from app import mongo
 from app.models.user import invalidate_user_cache
 from app.utils.bot_servers import get_shared_bot_servers
+from app.utils.card_pool import draw_card
+from app.utils.catalog import get_card
+from app.utils.chest_inventory import grant_chests
+from app.utils.chest_registry import find_chest_id, register_chest
+from app.utils.inventory import push_cards
+from app.utils.write_behind import buffered_insert
 from app.utils.game_config import get_chest_images
-from app.utils.cache_manager import safe_delete_memoized
-from app.routes.coleccion import get_user_collectibles_data
+from app.utils.cache_manager import invalidate_user_caches
 
 logger = logging.getLogger(__name__)
 
@@ -91,28 +96,28 @@ def _create_reward_chest(
         ID del cofre creado como string, o None si falla.
     """
     try:
-        existing = mongo.chests.find_one({
-            "servidor": servidor,
-            "rarity": rarity,
-        })
-        if existing:
-            chest_id = existing["_id"]
-        else:
-            chest_id = ObjectId()
-            mongo.chests.insert_one({
-                "_id": chest_id,
-                "rarity": rarity,
+        chest_id = find_chest_id(rarity, servidor)
+        if chest_id is None:
+            existing = mongo.chests.find_one({
                 "servidor": servidor,
-                "creation_date": datetime.now(timezone.utc),
-                "__v": 0,
+                "rarity": rarity,
             })
+            if existing:
+                chest_id = existing["_id"]
+            else:
+                chest_id = ObjectId()
+                mongo.chests.insert_one({
+                    "_id": chest_id,
+                    "rarity": rarity,
+                    "servidor": servidor,
+                    "creation_date": datetime.now(timezone.utc),
+                    "__v": 0,
+                })
+            register_chest(str(chest_id), rarity, servidor)
 
-        chest_id_str = str(chest_id)
-        mongo.users.update_one(
-            {"email": email},
-            {"$push": {"chests": chest_id_str}},
-        )
-        return chest_id_str
+        if not grant_chests(email, servidor, rarity):
+            return None
+        return str(chest_id)
     except Exception as e:
         logger.error(f"Error creating event reward chest: {e}", exc_info=True)
         return None
@@ -187,15 +192,12 @@ def _assign_card_to_user(
         Dict con datos de la carta, o None si falla.
     """
     try:
-        card_doc = mongo.collectables.find_one({"_id": ObjectId(card_id)})
+        card_doc = get_card(card_id)
         if not card_doc:
             logger.warning(f"Card {card_id} not found for event reward")
             return None
 
-        mongo.users.update_one(
-            {"email": email, "guilds.id": servidor},
-            {"$push": {"guilds.$.coleccionables": card_id}},
-        )
+        push_cards(email, servidor, [card_id])
         return {
             "_id": str(card_doc["_id"]),
             "nombre": card_doc.get("nombre", ""),
@@ -216,18 +218,13 @@ def _assign_random_card_by_rarity(
         Dict con datos de la carta, o None si falla.
     """
     try:
-        pipeline = [{"$match": {"rareza": rarity}}, {"$sample": {"size": 1}}]
-        results = list(mongo.collectables.aggregate(pipeline))
-        if not results:
+        card_doc = draw_card(rarity)
+        if not card_doc:
             logger.warning(f"No cards found with rarity {rarity}")
             return None
 
-        card_doc = results[0]
         card_id = str(card_doc["_id"])
-        mongo.users.update_one(
-            {"email": email, "guilds.id": servidor},
-            {"$push": {"guilds.$.coleccionables": card_id}},
-        )
+        push_cards(email, servidor, [card_id])
         return {
             "_id": card_id,
             "nombre": card_doc.get("nombre", ""),
@@ -429,7 +426,7 @@ def claim_event_reward(event_id: str) -> tuple:
                 result_data["code"] = code_data["code"]
                 result_data["code_description"] = code_data.get("description", "")
                 result_data["code_link"] = code_data.get("link")
-                mongo.chest_logs.insert_one({
+                buffered_insert("chest_logs", {
                     "date": now,
                     "username": current_user.username,
                     "type": "code",
@@ -469,7 +466,7 @@ def claim_event_reward(event_id: str) -> tuple:
                 result_data["chest_id"] = chest_id
                 result_data["fallback"] = True
                 if chest_id:
-                    mongo.chest_logs.insert_one({
+                    buffered_insert("chest_logs", {
                         "date": now,
                         "chest_id": chest_id,
                         "username": current_user.username,
@@ -484,7 +481,7 @@ def claim_event_reward(event_id: str) -> tuple:
             result_data["chest_id"] = chest_id
             result_data["image"] = get_chest_images().get(rarity, "")
             if chest_id:
-                mongo.chest_logs.insert_one({
+                buffered_insert("chest_logs", {
                     "date": now,
                     "chest_id": chest_id,
                     "username": current_user.username,
@@ -510,7 +507,7 @@ def claim_event_reward(event_id: str) -> tuple:
 
             if card_data:
                 result_data["card"] = card_data
-                mongo.chest_logs.insert_one({
+                buffered_insert("chest_logs", {
                     "date": now,
                     "username": current_user.username,
                     "type": "card",
@@ -529,7 +526,7 @@ def claim_event_reward(event_id: str) -> tuple:
                 result_data["chest_id"] = chest_id
                 result_data["fallback"] = True
                 if chest_id:
-                    mongo.chest_logs.insert_one({
+                    buffered_insert("chest_logs", {
                         "date": now,
                         "chest_id": chest_id,
                         "username": current_user.username,
@@ -560,7 +557,7 @@ def claim_event_reward(event_id: str) -> tuple:
             })
 
         invalidate_user_cache(str(current_user._id))
-        safe_delete_memoized(get_user_collectibles_data, current_user.email)
+        invalidate_user_caches(current_user.email)
 
         result_data["completed"] = is_completed
         return jsonify(result_data), 200
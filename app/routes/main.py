@@ -3,9 +3,9 @@ from flask_login import login_required, current_user
 from typing import List, Dict, Any
 
 from app.utils.images import get_images
+from app.utils.chest_registry import resolve_chests
 from app import mongo
 from datetime import datetime
-from bson.objectid import ObjectId
 
 main_bp = Blueprint("main", __name__)
 
@@ -39,19 +39,15 @@ def cofres_log() -> tuple:
         usernames = set()
         for log in logs:
             if log.get("chest_id"):
-                try:
-                    chest_ids.add(ObjectId(log["chest_id"]))
-                except Exception:
-                    pass
+                chest_ids.add(str(log["chest_id"]))
             if log.get("username"):
                 usernames.add(log["username"])
         
-        # Batch query: todos los cofres de una vez
-        chests_map: Dict[str, str] = {}
-        if chest_ids:
-            chests_docs = mongo.chests.find({"_id": {"$in": list(chest_ids)}})
-            for chest in chests_docs:
-                chests_map[str(chest["_id"])] = chest.get("rarity", "Desconocida")
+        # Rareza de cada cofre desde el registro en memoria
+        chests_map: Dict[str, str] = {
+            chest_id: rarity
+            for chest_id, (rarity, _servidor) in resolve_chests(chest_ids).items()
+        }
         
         # Batch query: verificar qué usernames existen + obtener pfp
         users_info: Dict[str, str] = {}  # username -> pfp
@@ -83,8 +79,12 @@ def cofres_log() -> tuple:
             elif log_type == "code":
                 log["code_reward"] = True
             else:
-                chest_rarity = chests_map.get(log.get("chest_id"), "Desconocida")
-                log["chest"] = {"rareza": chest_rarity}
+                # Cofres borrados o sin rareza/servidor no están en el registro
+                chest_id = log.get("chest_id")
+                chest_rarity = chests_map.get(str(chest_id)) if chest_id else None
+                log["chest"] = {"rareza": chest_rarity or "Desconocida"}
+                if chest_id is not None:
+                    log["chest_id"] = str(chest_id)
             log["pfp"] = users_info.get(username, "")
             filtered_logs.append(log)
         
@@ -6,6 +6,7 @@ from app.utils.images import get_images
 from app.utils.validation_utils import validate_user_input
 from app.utils.bot_servers import get_shared_bot_servers
 from app.models.user import invalidate_user_cache
+from app.routes.coleccion import get_user_collectibles_data
 
 import logging
 
@@ -78,13 +79,14 @@ def api_bot_servers():
     shared = get_shared_bot_servers(current_user.guilds or [])
 
     # Enriquecer con conteo de coleccionables del usuario
-    user_guild_map = {
-        g.get("id"): g for g in (current_user.guilds or []) if g.get("id")
+    # (current_user no trae los coleccionables; se leen de la vista cacheada)
+    counts_by_guild = {
+        g["id"]: g["collectables_count"]
+        for g in get_user_collectibles_data(current_user.email)["guilds"]
     }
     top_servers = []
     for server in shared:
-        guild = user_guild_map.get(server["id"], {})
-        count = len(guild.get("coleccionables", []))
+        count = counts_by_guild.get(server["id"], 0)
         top_servers.append({**server, "coleccionables_count": count})
     top_servers.sort(key=lambda s: s["coleccionables_count"], reverse=True)
     return jsonify(top_servers)
@@ -124,6 +126,7 @@ def delete_account():
 
     # Eliminar el usuario de la base de datos
     mongo.users.delete_one({'_id': ObjectId(current_user._id)})
+    invalidate_user_cache(str(current_user._id))
 
     # Cerrar sesión del usuario
     logout_user()
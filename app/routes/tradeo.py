@@ -9,14 +9,22 @@ from flask import Blueprint, jsonify, render_template, request
 from flask_login import current_user, login_required
 
 from app import mongo
-from app.routes.coleccion import get_user_collectibles_data
-from app.utils.cache_manager import safe_delete_memoized, safe_memoize
+from app.utils.cache_manager import (
+    invalidate_tags,
+    invalidate_user_caches,
+    safe_memoize,
+    user_tag,
+)
+from app.utils.catalog import CATALOG_TAG, get_card, get_cards
 from app.utils.images import get_images
+from app.utils.inventory import VERSION_FIELD, apply_inventory_update, push_cards, version_guard
 
 logger = logging.getLogger(__name__)
 
 tradeo_bp = Blueprint("tradeo", __name__)
 
+_INVENTORY_MAX_RETRIES = 5
+
 RARITY_ORDER: Dict[str, int] = {
     "comun": 0,
     "rara": 1,
@@ -37,6 +45,7 @@ try:
 except ValueError:
     BOT_API_TIMEOUT_SEC = 5
 PLACEHOLDER_CARD_IMAGE: str = "/static/assets/images/placeholder-card.svg"
+MARKET_TAG: str = "market"  # Tag de caché de las vistas del mercado
 MONGO_ELEM_MATCH: str = "$elemMatch"
 OFFER_NOT_FOUND_ERROR: str = "Oferta pendiente no encontrada"
 
@@ -145,39 +154,53 @@ def _is_rarity_compatible(left_rarity: str, right_rarity: str) -> bool:
 
 
 def _remove_single_card_from_user(email: str, card_id: str, server_id: str) -> bool:
-    user_doc = mongo.users.find_one({"email": email}, {"guilds": 1})
-    if not user_doc:
-        return False
+    """Retira una copia de ``card_id`` del guild.
 
-    guild = _find_user_guild(user_doc, server_id)
-    if not guild:
-        return False
+    El array se reescribe entero, así que la escritura exige la versión de
+    inventario leída: si otra escritura (p. ej. una apertura de cofres) entró
+    en medio, se vuelve a leer en lugar de pisarla.
+    """
+    for _ in range(_INVENTORY_MAX_RETRIES):
+        user_doc = mongo.users.find_one({"email": email}, {"guilds": 1, VERSION_FIELD: 1})
+        if not user_doc:
+            return False
 
-    collectibles = guild.get("coleccionables") or []
-    if not isinstance(collectibles, list):
-        return False
+        guild = _find_user_guild(user_doc, server_id)
+        if not guild:
+            return False
 
-    try:
-        index = collectibles.index(card_id)
-    except ValueError:
-        return False
+        collectibles = guild.get("coleccionables") or []
+        if not isinstance(collectibles, list):
+            return False
 
-    updated_collectibles = list(collectibles)
-    updated_collectibles.pop(index)
+        try:
+            index = collectibles.index(card_id)
+        except ValueError:
+            return False
 
-    update_result = mongo.users.update_one(
-        {"email": email, "guilds.id": server_id},
-        {"$set": {"guilds.$.coleccionables": updated_collectibles}},
-    )
-    return update_result.modified_count > 0
+        updated_collectibles = list(collectibles)
+        updated_collectibles.pop(index)
+
+        version = apply_inventory_update(
+            {
+                "email": email,
+                "guilds.id": server_id,
+                **version_guard(int(user_doc.get(VERSION_FIELD, 0) or 0)),
+            },
+            {"$set": {"guilds.$.coleccionables": updated_collectibles}},
+            email,
+            server_id,
+            removed=[card_id],
+        )
+        if version is not None:
+            return True
+
+    logger.warning(f"Could not remove card {card_id} from {email} after retries")
+    return False
 
 
 def _add_single_card_to_user(email: str, card_id: str, server_id: str) -> bool:
-    update_result = mongo.users.update_one(
-        {"email": email, "guilds.id": server_id},
-        {"$push": {"guilds.$.coleccionables": card_id}},
-    )
-    return update_result.modified_count > 0
+    return push_cards(email, server_id, [card_id])
 
 
 def _normalize_avatar(url: Optional[str]) -> str:
@@ -307,17 +330,11 @@ def _notify_offer_result(
 
 
 def _invalidate_trade_cache_for_users(emails: List[str]) -> None:
-    unique_emails = list({email for email in emails if email})
-
-    safe_delete_memoized(get_trade_market_data)
-    for email in unique_emails:
-        safe_delete_memoized(get_my_active_listings, email)
-        safe_delete_memoized(get_pending_trade_queue, email)
-        safe_delete_memoized(get_user_trade_cards, email)
-        safe_delete_memoized(get_user_collectibles_data, email)
+    invalidate_tags(MARKET_TAG)
+    invalidate_user_caches(*{email for email in emails if email})
 
 
-@safe_memoize(timeout=60)
+@safe_memoize(timeout=180, soft_ttl=60, tags=(MARKET_TAG,))
 def get_trade_market_data() -> Dict[str, Any]:
     listings = list(
         mongo.trade_marketplace.find({"listing_status": "active"}).sort("created_at", 1)
@@ -360,7 +377,7 @@ def get_trade_market_data() -> Dict[str, Any]:
     }
 
 
-@safe_memoize(timeout=60)
+@safe_memoize(timeout=60, tags=(user_tag,))
 def get_my_active_listings(email: str) -> List[Dict[str, Any]]:
     listings = list(
         mongo.trade_marketplace.find(
@@ -396,7 +413,7 @@ def get_my_active_listings(email: str) -> List[Dict[str, Any]]:
     return parsed
 
 
-@safe_memoize(timeout=30)
+@safe_memoize(timeout=30, tags=(user_tag,))
 def get_pending_trade_queue(email: str) -> List[Dict[str, Any]]:
     listings = list(
         mongo.trade_marketplace.find(
@@ -448,7 +465,7 @@ def get_pending_trade_queue(email: str) -> List[Dict[str, Any]]:
     return queue
 
 
-@safe_memoize(timeout=30)
+@safe_memoize(timeout=30, tags=(user_tag, CATALOG_TAG))
 def get_user_trade_cards(email: str) -> List[Dict[str, Any]]:
     user_doc = mongo.users.find_one({"email": email})
     if not user_doc:
@@ -459,8 +476,8 @@ def get_user_trade_cards(email: str) -> List[Dict[str, Any]]:
         return []
 
     counts_by_slot: Dict[str, Dict[str, Any]] = {}
-    object_ids: List[ObjectId] = []
-    object_ids_set = set()
+    card_ids: List[str] = []
+    card_ids_set = set()
 
     for guild in guilds:
         if not isinstance(guild, dict):
@@ -487,17 +504,11 @@ def get_user_trade_cards(email: str) -> List[Dict[str, Any]]:
                 }
             counts_by_slot[key]["count"] += 1
 
-            object_id = ObjectId(card_id)
-            if object_id not in object_ids_set:
-                object_ids_set.add(object_id)
-                object_ids.append(object_id)
+            if card_id not in card_ids_set:
+                card_ids_set.add(card_id)
+                card_ids.append(card_id)
 
-    cards_by_id: Dict[str, Dict[str, Any]] = {}
-    if object_ids:
-        card_docs = list(mongo.collectables.find({"_id": {"$in": object_ids}}))
-        for card_doc in card_docs:
-            card_key = str(card_doc.get("_id"))
-            cards_by_id[card_key] = card_doc
+    cards_by_id: Dict[str, Dict[str, Any]] = get_cards(card_ids)
 
     listing_reserved, offer_reserved = _get_reserved_maps(email)
 
@@ -605,7 +616,7 @@ def tradeo_create_listing() -> Any:
     if available <= 0:
         return jsonify({"error": "No tienes copias disponibles de esa carta"}), 400
 
-    card_doc = mongo.collectables.find_one({"_id": ObjectId(card_id)})
+    card_doc = get_card(card_id)
     if not card_doc:
         return jsonify({"error": "Carta no encontrada"}), 404
 
@@ -721,7 +732,7 @@ def tradeo_create_offer() -> Any:
     if available <= 0:
         return jsonify({"error": "No tienes copias disponibles de la carta ofertada"}), 400
 
-    offered_card_doc = mongo.collectables.find_one({"_id": ObjectId(offered_card_id)})
+    offered_card_doc = get_card(offered_card_id)
     if not offered_card_doc:
         return jsonify({"error": "Carta ofertada no encontrada"}), 404
 
@@ -370,7 +370,7 @@ function crearElementoUsuario(usuario) {
         <img src="${imagenPerfil}" alt="Imagen de perfil" class="usuario-pfp">
         <h3>${usuario.username}</h3>
         <p>Cartas: ${numCartas || 0}</p>
-        <p>Cofres: ${usuario.chests.length || 0}</p>
+        <p>Cofres: ${usuario.chest_total ?? (usuario.chests || []).length}</p>
         <button onclick="abrirModal('usuario', '${usuario._id}')" class="admin-btn gestionar-btn">Gestionar</button>
     `;
     return div;
@@ -129,11 +129,23 @@ document.addEventListener('DOMContentLoaded', () => {
         return loadingOverlay;
     }
 
+    function createIdempotencyKey() {
+        if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+            return window.crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    }
+
     async function openChestsRequest(chestType, server, quantity) {
+        // La misma clave en el reintento: el servidor devuelve el resultado ya guardado
+        const idempotencyKey = createIdempotencyKey();
         const makeRequest = (signal) => fetch('/api/open_chests_multi', {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ chest_type: chestType, server, quantity }),
+            headers: {
+                'Content-Type': 'application/json',
+                'Idempotency-Key': idempotencyKey
+            },
+            body: JSON.stringify({ chest_type: chestType, server, quantity, format: 'compact' }),
             signal
         });
 
@@ -195,8 +207,71 @@ document.addEventListener('DOMContentLoaded', () => {
         return Array.from(groups.values());
     }
 
-    function processChestResults(data, chestCard) {
-        const cards = data?.results?.cards || [];
+    const CATALOG_STORAGE_KEY = 'tnglore-card-catalog';
+    let cardCatalog = null;
+
+    function readStoredCatalog() {
+        try {
+            return JSON.parse(localStorage.getItem(CATALOG_STORAGE_KEY) || 'null');
+        } catch (error) {
+            return null;
+        }
+    }
+
+    async function getCardCatalog(version) {
+        if (!cardCatalog) {
+            cardCatalog = readStoredCatalog();
+        }
+        if (cardCatalog && cardCatalog.version === version) {
+            return cardCatalog;
+        }
+
+        const response = await fetch('/api/catalog/cartas');
+        if (!response.ok) {
+            throw new Error('No se pudo cargar el catálogo de cartas');
+        }
+        const data = await response.json();
+        cardCatalog = {
+            version: data.version,
+            byId: Object.fromEntries((data.cards || []).map((card) => [card._id, card]))
+        };
+        try {
+            localStorage.setItem(CATALOG_STORAGE_KEY, JSON.stringify(cardCatalog));
+        } catch (error) {
+            // Sin espacio en localStorage: el catálogo queda solo en memoria
+        }
+        return cardCatalog;
+    }
+
+    async function resolveResultCards(results) {
+        if (!results || results.format !== 'compact') {
+            return results?.cards || [];
+        }
+
+        let catalog = await getCardCatalog(results.catalog_version);
+        if (results.card_ids.some((id) => !catalog.byId[id])) {
+            cardCatalog = null;
+            localStorage.removeItem(CATALOG_STORAGE_KEY);
+            catalog = await getCardCatalog(results.catalog_version);
+        }
+
+        const cards = [];
+        results.card_ids.forEach((id, index) => {
+            const card = catalog.byId[id] || { _id: id, nombre: 'Carta', rareza: '' };
+            for (let i = 0; i < results.card_counts[index]; i += 1) {
+                cards.push(card);
+            }
+        });
+        Object.entries(results.missing || {}).forEach(([rareza, count]) => {
+            for (let i = 0; i < count; i += 1) {
+                cards.push({ nombre: `Sin carta ${rareza}`, rareza });
+            }
+        });
+        return cards;
+    }
+
+    async function processChestResults(data, chestCard) {
+        const cards = await resolveResultCards(data?.results);
         const openedCount = Number.parseInt(data?.results?.chests_opened || '1', 10) || 1;
 
         mostrarCartas(cards);
@@ -258,7 +333,7 @@ document.addEventListener('DOMContentLoaded', () => {
         
         try {
             const data = await openChestsRequest(chestType, server, quantity);
-            processChestResults(data, chestCard);
+            await processChestResults(data, chestCard);
         } catch (error) {
             console.error('Error:', error);
             if (error.name === 'AbortError') {
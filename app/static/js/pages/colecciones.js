@@ -13,6 +13,8 @@ import {
 let todasLasCartas = [];
 /** @type {Array<Object>} */
 let todasLasColecciones = [];
+/** @type {Map<string, Object>} Compleción del usuario por colección */
+let completionPorColeccion = new Map();
 
 document.addEventListener('DOMContentLoaded', initializeColeccionesPage);
 
@@ -25,10 +27,13 @@ function initializeColeccionesPage() {
 
 async function loadInitialData() {
     try {
-        [todasLasColecciones, todasLasCartas] = await Promise.all([
+        let stats;
+        [todasLasColecciones, todasLasCartas, stats] = await Promise.all([
             cargarColecciones(),
-            cargarCartas()
+            cargarCartas(),
+            cargarCompletion()
         ]);
+        completionPorColeccion = new Map((stats?.collections || []).map(c => [c.id, c]));
 
         // Poblar filtro de colección
         const filtroColeccion = document.getElementById('filtro-coleccion');
@@ -49,6 +54,16 @@ async function loadInitialData() {
     }
 }
 
+async function cargarCompletion() {
+    try {
+        const res = await fetch('/api/coleccion/usuario/stats');
+        return res.ok ? await res.json() : null;
+    } catch (e) {
+        console.error('Error al cargar la compleción:', e);
+        return null;
+    }
+}
+
 /**
  * Renderiza colecciones con sus cartas, aplicando filtros.
  * @param {Array<Object>} colecciones
@@ -68,6 +83,13 @@ function renderizarTodo(colecciones, cartas) {
 
         const elementoColeccion = crearElementoColeccion(coleccion);
         elementoColeccion.onclick = () => window.abrirOverlayColeccion(coleccion);
+        const completion = completionPorColeccion.get(extraerID(coleccion));
+        if (completion) {
+            const progreso = document.createElement('p');
+            progreso.className = 'coleccion-progreso';
+            progreso.textContent = `${completion.owned}/${completion.total} (${completion.percent}%)`;
+            elementoColeccion.querySelector('.card-content')?.appendChild(progreso);
+        }
 
         const contenedorCartas = document.createElement('div');
         contenedorCartas.className = 'contenedor-cartas';
@@ -18,9 +18,70 @@ let userData = { guilds: [] };
 
 // ── Utilidades ──────────────────────────────────────────────────────
 
+const CATALOG_VERSION_KEY = 'tnglore-catalog-version';
+const COLLECTION_KEY = 'tnglore-collection';
+
+function leerColeccionGuardada() {
+    try {
+        return JSON.parse(localStorage.getItem(COLLECTION_KEY) || 'null');
+    } catch {
+        return null;
+    }
+}
+
+/**
+ * Aplica un delta ``{added, removed}`` (conteos por guild y carta) sobre la copia local.
+ * Devuelve false si el delta menciona un guild que no tenemos.
+ */
+function aplicarDelta(guilds, delta) {
+    const porId = new Map(guilds.map(g => [g.id, g]));
+    const cambios = [[delta.added || {}, 1], [delta.removed || {}, -1]];
+    for (const [porGuild, signo] of cambios) {
+        for (const [guildId, counts] of Object.entries(porGuild)) {
+            const guild = porId.get(guildId);
+            if (!guild) return false;
+            for (const [cardId, n] of Object.entries(counts)) {
+                const total = (guild.counts[cardId] || 0) + signo * n;
+                if (total > 0) guild.counts[cardId] = total;
+                else delete guild.counts[cardId];
+            }
+            guild.collectables_count = Object.values(guild.counts).reduce((a, b) => a + b, 0);
+        }
+    }
+    return true;
+}
+
+async function pedirColeccion(guardada) {
+    const params = new URLSearchParams();
+    const version = localStorage.getItem(CATALOG_VERSION_KEY);
+    if (version !== null) params.set('catalog_version', version);
+    if (guardada) {
+        params.set('since', String(guardada.version));
+        params.set('user', guardada.user);
+    }
+    return fetch(`/api/coleccion/usuario/delta?${params}`).then(res => res.json());
+}
+
 async function cargarDatosUsuario() {
     try {
-        return await fetch('/api/coleccion/usuario').then(res => res.json());
+        // Con una copia local solo pedimos lo que cambió desde su versión
+        const guardada = leerColeccionGuardada();
+        let data = await pedirColeccion(guardada);
+        if (data.full === false && !aplicarDelta(guardada.guilds, data)) {
+            data = await pedirColeccion(null);
+        }
+        if (data.error) return { guilds: [] };
+
+        const guilds = data.full === false ? guardada.guilds : data.guilds;
+        localStorage.setItem(COLLECTION_KEY, JSON.stringify({
+            user: data.user,
+            version: data.version,
+            guilds,
+        }));
+        if (data.catalog_version !== undefined) {
+            localStorage.setItem(CATALOG_VERSION_KEY, String(data.catalog_version));
+        }
+        return { guilds, cards: data.cards };
     } catch (e) {
         console.error('Error al cargar datos del usuario:', e);
         return { guilds: [] };
@@ -86,13 +147,9 @@ function _aplicarTruncado(contenedor, total) {
  * @returns {HTMLElement|null}
  */
 function renderGuildSection(guild, cartas, sortCriterio, textoBusqueda, filtroRareza, filtroEstado) {
-    if (!guild.coleccionables || guild.coleccionables.length === 0) return null;
-
     // Mapa de duplicados: cardId → count
-    const countMap = guild.coleccionables.reduce((acc, id) => {
-        acc[id] = (acc[id] || 0) + 1;
-        return acc;
-    }, {});
+    const countMap = guild.counts || {};
+    if (Object.keys(countMap).length === 0) return null;
 
     // IDs de cartas que el usuario posee en este guild
     const ownedIds = new Set(Object.keys(countMap));
@@ -227,7 +284,7 @@ function poblarFiltroServidor() {
     const select = document.getElementById('filtro-servidor');
     if (!select) return;
     userData.guilds.forEach(guild => {
-        if (guild.coleccionables && guild.coleccionables.length) {
+        if (guild.collectables_count > 0) {
             const opt = document.createElement('option');
             opt.value = guild.id;
             opt.textContent = guild.name;
@@ -257,6 +314,12 @@ function setupFiltros() {
 document.addEventListener('DOMContentLoaded', async () => {
     [todasLasCartas, userData] = await Promise.all([cargarCartas(), cargarDatosUsuario()]);
 
+    // Cartas que el catálogo local aún no tenía (solo llegan si la versión difería)
+    const conocidas = new Set(todasLasCartas.map(c => c._id));
+    Object.values(userData.cards || {}).forEach(carta => {
+        if (!conocidas.has(carta._id)) todasLasCartas.push(carta);
+    });
+
     poblarFiltroServidor();
     setupFiltros();
     renderAllGuilds();
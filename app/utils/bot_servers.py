@@ -1,8 +1,16 @@
-"""Utilidad para obtener los servidores que el usuario comparte con el bot."""
+"""Utilidad para obtener los servidores que el usuario comparte con el bot.
+
+La lista de servidores del bot es la misma para todos los usuarios: se
+cachea en memoria ``BOT_SERVERS_TTL`` segundos (se refresca en segundo plano
+sirviendo la anterior) y se cruza con los guilds de cada usuario en cada
+petición.
+"""
 
 import logging
 import os
-from typing import Any, Dict, List
+import threading
+import time
+from typing import Any, Dict, List, Optional
 
 import requests
 
@@ -10,11 +18,81 @@ logger = logging.getLogger(__name__)
 
 _BOT_API_URL = "https://172.93.110.38:4009/getBotServers"
 
+_bot_servers_cache: Optional[List[Dict[str, Any]]] = None
+_next_fetch: float = 0.0  # Instante (monotonic) a partir del cual se vuelve a pedir
+_fetch_done: Optional[threading.Event] = None  # Petición en curso, si la hay
+_cache_lock = threading.Lock()
+BOT_SERVERS_TTL: int = 300  # 5 minutos
+BOT_SERVERS_RETRY: int = 30  # Espera tras un fallo antes de reintentar
+_FETCH_TIMEOUT: int = 3
+
+
+def _fetch_bot_servers(done: threading.Event) -> None:
+    """Pide la lista al bot fuera del lock y programa la siguiente petición."""
+    global _bot_servers_cache, _next_fetch, _fetch_done
+
+    api_secret = os.getenv("API_SECRET")
+    headers = {"X-API-KEY": api_secret}
+    servers: Optional[List[Dict[str, Any]]] = None
+    try:
+        response = requests.get(
+            _BOT_API_URL, headers=headers, verify=False, timeout=_FETCH_TIMEOUT
+        )
+        response.raise_for_status()
+        servers = response.json()
+    except Exception as e:
+        logger.warning(f"No se pudo contactar la API del bot: {e}")
+
+    with _cache_lock:
+        if servers is not None:
+            _bot_servers_cache = servers
+            _next_fetch = time.monotonic() + BOT_SERVERS_TTL
+        else:
+            _next_fetch = time.monotonic() + BOT_SERVERS_RETRY
+        _fetch_done = None
+    done.set()
+
+
+def get_bot_servers() -> List[Dict[str, Any]]:
+    """Lista de servidores del bot con caché TTL.
+
+    Caducada la lista, se sigue sirviendo la anterior mientras un hilo la
+    pide de nuevo (una sola petición a la vez). Solo sin lista previa se
+    espera a la respuesta. Si el bot no responde no se reintenta hasta
+    pasados ``BOT_SERVERS_RETRY`` segundos.
+    """
+    global _fetch_done
+
+    if time.monotonic() < _next_fetch:
+        return _bot_servers_cache or []
+
+    with _cache_lock:
+        if time.monotonic() < _next_fetch:
+            return _bot_servers_cache or []
+        stale = _bot_servers_cache
+        done = _fetch_done
+        owner = done is None
+        if owner:
+            done = _fetch_done = threading.Event()
+
+    if stale is not None:
+        if owner:
+            threading.Thread(
+                target=_fetch_bot_servers, args=(done,), name="bot-servers-refresh", daemon=True
+            ).start()
+        return stale
+
+    if owner:
+        _fetch_bot_servers(done)
+    else:
+        done.wait(_FETCH_TIMEOUT + 1)
+    return _bot_servers_cache or []
+
 
 def get_shared_bot_servers(user_guilds: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Devuelve los servidores del bot que el usuario también tiene.
 
-    Llama a la API interna del bot y cruza con los guilds del usuario.
+    Cruza la lista cacheada de la API interna del bot con los guilds del usuario.
     Si el bot no responde, devuelve lista vacía (no lanza excepción).
 
     Args:
@@ -23,16 +101,8 @@ def get_shared_bot_servers(user_guilds: List[Dict[str, Any]]) -> List[Dict[str,
     Returns:
         Lista de dicts ``{id, name, icon}`` — solo los servidores compartidos.
     """
-    api_secret = os.getenv("API_SECRET")
-    headers = {"X-API-KEY": api_secret}
-    try:
-        response = requests.get(
-            _BOT_API_URL, headers=headers, verify=False, timeout=3
-        )
-        response.raise_for_status()
-        bot_servers: List[Dict[str, Any]] = response.json()
-    except Exception as e:
-        logger.warning(f"No se pudo contactar la API del bot: {e}")
+    bot_servers = get_bot_servers()
+    if not bot_servers:
         return []
 
     # Índice de guilds del usuario por ID para O(1) lookup
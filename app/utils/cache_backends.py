@@ -0,0 +1,436 @@
+"""
+Backends de caché propios para Flask-Caching.
+
+``TieredCache`` pone una LRU en proceso (L1) delante de la caché compartida
+(L2: ``FileSystemCache`` o un servidor con protocolo Redis). La L1 guarda los
+objetos ya deserializados, así que un acierto no toca disco ni red ni hace
+``unpickle``; los valores devueltos son compartidos y deben tratarse como de
+solo lectura.
+
+Cada proceso sincroniza su L1 con L2 como mucho cada CACHE_L1_SYNC_INTERVAL
+segundos con un único ``get_many``:
+
+- Las claves de control (versiones de ``cache.memoize``, sufijo ``_memver``,
+  y generaciones de tags, ``tag-gen:``) también viven en la L1 y se
+  revalidan en esa lectura. Un ``delete_memoized`` o ``invalidate_tags`` en
+  otro proceso cambia la clave de las entradas dependientes en menos de un
+  intervalo, sin vaciar la L1 de nadie.
+- ``delete``, ``inc``/``dec`` y ``clear`` cambian una época guardada en L2;
+  al verla cambiada cada proceso vacía su L1. Son operaciones raras: las
+  invalidaciones habituales van por versiones y tags.
+
+La L2 puede ser cualquier ``BaseCache``: en pruebas basta con
+``TieredCache(RedisCache(host=<cliente compatible con Redis>))``.
+
+``BoundedMemoryCache`` es la alternativa en proceso a ``SimpleCache`` que
+limita bytes en lugar de número de entradas: guarda cada valor picklado
+(como ``SimpleCache``), cuenta su tamaño y expulsa por LRU al pasar del
+presupuesto global o del tope de la función que lo guardó.
+"""
+
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.filesystemcache import FileSystemCache
+from flask_caching.backends.rediscache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+L1_EPOCH_KEY = "__tiered_l1_epoch__"
+# Sufijo de las claves de versión de ``cache.memoize`` (``delete_memoized`` sin args)
+_MEMOIZE_VERSION_SUFFIX = "_memver"
+# Prefijo de las generaciones de tags de ``safe_memoize`` (``invalidate_tags``)
+_TAG_GENERATION_PREFIX = "tag-gen:"
+
+
+class TieredCache(BaseCache):
+    """LRU en proceso (L1) delante de una caché compartida (L2)."""
+
+    def __init__(
+        self,
+        l2: BaseCache,
+        default_timeout: int = 300,
+        l1_max_entries: int = 512,
+        l1_ttl: int = 30,
+        sync_interval: float = 1.0,
+    ) -> None:
+        super().__init__(default_timeout=default_timeout)
+        self.l2 = l2
+        self.l1_max_entries = max(1, l1_max_entries)
+        self.l1_ttl = l1_ttl
+        self.sync_interval = sync_interval
+        self._l1: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch: Any = None
+        self._last_sync = 0.0
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.syncs = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        l2_type = config.get("CACHE_L2", "filesystem")
+        l2: Optional[BaseCache] = None
+        if l2_type == "redis":
+            try:
+                l2 = RedisCache.factory(app, config, [], dict(kwargs))
+            except RuntimeError as e:
+                logger.warning(f"Redis L2 unavailable ({e}), using filesystem cache")
+        if l2 is None:
+            l2 = FileSystemCache.factory(app, config, [], dict(kwargs))
+
+        return cls(
+            l2,
+            default_timeout=kwargs.get("default_timeout", 300),
+            l1_max_entries=int(config.get("CACHE_L1_MAX_ENTRIES", 512)),
+            l1_ttl=int(config.get("CACHE_L1_TTL", 30)),
+            sync_interval=float(config.get("CACHE_L1_SYNC_INTERVAL", 1.0)),
+        )
+
+    # ── L1 ───────────────────────────────────────────────────────────
+
+    def _l1_expiry(self, timeout: Optional[int]) -> float:
+        timeout = self._normalize_timeout(timeout)
+        ttl = self.l1_ttl if timeout <= 0 else min(timeout, self.l1_ttl)
+        return time.monotonic() + ttl
+
+    def _l1_put(self, key: str, value: Any, timeout: Optional[int]) -> None:
+        with self._lock:
+            self._l1[key] = (value, self._l1_expiry(timeout))
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+                self.evictions += 1
+
+    def _l1_get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return False, None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._l1[key]
+                return False, None
+            self._l1.move_to_end(key)
+            return True, value
+
+    def _l1_drop(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def _sync_epoch(self) -> None:
+        """Revalida la L1 contra L2 (época y claves de control) en una sola lectura."""
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        with self._lock:
+            control_keys = [key for key in self._l1 if self._is_control_key(key)]
+        try:
+            epoch, *values = self.l2.get_many(L1_EPOCH_KEY, *control_keys)
+        except Exception as e:
+            logger.warning(f"Could not sync L1 with L2: {e}")
+            return
+        self.syncs += 1
+        with self._lock:
+            if epoch != self._epoch:
+                self._l1.clear()
+                self._epoch = epoch
+                return
+            for key, value in zip(control_keys, values):
+                entry = self._l1.get(key)
+                if entry is None:
+                    continue
+                if value is None:
+                    del self._l1[key]
+                elif value != entry[0]:
+                    self._l1[key] = (value, entry[1])
+
+    def _bump_epoch(self) -> None:
+        # Un token nuevo (no ``inc``): en FileSystemCache ``inc`` es get+set y
+        # dos cambios concurrentes podrían quedar en el mismo valor
+        epoch = uuid.uuid4().hex
+        try:
+            self.l2.set(L1_EPOCH_KEY, epoch, timeout=0)
+        except Exception as e:
+            logger.warning(f"Could not bump L1 epoch in L2: {e}")
+            return
+        self._epoch = epoch
+
+    @staticmethod
+    def _is_control_key(key: str) -> bool:
+        """Versiones de memoize y generaciones de tags: se revalidan en cada sincronización."""
+        return key.endswith(_MEMOIZE_VERSION_SUFFIX) or key.startswith(_TAG_GENERATION_PREFIX)
+
+    # ── API de BaseCache ─────────────────────────────────────────────
+
+    def get(self, key: str) -> Any:
+        self._sync_epoch()
+        found, value = self._l1_get(key)
+        if found:
+            self.l1_hits += 1
+            return value
+        value = self.l2.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.l2_hits += 1
+        self._l1_put(key, value, None)
+        return value
+
+    def set(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        result = self.l2.set(key, value, timeout=timeout)
+        self._l1_put(key, value, timeout)
+        return result
+
+    def add(self, key: str, value: Any, timeout: Optional[int] = None) -> bool:
+        added = self.l2.add(key, value, timeout=timeout)
+        if added:
+            self._l1_put(key, value, timeout)
+        return added
+
+    def delete(self, key: str) -> bool:
+        self._l1_drop(key)
+        result = self.l2.delete(key)
+        self._bump_epoch()
+        return result
+
+    def delete_many(self, *keys: str) -> Any:
+        self._l1_drop(*keys)
+        result = self.l2.delete_many(*keys)
+        self._bump_epoch()
+        return result
+
+    def has(self, key: str) -> bool:
+        found, _ = self._l1_get(key)
+        return found or self.l2.has(key)
+
+    def clear(self) -> bool:
+        with self._lock:
+            self._l1.clear()
+        result = self.l2.clear()
+        self._bump_epoch()
+        return result
+
+    def inc(self, key: str, delta: int = 1) -> Optional[int]:
+        self._l1_drop(key)
+        result = self.l2.inc(key, delta)
+        self._bump_epoch()
+        return result
+
+    def dec(self, key: str, delta: int = 1) -> Optional[int]:
+        self._l1_drop(key)
+        result = self.l2.dec(key, delta)
+        self._bump_epoch()
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Aciertos por nivel, fallos y ocupación de la L1."""
+        with self._lock:
+            entries = len(self._l1)
+        return {
+            "l2": type(self.l2).__name__,
+            "l1_entries": entries,
+            "l1_max_entries": self.l1_max_entries,
+            "l1_hits": self.l1_hits,
+            "l2_hits": self.l2_hits,
+            "misses": self.misses,
+            "l1_evictions": self.evictions,
+            "l2_syncs": self.syncs,
+        }
+
+
+class _SizedEntry:
+    __slots__ = ("data", "size", "expires_at", "group")
+
+    def __init__(self, data: bytes, size: int, expires_at: float, group: Optional[str]) -> None:
+        self.data = data
+        self.size = size
+        self.expires_at = expires_at
+        self.group = group
+
+
+class BoundedMemoryCache(BaseCache):
+    """Caché en proceso con presupuesto de memoria en bytes y expulsión LRU.
+
+    ``set(..., group=, group_max_bytes=)`` asocia la entrada a un grupo (la
+    función memoizada) con su propio tope; ``safe_memoize(max_bytes=...)``
+    los pasa cuando el backend tiene ``supports_groups``.
+    """
+
+    supports_groups = True
+    # Coste aproximado de la clave, la entrada y el hueco en el diccionario
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, default_timeout: int = 300, max_bytes: int = 64 * 1024 * 1024) -> None:
+        super().__init__(default_timeout=default_timeout)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, _SizedEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._resident = 0
+        self._group_bytes: Dict[str, int] = {}
+        self._group_caps: Dict[str, int] = {}
+        # Orden LRU de cada grupo: expulsar dentro de un grupo es O(1)
+        self._group_order: Dict[str, "OrderedDict[str, None]"] = {}
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        return cls(
+            default_timeout=kwargs.get("default_timeout", 300),
+            max_bytes=int(config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        )
+
+    def _expiry(self, timeout: Optional[int]) -> float:
+        timeout = self._normalize_timeout(timeout)
+        return float("inf") if timeout <= 0 else time.monotonic() + timeout
+
+    def _remove(self, key: str) -> Optional[_SizedEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._resident -= entry.size
+            if entry.group is not None:
+                self._group_bytes[entry.group] -= entry.size
+                self._group_order[entry.group].pop(key, None)
+        return entry
+
+    def _evict(self, key: str, now: float) -> None:
+        entry = self._remove(key)
+        if entry is not None and entry.expires_at <= now:
+            self.expirations += 1
+        else:
+            self.evictions += 1
+
+    def _evict_group(self, group: str, cap: int) -> None:
+        """Expulsa las entradas menos usadas del grupo hasta caber en ``cap``."""
+        order = self._group_order.get(group)
+        now = time.monotonic()
+        while order and self._group_bytes[group] > cap:
+            self._evict(next(iter(order)), now)
+
+    def _evict_global(self) -> None:
+        # Por orden LRU; lo caducado que no llega a la cabeza se borra al leerlo
+        now = time.monotonic()
+        while self._resident > self.max_bytes and self._entries:
+            self._evict(next(iter(self._entries)), now)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry.group is not None:
+                self._group_order[entry.group].move_to_end(key)
+            data = entry.data
+        try:
+            return pickle.loads(data)
+        except Exception:
+            return None
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        timeout: Optional[int] = None,
+        group: Optional[str] = None,
+        group_max_bytes: Optional[int] = None,
+    ) -> bool:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            return self._store(key, data, timeout, group, group_max_bytes)
+
+    def _store(
+        self,
+        key: str,
+        data: bytes,
+        timeout: Optional[int],
+        group: Optional[str],
+        group_max_bytes: Optional[int],
+    ) -> bool:
+        """Guarda ``data`` ya picklado; llamar con ``_lock`` adquirido."""
+        size = len(data) + len(key) + self.ENTRY_OVERHEAD
+        cap = self.max_bytes
+        if group is not None and group_max_bytes:
+            self._group_caps[group] = group_max_bytes
+        if group is not None and group in self._group_caps:
+            cap = min(cap, self._group_caps[group])
+        self._remove(key)
+        if size > cap:
+            self.rejections += 1
+            return False
+
+        self._entries[key] = _SizedEntry(data, size, self._expiry(timeout), group)
+        self._resident += size
+        if group is not None:
+            self._group_bytes[group] = self._group_bytes.get(group, 0) + size
+            self._group_order.setdefault(group, OrderedDict())[key] = None
+            self._evict_group(group, cap)
+        if self._resident > self.max_bytes:
+            self._evict_global()
+        return True
+
+    def add(
+        self,
+        key: str,
+        value: Any,
+        timeout: Optional[int] = None,
+        group: Optional[str] = None,
+        group_max_bytes: Optional[int] = None,
+    ) -> bool:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                return False
+            return self._store(key, data, timeout, group, group_max_bytes)
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._remove(key) is not None
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    def clear(self) -> bool:
+        with self._lock:
+            self._entries.clear()
+            self._resident = 0
+            self._group_bytes.clear()
+            self._group_order.clear()
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Bytes residentes (total y por función), entradas y expulsiones."""
+        with self._lock:
+            return {
+                "backend": "BoundedMemoryCache",
+                "resident_bytes": self._resident,
+                "max_bytes": self.max_bytes,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "rejections": self.rejections,
+                "by_function": {
+                    group: {"bytes": size, "max_bytes": self._group_caps.get(group)}
+                    for group, size in self._group_bytes.items()
+                    if size
+                },
+            }
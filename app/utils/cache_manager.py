@@ -2,20 +2,297 @@
 import os
 import hashlib
 import logging
-from typing import Any, Callable, Dict, Optional
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Union
+from flask import current_app
 from flask_caching import Cache
+
+from app.utils.cache_metrics import cache_metrics, render_prometheus
+from app.utils.cache_serializers import decode_cached, get_serializer
 from functools import wraps
 from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
 
-def safe_memoize(timeout: int = 300) -> Callable:
+SINGLE_FLIGHT_TIMEOUT: float = 10.0  # Segundos que un llamante espera al cálculo en curso
+
+
+class _InFlightCall:
+    """Cálculo en curso de una clave: los seguidores esperan a ``done``."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Agrupa los fallos de caché concurrentes de una misma clave en un solo cálculo.
+
+    El primer llamante (líder) ejecuta la función; el resto espera su
+    resultado hasta ``timeout`` segundos y, si se agota, calcula por su cuenta.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        self.coalesced: Dict[str, int] = defaultdict(int)
+        self.timeouts: Dict[str, int] = defaultdict(int)
+
+    def do(self, name: str, key: str, fn: Callable[[], Any], timeout: float) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+            else:
+                self.coalesced[name] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+
+        if not call.done.wait(timeout):
+            self.timeouts[name] += 1
+            logger.warning(f"Single-flight wait timed out on {name}, computing directly")
+            return fn()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            "in_flight": in_flight,
+            "coalesced": dict(self.coalesced),
+            "timeouts": dict(self.timeouts),
+        }
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight_stats() -> Dict[str, Any]:
+    """Llamadas agrupadas y esperas agotadas por función memoizada."""
+    return _single_flight.get_stats()
+
+
+REFRESH_WORKERS: int = int(os.getenv('CACHE_REFRESH_WORKERS', '2'))
+
+
+class _StaleEntry:
+    """Valor cacheado con soft-TTL: fresco hasta ``fresh_until`` (epoch)."""
+
+    __slots__ = ("value", "fresh_until")
+
+    def __init__(self, value: Any, fresh_until: float) -> None:
+        self.value = value
+        self.fresh_until = fresh_until
+
+    def __getstate__(self):
+        return (self.value, self.fresh_until)
+
+    def __setstate__(self, state) -> None:
+        self.value, self.fresh_until = state
+
+
+class _NegativeResult:
+    """Marca de "no existe" cacheada; distinta de un valor ``None`` real o de un fallo."""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        # Al despicklar se recupera el singleton
+        return "NEGATIVE"
+
+    def __repr__(self) -> str:
+        return "NEGATIVE"
+
+
+NEGATIVE = _NegativeResult()
+
+
+class BackgroundRefresher:
+    """Recalcula en segundo plano las entradas caducadas (soft-TTL) de la caché.
+
+    Un pool pequeño de hilos; cada clave tiene como mucho un refresco en curso.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self._max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending: Set[str] = set()
+        self.stale_served: Dict[str, int] = defaultdict(int)
+        self.refreshes: Dict[str, int] = defaultdict(int)
+        self.failures: Dict[str, int] = defaultdict(int)
+
+    def submit(self, name: str, key: str, fn: Callable[[], Any]) -> None:
+        app = current_app._get_current_object()
+        with self._lock:
+            self.stale_served[name] += 1
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers,
+                    thread_name_prefix="cache-refresh",
+                )
+
+        def run() -> None:
+            try:
+                with app.app_context():
+                    fn()
+                self.refreshes[name] += 1
+            except Exception as e:
+                self.failures[name] += 1
+                logger.warning(f"Background refresh failed on {name}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._executor.submit(run)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "stale_served": dict(self.stale_served),
+            "refreshes": dict(self.refreshes),
+            "failures": dict(self.failures),
+        }
+
+
+_refresher = BackgroundRefresher(REFRESH_WORKERS)
+
+
+def get_refresh_stats() -> Dict[str, Any]:
+    """Valores obsoletos servidos y refrescos en segundo plano por función."""
+    return _refresher.get_stats()
+
+
+# ── Tags ────────────────────────────────────────────────────────────
+# Cada tag tiene una generación (token aleatorio) guardada en la propia caché;
+# la clave de una función etiquetada incluye las generaciones de sus tags, así
+# que invalidar un tag es sustituir un único valor y las entradas antiguas
+# quedan huérfanas hasta que caduquen. Funciona en cualquier backend.
+
+TagSpec = Union[str, Callable[..., Union[str, Iterable[str]]]]
+
+
+def _tag_key(tag: str) -> str:
+    return f"tag-gen:{tag}"
+
+
+def _new_generation() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def user_tag(email: str) -> str:
+    """Tag de todas las vistas cacheadas de un usuario."""
+    return f"user:{email}"
+
+
+def _resolve_tags(specs: Iterable[TagSpec], args: tuple, kwargs: dict) -> List[str]:
+    tags: List[str] = []
+    for spec in specs:
+        resolved = spec(*args, **kwargs) if callable(spec) else spec
+        if isinstance(resolved, str):
+            tags.append(resolved)
+        else:
+            tags.extend(resolved)
+    return tags
+
+
+def _tag_generations(tags: List[str]) -> str:
+    """Generaciones actuales de ``tags`` (crea las que falten)."""
+    from app import cache
+
+    keys = [_tag_key(tag) for tag in tags]
+    generations = list(cache.get_many(*keys))
+    for index, generation in enumerate(generations):
+        if generation is None:
+            # add() no pisa la generación que otro proceso acabe de crear
+            cache.add(keys[index], _new_generation(), timeout=0)
+            generations[index] = cache.get(keys[index]) or ""
+    return ".".join(generations)
+
+
+def invalidate_tags(*tags: str) -> None:
+    """Invalida todas las entradas cacheadas con alguno de ``tags`` (una escritura por tag)."""
+    from app import cache
+
+    for tag in tags:
+        cache_metrics.incr_tag(tag)
+        try:
+            cache.set(_tag_key(tag), _new_generation(), timeout=0)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate cache tag {tag}: {e}")
+
+
+def invalidate_user_caches(*emails: str) -> None:
+    """Invalida las vistas cacheadas de los usuarios indicados."""
+    invalidate_tags(*(user_tag(email) for email in emails if email))
+
+
+def safe_memoize(
+    timeout: int = 300,
+    soft_ttl: Optional[int] = None,
+    single_flight: bool = True,
+    single_flight_timeout: float = SINGLE_FLIGHT_TIMEOUT,
+    tags: Iterable[TagSpec] = (),
+    serializer: Any = None,
+    max_bytes: Optional[int] = None,
+    negative_ttl: Optional[int] = None,
+) -> Callable:
     """Decorador que envuelve @cache.memoize con manejo seguro de errores.
     
     Si el backend de caché falla (ej: error de serialización),
     el decorador captura la excepción y ejecuta la función original directamente.
     Esto garantiza que los datos SIEMPRE se devuelven desde MongoDB aunque la caché falle.
+
+    Con ``single_flight`` (por defecto) los fallos concurrentes de la misma
+    clave esperan a un único cálculo en vez de lanzar cada uno su consulta;
+    ver ``get_single_flight_stats()``.
+
+    Con ``soft_ttl`` el valor es fresco durante ``soft_ttl`` segundos y se
+    conserva hasta ``timeout`` (hard-TTL): entre ambos se devuelve al momento
+    el valor obsoleto y un hilo de fondo lo recalcula (stale-while-revalidate).
+
+    ``tags`` son strings fijos o funciones que reciben los argumentos de la
+    llamada (``lambda email: user_tag(email)``); ``invalidate_tags(...)``
+    invalida de golpe todo lo etiquetado con ellos.
+
+    ``serializer`` (``"marshal+zstd"``, un ``CacheSerializer``...) codifica y
+    comprime el valor antes de guardarlo; útil con backends que lo escriben
+    a disco o red (ver ``app/utils/cache_serializers.py``).
+
+    ``max_bytes`` limita la memoria que ocupan las entradas de esta función
+    en backends con presupuesto por grupo (``BoundedMemoryCache``).
+
+    Con ``negative_ttl`` un resultado ``None`` (el registro no existe) se
+    guarda como ``NEGATIVE`` durante ``negative_ttl`` segundos, para que los
+    ids inexistentes repetidos no consulten MongoDB cada vez. Si la función
+    lee el catálogo, etiquetarla con ``CATALOG_TAG`` para que las mutaciones
+    borren también los negativos.
     
     Uso:
         @safe_memoize(timeout=600)
@@ -41,17 +318,77 @@ def safe_memoize(timeout: int = 300) -> Callable:
         # Ahora aplicar @cache.memoize — usará inner_fn.__qualname__ para el cache key
         memoized_fn = cache.memoize(timeout=timeout)(inner_fn)
         
+        name = func.__qualname__
+        tag_specs = tuple(tags)
+        value_serializer = get_serializer(serializer)
+
+        def make_key(*args, **kwargs) -> str:
+            cache_key = memoized_fn.make_cache_key(memoized_fn.uncached, *args, **kwargs)
+            if tag_specs:
+                cache_key += ":" + _tag_generations(_resolve_tags(tag_specs, args, kwargs))
+            return cache_key
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             try:
-                return memoized_fn(*args, **kwargs)
+                cache_key = make_key(*args, **kwargs)
+                cached = cache.get(cache_key)
             except Exception as e:
                 # Caché falló — ejecutar función directamente contra MongoDB
                 logger.warning(f"Cache error on {func.__name__}, falling through to DB: {e}")
+                cache_metrics.incr(name, "errors")
+                cache_metrics.incr(name, "fallbacks")
                 return func(*args, **kwargs)
+
+            def compute() -> Any:
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                elapsed = time.perf_counter() - started
+                stored, ttl = result, timeout
+                if result is None and negative_ttl is not None:
+                    stored, ttl = NEGATIVE, negative_ttl
+                    cache_metrics.observe_compute(name, elapsed, result, 0)
+                elif value_serializer is not None:
+                    stored = value_serializer.encode(result)
+                    cache_metrics.observe_compute(name, elapsed, result, len(stored.payload))
+                else:
+                    cache_metrics.observe_compute(name, elapsed, result)
+                if soft_ttl is not None and stored is not NEGATIVE:
+                    stored = _StaleEntry(stored, time.time() + soft_ttl)
+                try:
+                    if getattr(cache.cache, "supports_groups", False):
+                        cache.set(cache_key, stored, timeout=ttl, group=name, group_max_bytes=max_bytes)
+                    else:
+                        cache.set(cache_key, stored, timeout=ttl)
+                except Exception as e:
+                    logger.warning(f"Cache set failed on {func.__name__}: {e}")
+                    cache_metrics.incr(name, "errors")
+                return result
+
+            if cached is NEGATIVE:
+                cache_metrics.incr(name, "hits")
+                cache_metrics.incr(name, "negative_hits")
+                return None
+            if soft_ttl is None:
+                if cached is not None:
+                    cache_metrics.incr(name, "hits")
+                    return decode_cached(cached)
+            elif isinstance(cached, _StaleEntry):
+                cache_metrics.incr(name, "hits")
+                if time.time() >= cached.fresh_until:
+                    cache_metrics.incr(name, "stale_hits")
+                    _refresher.submit(name, cache_key, compute)
+                return decode_cached(cached.value)
+
+            cache_metrics.incr(name, "misses")
+
+            if single_flight:
+                return _single_flight.do(name, cache_key, compute, single_flight_timeout)
+            return compute()
         
         # Guardar referencia a la función memoizada para delete_memoized
         wrapper._memoized_fn = memoized_fn
+        wrapper._make_cache_key = make_key
         return wrapper
     return decorator
 
@@ -63,14 +400,50 @@ def safe_delete_memoized(func: Callable, *args) -> None:
     de lo contrario intenta directamente con la función proporcionada.
     """
     from app import cache
+    cache_metrics.incr(func.__qualname__, "deletes")
     try:
         target = getattr(func, '_memoized_fn', func)
-        if args:
+        make_key = getattr(func, '_make_cache_key', None)
+        if args and make_key is not None:
+            # La clave incluye las generaciones de los tags de la función
+            cache.delete(make_key(*args))
+        elif args:
             cache.delete_memoized(target, *args)
         else:
             cache.delete_memoized(target)
     except Exception as e:
         logger.warning(f"Failed to delete memoized cache for {func.__name__}: {e}")
+        cache_metrics.incr(func.__qualname__, "errors")
+
+
+def get_cache_metrics() -> Dict[str, Any]:
+    """Métricas por función memoizada más single-flight, refrescos, backend, precarga y user_loader."""
+    from app import cache
+    from app.models.user import get_user_cache_stats
+    from app.utils.warmup import get_warmup_report
+
+    return {
+        **cache_metrics.snapshot(),
+        "single_flight": get_single_flight_stats(),
+        "refresh": get_refresh_stats(),
+        "backend": CacheManager(cache).get_backend_stats(),
+        "warmup": get_warmup_report(),
+        "user_cache": get_user_cache_stats(),
+    }
+
+
+def get_cache_metrics_prometheus() -> str:
+    """Las mismas métricas en formato de texto de Prometheus."""
+    from app import cache
+    from app.models.user import get_user_cache_stats
+
+    return render_prometheus(
+        cache_metrics.snapshot(),
+        get_single_flight_stats(),
+        get_refresh_stats(),
+        backend=CacheManager(cache).get_backend_stats(),
+        user_cache=get_user_cache_stats(),
+    )
 
 class CacheManager:
     """Gestor de caché para optimizar el rendimiento de la aplicación"""
@@ -106,8 +479,15 @@ class CacheManager:
             return wrapper
         return decorator
     
+    def invalidate_tags(self, *tags: str) -> None:
+        """Invalida las entradas memoizadas con esos tags (cualquier backend)."""
+        invalidate_tags(*tags)
+
     def invalidate_pattern(self, pattern: str):
-        """Invalida todas las claves que coincidan con un patrón"""
+        """Invalida todas las claves que coincidan con un patrón.
+
+        Solo funciona en backends con ``scan_iter``; para el resto usar tags.
+        """
         # Nota: Flask-Caching no soporta patrones por defecto
         # Esta es una implementación básica para backends que soporten scan_iter.
         keys_to_delete = []
@@ -135,9 +515,27 @@ class CacheManager:
             'by_category': {
                 'hits': dict(self.hit_stats),
                 'misses': dict(self.miss_stats)
-            }
+            },
+            'single_flight': get_single_flight_stats(),
+            'refresh': get_refresh_stats(),
+            'backend': self.get_backend_stats(),
         }
 
+    def get_backend_stats(self) -> Optional[Dict[str, Any]]:
+        """Estadísticas propias del backend (p. ej. L1/L2 de ``TieredCache``), si las tiene."""
+        backend = getattr(self.cache, 'cache', None)
+        get_stats = getattr(backend, 'get_stats', None)
+        return get_stats() if callable(get_stats) else None
+
+
+def shared_cache_enabled() -> bool:
+    """True si ``CACHE_TYPE`` guarda los valores fuera del proceso (disco o red).
+
+    Solo ahí compensa comprimir con ``serializer=``: en las cachés en memoria
+    el coste de descomprimir en cada lectura no ahorra nada.
+    """
+    return os.getenv('CACHE_TYPE', '') in ('filesystem', 'tiered')
+
 
 def create_cache_config() -> Dict[str, Any]:
     """Crea la configuración del caché según el entorno.
@@ -145,10 +543,32 @@ def create_cache_config() -> Dict[str, Any]:
     Usa SimpleCache (en memoria) por defecto. En Vercel serverless
     el caché se pierde en cold starts, pero safe_memoize garantiza
     que siempre se sirven datos desde MongoDB.
+
+    ``CACHE_TYPE=bounded`` usa ``BoundedMemoryCache`` (presupuesto en bytes,
+    CACHE_MAX_BYTES). ``CACHE_TYPE=tiered`` antepone una LRU en proceso (``TieredCache``) a
+    una caché compartida elegida con ``CACHE_L2`` (``filesystem``/``redis``).
     """
     cache_type = os.getenv('CACHE_TYPE', '')
     
-    if cache_type == 'filesystem':
+    if cache_type == 'bounded':
+        # En memoria como SimpleCache, pero limitada por bytes (LRU)
+        return {
+            'CACHE_TYPE': 'app.utils.cache_backends.BoundedMemoryCache',
+            'CACHE_MAX_BYTES': int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+            'CACHE_DEFAULT_TIMEOUT': 300
+        }
+    elif cache_type == 'tiered':
+        # LRU en proceso delante de la caché compartida (filesystem o redis)
+        return {
+            'CACHE_TYPE': 'app.utils.cache_backends.TieredCache',
+            'CACHE_L2': os.getenv('CACHE_L2', 'filesystem'),
+            'CACHE_DIR': os.getenv('CACHE_DIR', '/tmp/flask-cache'),
+            'CACHE_REDIS_URL': os.getenv('CACHE_REDIS_URL'),
+            'CACHE_L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', '512')),
+            'CACHE_L1_TTL': int(os.getenv('CACHE_L1_TTL', '30')),
+            'CACHE_DEFAULT_TIMEOUT': 300
+        }
+    elif cache_type == 'filesystem':
         return {
             'CACHE_TYPE': 'FileSystemCache',
             'CACHE_DIR': os.getenv('CACHE_DIR', '/tmp/flask-cache'),
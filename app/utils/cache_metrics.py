@@ -0,0 +1,171 @@
+"""
+Métricas de caché por función memoizada.
+
+``safe_memoize`` y ``safe_delete_memoized`` anotan aquí aciertos, fallos,
+errores del backend, caídas directas a MongoDB, invalidaciones, tiempo de
+cálculo y tamaño del resultado. ``render_prometheus`` las vuelca en el
+formato de texto de Prometheus para el endpoint de administración.
+"""
+
+import os
+import pickle
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Picklar cada resultado calculado solo para medirlo duplica la serialización
+# del backend: desactivado por defecto. Con ``serializer=`` el tamaño sale
+# gratis de los bytes ya codificados.
+MEASURE_PAYLOAD: bool = os.getenv("CACHE_METRICS_PAYLOAD_SIZE", "0") == "1"
+
+COUNTERS = ("hits", "stale_hits", "negative_hits", "misses", "errors", "fallbacks", "deletes")
+
+
+def payload_size(value: Any) -> Optional[int]:
+    """Tamaño aproximado en bytes de ``value`` una vez serializado (None si no se puede)."""
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return None
+
+
+class _FunctionMetrics:
+    __slots__ = COUNTERS + (
+        "computes",
+        "compute_seconds",
+        "compute_seconds_max",
+        "payload_bytes_last",
+        "payload_bytes_max",
+    )
+
+    def __init__(self) -> None:
+        for field in self.__slots__:
+            setattr(self, field, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {field: getattr(self, field) for field in self.__slots__}
+        lookups = self.hits + self.misses
+        data["hit_rate"] = round(self.hits * 100 / lookups, 2) if lookups else 0.0
+        data["compute_seconds_avg"] = (
+            round(self.compute_seconds / self.computes, 4) if self.computes else 0.0
+        )
+        return data
+
+
+class CacheMetrics:
+    """Contadores de caché por nombre de función (thread-safe)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._functions: Dict[str, _FunctionMetrics] = defaultdict(_FunctionMetrics)
+        self.tag_invalidations: Dict[str, int] = defaultdict(int)
+
+    def incr(self, name: str, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            metrics = self._functions[name]
+            setattr(metrics, counter, getattr(metrics, counter) + amount)
+
+    def observe_compute(
+        self,
+        name: str,
+        seconds: float,
+        result: Any,
+        size: Optional[int] = None,
+    ) -> None:
+        if size is None and MEASURE_PAYLOAD:
+            size = payload_size(result)
+        with self._lock:
+            metrics = self._functions[name]
+            metrics.computes += 1
+            metrics.compute_seconds += seconds
+            metrics.compute_seconds_max = max(metrics.compute_seconds_max, seconds)
+            if size is not None:
+                metrics.payload_bytes_last = size
+                metrics.payload_bytes_max = max(metrics.payload_bytes_max, size)
+
+    def incr_tag(self, tag: str) -> None:
+        # Los tags de usuario se agrupan para no crear una serie por email
+        family = tag.split(":", 1)[0]
+        with self._lock:
+            self.tag_invalidations[family] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "functions": {name: m.as_dict() for name, m in self._functions.items()},
+                "tag_invalidations": dict(self.tag_invalidations),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._functions.clear()
+            self.tag_invalidations.clear()
+
+
+cache_metrics = CacheMetrics()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(
+    snapshot: Dict[str, Any],
+    single_flight: Dict[str, Any],
+    refresh: Dict[str, Any],
+    prefix: str = "tnglore_cache",
+    backend: Optional[Dict[str, Any]] = None,
+    user_cache: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Exposición en formato de texto de Prometheus (version 0.0.4)."""
+    lines: List[str] = []
+
+    def family(name: str, kind: str, help_text: str, samples: Dict[str, Any], label: str) -> None:
+        metric = f"{prefix}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for key, value in sorted(samples.items()):
+            lines.append(f'{metric}{{{label}="{_escape_label(key)}"}} {value}')
+
+    functions = snapshot["functions"]
+
+    def per_function(field: str) -> Dict[str, Any]:
+        return {name: data[field] for name, data in functions.items()}
+
+    family("hits_total", "counter", "Cache hits (including stale).", per_function("hits"), "function")
+    family("stale_hits_total", "counter", "Stale values served while revalidating.", per_function("stale_hits"), "function")
+    family("negative_hits_total", "counter", "Cached not-found results served.", per_function("negative_hits"), "function")
+    family("misses_total", "counter", "Cache misses.", per_function("misses"), "function")
+    family("errors_total", "counter", "Cache backend errors.", per_function("errors"), "function")
+    family("fallbacks_total", "counter", "Calls served from the database after a cache error.", per_function("fallbacks"), "function")
+    family("deletes_total", "counter", "Explicit invalidations via safe_delete_memoized.", per_function("deletes"), "function")
+    metric = f"{prefix}_compute_seconds"
+    lines.append(f"# HELP {metric} Time spent computing missed values.")
+    lines.append(f"# TYPE {metric} summary")
+    for name, data in sorted(functions.items()):
+        label = f'{{function="{_escape_label(name)}"}}'
+        lines.append(f"{metric}_sum{label} {data['compute_seconds']}")
+        lines.append(f"{metric}_count{label} {data['computes']}")
+    family("compute_seconds_max", "gauge", "Slowest computation observed.", per_function("compute_seconds_max"), "function")
+    family("payload_bytes", "gauge", "Serialized size of the last computed value (0 unless measured).", per_function("payload_bytes_last"), "function")
+    family("payload_bytes_max", "gauge", "Largest serialized value observed.", per_function("payload_bytes_max"), "function")
+    family("coalesced_total", "counter", "Misses that waited on an in-flight computation.", single_flight.get("coalesced", {}), "function")
+    family("refreshes_total", "counter", "Background stale-while-revalidate refreshes.", refresh.get("refreshes", {}), "function")
+    family("tag_invalidations_total", "counter", "Tag generation bumps by tag family.", snapshot["tag_invalidations"], "tag")
+    if backend and "resident_bytes" in backend:
+        by_function = backend.get("by_function", {})
+        name = backend.get("backend", "")
+        family("resident_bytes", "gauge", "Bytes held by the in-process cache backend.", {name: backend["resident_bytes"]}, "backend")
+        family("evictions_total", "counter", "Entries evicted to stay within the memory budget.", {name: backend["evictions"]}, "backend")
+        family("function_resident_bytes", "gauge", "Bytes held per memoized function.", {fn: data["bytes"] for fn, data in by_function.items()}, "function")
+    if user_cache:
+        for field, kind, help_text in (
+            ("hits", "counter", "user_loader cache hits."),
+            ("negative_hits", "counter", "user_loader lookups answered by a cached not-found."),
+            ("misses", "counter", "user_loader cache misses."),
+            ("evictions", "counter", "user_loader entries evicted by the LRU."),
+            ("bytes", "gauge", "Approximate bytes held by the user_loader cache."),
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            family(f"user_{field}{suffix}", kind, help_text, {"user_loader": user_cache[field]}, "cache")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,153 @@
+"""
+Serializadores de valores para la caché, elegibles por función memoizada.
+
+``safe_memoize(serializer=...)`` codifica el resultado antes de guardarlo y
+lo guarda envuelto en un ``EncodedValue``; el backend (``FileSystemCache``,
+Redis) solo pickla ese sobre, que es un ``bytes`` casi sin coste. Codecs:
+
+- ``pickle``: el formato por defecto de Flask-Caching.
+- ``marshal``: binario y el más rápido de codificar para datos tipo JSON
+  (dict, list, str, números, bool, None), aunque no deduplica strings
+  repetidos como pickle. Si el valor lleva otros tipos (``datetime``,
+  ``ObjectId``) se recurre a ``pickle`` para ese valor.
+- ``msgpack``: si el paquete está instalado (dependencia opcional).
+
+Por encima de ``min_size`` bytes el resultado se comprime con ``zstd`` (si
+``zstandard`` está instalado) o ``zlib``. El sobre recuerda el valor
+decodificado, así que en una L1 en proceso solo se decodifica una vez.
+"""
+
+import logging
+import marshal
+import pickle
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:  # Dependencia opcional
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # Dependencia opcional
+    zstandard = None
+
+COMPRESS_MIN_SIZE: int = 1024  # Bytes a partir de los que se comprime
+
+_Codec = Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]
+
+_CODECS: Dict[str, _Codec] = {
+    "pickle": (
+        lambda value: pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+        pickle.loads,
+    ),
+    "marshal": (marshal.dumps, marshal.loads),
+}
+if msgpack is not None:
+    _CODECS["msgpack"] = (
+        lambda value: msgpack.packb(value, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False),
+    )
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+_COMPRESSORS: Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+}
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = (_zstd_compress, _zstd_decompress)
+
+_UNSET = object()
+
+
+class EncodedValue:
+    """Valor ya codificado: ``codec`` + compresión opcional + ``payload``."""
+
+    __slots__ = ("codec", "compression", "payload", "_decoded")
+
+    def __init__(
+        self,
+        codec: str,
+        compression: Optional[str],
+        payload: bytes,
+        decoded: Any = _UNSET,
+    ) -> None:
+        self.codec = codec
+        self.compression = compression
+        self.payload = payload
+        self._decoded = decoded
+
+    def __getstate__(self):
+        return (self.codec, self.compression, self.payload)
+
+    def __setstate__(self, state) -> None:
+        self.codec, self.compression, self.payload = state
+        self._decoded = _UNSET
+
+    def decode(self) -> Any:
+        if self._decoded is _UNSET:
+            data = self.payload
+            if self.compression:
+                data = _COMPRESSORS[self.compression][1](data)
+            self._decoded = _CODECS[self.codec][1](data)
+        return self._decoded
+
+
+class CacheSerializer:
+    """Codifica valores con ``codec`` y los comprime por encima de ``min_size`` bytes."""
+
+    def __init__(
+        self,
+        codec: str = "marshal",
+        compression: Optional[str] = "zstd",
+        min_size: int = COMPRESS_MIN_SIZE,
+    ) -> None:
+        if codec not in _CODECS:
+            logger.warning(f"Cache codec {codec} unavailable, using pickle")
+            codec = "pickle"
+        if compression == "zstd" and "zstd" not in _COMPRESSORS:
+            compression = "zlib"
+        if compression is not None and compression not in _COMPRESSORS:
+            raise ValueError(f"Unknown cache compression: {compression}")
+        self.codec = codec
+        self.compression = compression
+        self.min_size = min_size
+
+    def encode(self, value: Any) -> EncodedValue:
+        codec = self.codec
+        try:
+            data = _CODECS[codec][0](value)
+        except (ValueError, TypeError):
+            # Tipos que el codec compacto no admite: este valor va en pickle
+            codec = "pickle"
+            data = _CODECS[codec][0](value)
+
+        compression = None
+        if self.compression and len(data) >= self.min_size:
+            compressed = _COMPRESSORS[self.compression][0](data)
+            if len(compressed) < len(data):
+                compression, data = self.compression, compressed
+        return EncodedValue(codec, compression, data, decoded=value)
+
+
+def get_serializer(spec: Any) -> Optional[CacheSerializer]:
+    """Acepta un ``CacheSerializer``, un nombre (``"marshal+zstd"``, ``"pickle"``) o None."""
+    if spec is None or isinstance(spec, CacheSerializer):
+        return spec
+    codec, _, compression = str(spec).partition("+")
+    return CacheSerializer(codec, compression or None)
+
+
+def decode_cached(value: Any) -> Any:
+    """Devuelve el valor original si ``value`` es un ``EncodedValue``."""
+    return value.decode() if isinstance(value, EncodedValue) else value
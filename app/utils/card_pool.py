@@ -0,0 +1,25 @@
+"""
+Pool de cartas indexado por rareza para los sorteos.
+
+Es una vista sobre el snapshot del catálogo (``app.utils.catalog``): evita
+lanzar una agregación ``$match`` + ``$sample`` contra ``collectables`` por
+cada carta sorteada y se recarga cuando cambia la versión del catálogo.
+"""
+
+import random
+from typing import Any, Dict, List, Optional
+
+from app.utils.catalog import get_catalog
+
+
+def get_card_pool() -> Dict[str, List[Dict[str, Any]]]:
+    """Devuelve el pool ``rareza -> [cartas]`` del snapshot vigente."""
+    return get_catalog().cards_by_rarity
+
+
+def draw_card(rarity: str) -> Optional[Dict[str, Any]]:
+    """Devuelve una carta aleatoria de la rareza indicada, o None si no hay."""
+    cards = get_card_pool().get(rarity)
+    if not cards:
+        return None
+    return dict(random.choice(cards))
@@ -0,0 +1,177 @@
+"""
+Snapshot en memoria del catálogo (``collectables`` + ``collections``).
+
+Ambas colecciones son pequeñas y casi nunca cambian, así que se cargan una
+vez por proceso y se indexan por id, rareza y colección. Cada snapshot lleva
+la versión compartida del catálogo, un entero que solo crece y vive en
+``meta`` (``{_id: "catalog"}``). Las mutaciones del panel de administración
+la incrementan con ``bump_catalog_version``; el resto de instancias lo
+detectan al comprobar la versión cada CATALOG_CHECK_INTERVAL segundos (una
+lectura de un documento diminuto) y recargan.
+
+Los documentos del snapshot son compartidos: quien los vaya a modificar
+debe copiarlos antes.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from app.utils.cache_manager import invalidate_tags
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CHECK_INTERVAL: int = 30  # Segundos entre comprobaciones de versión
+_META_ID = "catalog"
+CATALOG_TAG = "catalog"  # Tag de caché de las vistas que incluyen datos del catálogo
+
+
+class CatalogSnapshot:
+    """Vista inmutable del catálogo con sus índices."""
+
+    __slots__ = (
+        "version",
+        "cards",
+        "cards_by_id",
+        "cards_by_rarity",
+        "cards_by_collection",
+        "collections",
+        "collections_by_id",
+    )
+
+    def __init__(
+        self,
+        version: int,
+        cards: List[Dict[str, Any]],
+        collections: List[Dict[str, Any]],
+    ) -> None:
+        self.version = version
+        self.cards = cards
+        self.collections = collections
+        self.cards_by_id: Dict[str, Dict[str, Any]] = {}
+        self.cards_by_rarity: Dict[str, List[Dict[str, Any]]] = {}
+        self.cards_by_collection: Dict[str, List[Dict[str, Any]]] = {}
+        for card in cards:
+            self.cards_by_id[card["_id"]] = card
+            if card.get("rareza"):
+                self.cards_by_rarity.setdefault(card["rareza"], []).append(card)
+            if card.get("coleccion"):
+                self.cards_by_collection.setdefault(card["coleccion"], []).append(card)
+        self.collections_by_id: Dict[str, Dict[str, Any]] = {
+            collection["_id"]: collection for collection in collections
+        }
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_last_check: float = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _serialize(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte los ObjectId a string (mismo formato que la API)."""
+    return {
+        key: str(value) if isinstance(value, ObjectId) else value
+        for key, value in doc.items()
+    }
+
+
+def _read_shared_version() -> int:
+    from app import mongo
+
+    meta = mongo.meta.find_one({"_id": _META_ID}, {"version": 1})
+    return int(meta.get("version", 0)) if meta else 0
+
+
+def _load_snapshot(version: int) -> CatalogSnapshot:
+    from app import mongo
+
+    cards = [_serialize(card) for card in mongo.collectables.find({})]
+    collections = [_serialize(col) for col in mongo.collections.find({})]
+    snapshot = CatalogSnapshot(version, cards, collections)
+    logger.info(
+        f"Catalog snapshot v{version} loaded: "
+        f"{len(cards)} cards, {len(collections)} collections"
+    )
+    return snapshot
+
+
+def get_catalog() -> CatalogSnapshot:
+    """Devuelve el snapshot vigente, recargándolo si la versión compartida cambió."""
+    global _snapshot, _last_check
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _last_check < CATALOG_CHECK_INTERVAL:
+        return snapshot
+
+    with _catalog_lock:
+        if _snapshot is not None and time.monotonic() - _last_check < CATALOG_CHECK_INTERVAL:
+            return _snapshot
+        try:
+            version = _read_shared_version()
+            if _snapshot is None or _snapshot.version != version:
+                _snapshot = _load_snapshot(version)
+            _last_check = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error loading catalog snapshot: {e}", exc_info=True)
+            if _snapshot is None:
+                return CatalogSnapshot(0, [], [])
+        return _snapshot
+
+
+def get_catalog_version() -> int:
+    """Versión del snapshot vigente."""
+    return get_catalog().version
+
+
+def bump_catalog_version() -> int:
+    """Incrementa la versión compartida y recarga el snapshot de este proceso.
+
+    Llamar después de cualquier alta, edición o baja de cartas o colecciones.
+    También invalida las entradas memoizadas con el tag ``CATALOG_TAG``.
+    """
+    global _snapshot, _last_check
+    from app import mongo
+
+    meta = mongo.meta.find_one_and_update(
+        {"_id": _META_ID},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=True,
+    )
+    version = int(meta["version"])
+    with _catalog_lock:
+        try:
+            _snapshot = _load_snapshot(version)
+            _last_check = time.monotonic()
+        except Exception as e:
+            logger.error(f"Error reloading catalog snapshot: {e}", exc_info=True)
+            _snapshot = None
+    invalidate_tags(CATALOG_TAG)
+    return version
+
+
+def get_card(card_id: str) -> Optional[Dict[str, Any]]:
+    """Carta por id (documento compartido, solo lectura) o None."""
+    return get_catalog().cards_by_id.get(str(card_id))
+
+
+def get_cards(card_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Cartas por id para una lista de ids; los desconocidos se omiten."""
+    cards_by_id = get_catalog().cards_by_id
+    return {
+        card_id: cards_by_id[card_id]
+        for card_id in map(str, card_ids)
+        if card_id in cards_by_id
+    }
+
+
+def get_collection(collection_id: str) -> Optional[Dict[str, Any]]:
+    """Colección por id (documento compartido, solo lectura) o None."""
+    return get_catalog().collections_by_id.get(str(collection_id))
+
+
+def get_collection_card_list(collection_id: str) -> List[Dict[str, Any]]:
+    """Cartas de una colección (lista compartida, solo lectura)."""
+    return get_catalog().cards_by_collection.get(str(collection_id), [])
@@ -0,0 +1,101 @@
+"""
+Motor de sorteo por lotes para la apertura de cofres.
+
+En lugar de tirar un dado y recorrer la tabla de probabilidades por cada
+carta, se sortea de una vez cuántas cartas salen de cada rareza (una
+distribución multinomial sobre la ``RarityDistribution`` compilada desde
+``chest_config``) y después se eligen en bloque las cartas de cada rareza
+del pool en memoria. Abrir 1.000 cofres cuesta prácticamente lo mismo que
+abrir uno.
+"""
+
+import random
+from typing import Any, Dict, List, Sequence, Tuple
+
+# random.binomialvariate existe desde Python 3.12; en versiones anteriores
+# se recurre a random.choices (también implementado en C).
+_HAS_BINOMIAL: bool = hasattr(random, "binomialvariate")
+
+
+class RarityDistribution:
+    """Distribución de probabilidades fija sobre un conjunto de resultados.
+
+    Se compila una vez por tipo de cofre al recargar ``game_config.yaml``
+    (probabilidades normalizadas y pesos acumulados), de modo que cada
+    apertura solo tiene que sortear los recuentos por rareza.
+    """
+
+    __slots__ = ("outcomes", "probabilities", "_cum_weights")
+
+    def __init__(self, outcomes: Sequence[str], weights: Sequence[float]) -> None:
+        if not outcomes or len(outcomes) != len(weights):
+            raise ValueError("outcomes y weights deben tener la misma longitud (> 0)")
+        if any(w < 0 for w in weights):
+            raise ValueError("Los pesos no pueden ser negativos")
+        total = float(sum(weights))
+        if total <= 0:
+            raise ValueError("La suma de pesos debe ser positiva")
+
+        self.outcomes: Tuple[str, ...] = tuple(outcomes)
+        self.probabilities: Tuple[float, ...] = tuple(w / total for w in weights)
+        cumulative = 0.0
+        cum_weights: List[float] = []
+        for p in self.probabilities:
+            cumulative += p
+            cum_weights.append(cumulative)
+        self._cum_weights: Tuple[float, ...] = tuple(cum_weights)
+
+    def sample_counts(self, total: int) -> Dict[str, int]:
+        """Sortea cuántos de ``total`` resultados caen en cada opción (multinomial)."""
+        counts: Dict[str, int] = {outcome: 0 for outcome in self.outcomes}
+        if total <= 0:
+            return counts
+
+        if not _HAS_BINOMIAL:
+            for outcome in random.choices(
+                self.outcomes, cum_weights=self._cum_weights, k=total
+            ):
+                counts[outcome] += 1
+            return counts
+
+        # Método condicional: n_i ~ Binomial(restantes, p_i / masa_restante)
+        remaining = total
+        remaining_mass = 1.0
+        for outcome, p in zip(self.outcomes[:-1], self.probabilities[:-1]):
+            if remaining == 0:
+                break
+            ratio = min(1.0, p / remaining_mass) if remaining_mass > 0 else 0.0
+            drawn = random.binomialvariate(remaining, ratio) if ratio > 0 else 0
+            counts[outcome] = drawn
+            remaining -= drawn
+            remaining_mass -= p
+        counts[self.outcomes[-1]] += remaining
+        return counts
+
+
+def draw_cards_bulk(
+    pool: Dict[str, List[Dict[str, Any]]],
+    sampler: RarityDistribution,
+    total_cards: int,
+) -> List[Dict[str, Any]]:
+    """Sortea ``total_cards`` cartas del pool de una sola vez.
+
+    Las cartas salen agrupadas por rareza (el cliente las agrupa igualmente)
+    y son referencias al pool: deben tratarse como solo lectura. Si una
+    rareza no tiene cartas se añade un marcador ``Sin carta <rareza>`` como
+    hacía el sorteo clásico.
+    """
+    counts = sampler.sample_counts(total_cards)
+
+    cards: List[Dict[str, Any]] = []
+    for rarity, count in counts.items():
+        if count <= 0:
+            continue
+        candidates = pool.get(rarity)
+        if candidates:
+            cards.extend(random.choices(candidates, k=count))
+        else:
+            placeholder = {"nombre": f"Sin carta {rarity}", "rareza": rarity}
+            cards.extend(dict(placeholder) for _ in range(count))
+
+    return cards
@@ -0,0 +1,238 @@
+"""
+Inventario de cofres por conteo.
+
+Los cofres de un usuario se guardan como contadores enteros anidados por
+servidor y rareza::
+
+    chest_counts: {"<servidor>": {"<rareza>": <n>}}
+
+Abrir cofres es un único ``$inc`` negativo protegido por ``$gte`` en el
+filtro, así que concurrentes aperturas y concesiones nunca se pisan ni
+mueven el array completo.
+
+El bot de Discord sigue añadiendo IDs de cofre al array legado ``chests``.
+Esas entradas se pliegan en los contadores la próxima vez que el usuario
+abre un cofre (``fold_legacy_chests``) o en bloque desde el panel de
+administración (``migrate_all_chest_inventories``). Los lectores combinan
+ambas representaciones mientras tanto (``get_chest_counts``).
+"""
+
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from pymongo.client_session import ClientSession
+
+from app.utils.chest_registry import resolve_chests
+from app.utils.inventory import apply_inventory_update
+
+logger = logging.getLogger(__name__)
+
+COUNTS_FIELD = "chest_counts"
+LEGACY_FIELD = "chests"
+_FOLD_MAX_RETRIES = 5
+
+ChestCounts = Dict[str, Dict[str, int]]
+
+
+def _count_path(servidor: str, rarity: str) -> str:
+    """Ruta con puntos del contador de un tipo de cofre."""
+    return f"{COUNTS_FIELD}.{servidor}.{rarity}"
+
+
+def _legacy_to_counts(chest_ids: List[str]) -> ChestCounts:
+    """Agrupa un array legado de IDs en contadores ``servidor -> rareza -> n``."""
+    counts: ChestCounts = {}
+    if not chest_ids:
+        return counts
+
+    resolved = resolve_chests(chest_ids)
+    for chest_id, amount in Counter(chest_ids).items():
+        rarity, servidor = resolved.get(chest_id, (None, None))
+        if not rarity or not servidor:
+            continue
+        by_rarity = counts.setdefault(servidor, {})
+        by_rarity[rarity] = by_rarity.get(rarity, 0) + amount
+    return counts
+
+
+def get_chest_counts(user_data: Dict[str, Any]) -> ChestCounts:
+    """Devuelve los contadores del usuario sumando las entradas legadas sin plegar.
+
+    Solo lectura: no modifica el documento.
+    """
+    counts: ChestCounts = {}
+    for servidor, by_rarity in (user_data.get(COUNTS_FIELD) or {}).items():
+        for rarity, amount in (by_rarity or {}).items():
+            if amount and amount > 0:
+                counts.setdefault(servidor, {})[rarity] = int(amount)
+
+    for servidor, by_rarity in _legacy_to_counts(user_data.get(LEGACY_FIELD) or []).items():
+        target = counts.setdefault(servidor, {})
+        for rarity, amount in by_rarity.items():
+            target[rarity] = target.get(rarity, 0) + amount
+
+    return counts
+
+
+def total_chests(user_data: Dict[str, Any]) -> int:
+    """Número total de cofres del usuario (sin resolver IDs legados)."""
+    total = sum(
+        int(amount)
+        for by_rarity in (user_data.get(COUNTS_FIELD) or {}).values()
+        for amount in (by_rarity or {}).values()
+        if amount and amount > 0
+    )
+    return total + len(user_data.get(LEGACY_FIELD) or [])
+
+
+def fold_legacy_chests(query: Dict[str, Any]) -> bool:
+    """Pliega el array legado ``chests`` del usuario en ``chest_counts``.
+
+    Solo se retiran (``$pull``) los IDs que el registro sabe resolver; los
+    desconocidos se quedan en el array y se registran en el log para no
+    perder cofres que quizá se den de alta más tarde. La escritura se
+    protege con ``$size`` (no con el array completo): el bot solo añade al
+    final, así que si el tamaño no cambió nadie tocó el array entre la
+    lectura y la escritura.
+
+    Returns:
+        True si el usuario quedó sin entradas legadas.
+    """
+    from app import mongo
+
+    for _ in range(_FOLD_MAX_RETRIES):
+        user_data = mongo.users.find_one(query, {LEGACY_FIELD: 1})
+        if not user_data:
+            return False
+
+        chest_ids: List[str] = user_data.get(LEGACY_FIELD) or []
+        if not chest_ids:
+            return True
+
+        resolved = resolve_chests(chest_ids)
+        foldable = [
+            chest_id for chest_id, (rarity, servidor) in resolved.items()
+            if rarity and servidor
+        ]
+        unresolved = sorted(set(chest_ids) - set(foldable))
+        if unresolved:
+            logger.warning(
+                f"Leaving {len(unresolved)} unresolved legacy chest ids for "
+                f"{user_data['_id']}: {unresolved}"
+            )
+        if not foldable:
+            return False
+
+        increments = {
+            _count_path(servidor, rarity): amount
+            for servidor, by_rarity in _legacy_to_counts(chest_ids).items()
+            for rarity, amount in by_rarity.items()
+        }
+        result = mongo.users.update_one(
+            {"_id": user_data["_id"], LEGACY_FIELD: {"$size": len(chest_ids)}},
+            {"$pull": {LEGACY_FIELD: {"$in": foldable}}, "$inc": increments},
+        )
+        if result.modified_count == 1:
+            return not unresolved
+
+    logger.warning(f"Could not fold legacy chests for {query} after retries")
+    return False
+
+
+def grant_chests(email: str, servidor: str, rarity: str, amount: int = 1) -> bool:
+    """Suma ``amount`` cofres de ``rarity`` en ``servidor`` al usuario."""
+    from app import mongo
+
+    if amount < 1:
+        return False
+    result = mongo.users.update_one(
+        {"email": email},
+        {"$inc": {_count_path(servidor, rarity): amount}},
+    )
+    return result.matched_count == 1
+
+
+def available_chests(email: str, servidor: str, rarity: str) -> int:
+    """Cofres disponibles de un tipo (pliega antes las entradas legadas)."""
+    from app import mongo
+
+    fold_legacy_chests({"email": email})
+    path = _count_path(servidor, rarity)
+    user_data = mongo.users.find_one({"email": email}, {path: 1})
+    if not user_data:
+        return 0
+    return int((user_data.get(COUNTS_FIELD) or {}).get(servidor, {}).get(rarity, 0) or 0)
+
+
+def consume_chests(
+    email: str,
+    servidor: str,
+    rarity: str,
+    quantity: int,
+    card_ids: List[str],
+    session: Optional[ClientSession] = None,
+) -> bool:
+    """Resta ``quantity`` cofres y entrega ``card_ids`` en una sola escritura.
+
+    Ambos cambios viven en el mismo documento de usuario, así que la
+    escritura es atómica (y sube la versión de inventario): el filtro exige ``$gte`` de la cantidad (el
+    contador nunca baja de cero) y que el usuario esté en ``servidor``.
+
+    Returns:
+        True si se aplicó; False si no quedaban cofres suficientes o el
+        usuario no pertenece al servidor.
+    """
+    path = _count_path(servidor, rarity)
+    version = apply_inventory_update(
+        {"email": email, "guilds.id": servidor, path: {"$gte": quantity}},
+        {
+            "$inc": {path: -quantity},
+            "$push": {"guilds.$.coleccionables": {"$each": card_ids}},
+        },
+        email,
+        servidor,
+        added=card_ids,
+        session=session,
+    )
+    return version is not None
+
+
+def reset_chest_updates() -> Dict[str, Any]:
+    """Campos ``$set`` que dejan el inventario de cofres vacío."""
+    return {LEGACY_FIELD: [], COUNTS_FIELD: {}}
+
+
+def migrate_all_chest_inventories(batch_size: int = 500) -> Dict[str, int]:
+    """Pliega el array legado de todos los usuarios que aún lo tengan.
+
+    Returns:
+        Resumen con usuarios procesados, migrados y fallidos.
+    """
+    from app import mongo
+
+    summary = {"scanned": 0, "migrated": 0, "failed": 0}
+    cursor = mongo.users.find(
+        {f"{LEGACY_FIELD}.0": {"$exists": True}}, {"_id": 1}
+    ).batch_size(batch_size)
+
+    for user_data in cursor:
+        summary["scanned"] += 1
+        if fold_legacy_chests({"_id": user_data["_id"]}):
+            summary["migrated"] += 1
+        else:
+            summary["failed"] += 1
+
+    logger.info(f"Chest inventory migration finished: {summary}")
+    return summary
+
+
+def counts_to_entries(counts: ChestCounts) -> List[Dict[str, Any]]:
+    """Aplana los contadores a ``[{servidor, chest_type, count}]`` (count > 0)."""
+    return [
+        {"chest_type": rarity, "servidor": servidor, "count": amount}
+        for servidor, by_rarity in counts.items()
+        for rarity, amount in by_rarity.items()
+        if amount > 0
+    ]
+
@@ -0,0 +1,112 @@
+"""
+Registro en memoria ``chest_id -> (rareza, servidor)``.
+
+Los documentos de ``chests`` son diminutos y prácticamente inmutables (los
+cofres de recompensa incluso reutilizan uno por servidor y rareza), así que
+se cargan una vez por proceso en el primer uso. Los IDs desconocidos se
+buscan en MongoDB en una sola consulta y se añaden al registro;
+``register_chest`` lo mantiene al día cuando se crea un cofre nuevo.
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+ChestInfo = Tuple[str, str]  # (rareza, servidor)
+
+_registry: Dict[str, ChestInfo] = {}
+_by_type: Dict[ChestInfo, str] = {}
+_loaded: bool = False
+_registry_lock = threading.Lock()
+
+
+def _store(chest_id: str, rarity: Optional[str], servidor: Optional[str]) -> None:
+    """Guarda una entrada (llamar con el lock tomado)."""
+    if not rarity or not servidor:
+        return
+    info = (rarity, servidor)
+    _registry[chest_id] = info
+    _by_type.setdefault(info, chest_id)
+
+
+def _ensure_loaded() -> None:
+    """Carga todos los cofres la primera vez que se usa el registro."""
+    global _loaded
+    if _loaded:
+        return
+
+    from app import mongo
+
+    with _registry_lock:
+        if _loaded:
+            return
+        try:
+            for doc in mongo.chests.find({}, {"rarity": 1, "servidor": 1}):
+                _store(str(doc["_id"]), doc.get("rarity"), doc.get("servidor"))
+            _loaded = True
+            logger.info(f"Chest registry loaded: {len(_registry)} chests")
+        except Exception as e:
+            logger.error(f"Error loading chest registry: {e}", exc_info=True)
+
+
+def _fetch_missing(chest_ids: List[str]) -> None:
+    """Busca en MongoDB los IDs que no están en el registro."""
+    from app import mongo
+
+    object_ids: List[ObjectId] = []
+    for chest_id in chest_ids:
+        try:
+            object_ids.append(ObjectId(chest_id))
+        except Exception:
+            logger.warning(f"Invalid chest id found for user inventory: {chest_id}")
+
+    if not object_ids:
+        return
+
+    docs = list(
+        mongo.chests.find({"_id": {"$in": object_ids}}, {"rarity": 1, "servidor": 1})
+    )
+    with _registry_lock:
+        for doc in docs:
+            _store(str(doc["_id"]), doc.get("rarity"), doc.get("servidor"))
+
+
+def resolve_chests(chest_ids: Iterable[str]) -> Dict[str, ChestInfo]:
+    """Traduce IDs de cofre a ``(rareza, servidor)``; los desconocidos se omiten."""
+    _ensure_loaded()
+
+    unique_ids = set(chest_ids)
+    missing = [chest_id for chest_id in unique_ids if chest_id not in _registry]
+    if missing:
+        _fetch_missing(missing)
+
+    return {
+        chest_id: _registry[chest_id]
+        for chest_id in unique_ids
+        if chest_id in _registry
+    }
+
+
+def find_chest_id(rarity: str, servidor: str) -> Optional[str]:
+    """Devuelve un ID de cofre existente para ``(rareza, servidor)``, si lo hay."""
+    _ensure_loaded()
+    return _by_type.get((rarity, servidor))
+
+
+def register_chest(chest_id: str, rarity: str, servidor: str) -> None:
+    """Añade al registro un cofre recién creado."""
+    with _registry_lock:
+        _store(str(chest_id), rarity, servidor)
+
+
+def clear_chest_registry() -> None:
+    """Vacía el registro; se recargará en el siguiente uso."""
+    global _loaded
+    with _registry_lock:
+        _registry.clear()
+        _by_type.clear()
+        _loaded = False
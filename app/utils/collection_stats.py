@@ -0,0 +1,216 @@
+"""
+Estadísticas de compleción de la colección de cada usuario.
+
+Se guardan en ``collection_stats`` (``_id`` = email), un documento pequeño
+con las copias por carta (``cards``, sumando todos los guilds) y las cartas
+distintas que posee por colección y por rareza. ``apply_inventory_update``
+llama a ``record_inventory_change`` tras cada alta o baja: se leen las copias
+actuales de las cartas afectadas para saber cuáles pasan de 0 a 1 (o de 1 a
+0), y las copias, las distintas y la versión se actualizan en un único
+``update_one`` protegido por la versión anterior.
+
+Cada documento lleva la ``inventory_version`` y la versión del catálogo con
+las que está al día. Un cambio solo se aplica si el documento está justo en
+la versión anterior; si no (historial perdido, escrituras desordenadas,
+reset, catálogo nuevo) la lectura lo detecta y lo reconstruye desde el
+inventario.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from pymongo.client_session import ClientSession
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.catalog import get_catalog
+
+logger = logging.getLogger(__name__)
+
+
+def _crossings(
+    before: Dict[str, int],
+    deltas: Dict[str, int],
+) -> Dict[str, int]:
+    """Cambios en cartas distintas: +1 si una carta pasa de 0 a >0, -1 al revés."""
+    crossings: Dict[str, int] = {}
+    for card_id, delta in deltas.items():
+        old = int(before.get(card_id, 0) or 0)
+        new = old + delta
+        if old <= 0 < new:
+            crossings[card_id] = 1
+        elif new <= 0 < old:
+            crossings[card_id] = -1
+    return crossings
+
+
+def record_inventory_change(
+    email: str,
+    version: int,
+    added: Optional[List[str]] = None,
+    removed: Optional[List[str]] = None,
+    reset: bool = False,
+    session: Optional[ClientSession] = None,
+) -> None:
+    """Aplica un cambio de inventario (ya escrito, versión ``version``) a las estadísticas."""
+    from app import mongo
+
+    if reset:
+        mongo.collection_stats.delete_one({"_id": email}, session=session)
+        return
+
+    deltas: Dict[str, int] = {}
+    for card_id in added or []:
+        deltas[card_id] = deltas.get(card_id, 0) + 1
+    for card_id in removed or []:
+        deltas[card_id] = deltas.get(card_id, 0) - 1
+    deltas = {card_id: delta for card_id, delta in deltas.items() if delta}
+
+    # Solo avanza un documento que esté justo en la versión anterior
+    guard = {"_id": email, "version": version - 1}
+    update: Dict[str, Any] = {"$set": {"version": version}}
+    if deltas:
+        before = mongo.collection_stats.find_one(
+            guard,
+            {f"cards.{card_id}": 1 for card_id in deltas},
+            session=session,
+        )
+        if before is None:
+            return
+
+        cards_by_id = get_catalog().cards_by_id
+        increments = {f"cards.{card_id}": delta for card_id, delta in deltas.items()}
+        for card_id, change in _crossings(before.get("cards") or {}, deltas).items():
+            card = cards_by_id.get(card_id)
+            if not card:
+                continue
+            keys = ["distinct.total"]
+            if card.get("coleccion"):
+                keys.append(f"distinct.by_collection.{card['coleccion']}")
+            if card.get("rareza"):
+                keys.append(f"distinct.by_rarity.{card['rareza']}")
+            for key in keys:
+                increments[key] = increments.get(key, 0) + change
+        update["$inc"] = increments
+
+    # Versión, copias y distintas en una sola escritura: si otro cambio avanzó
+    # el documento entre la lectura y aquí, el filtro no casa y no se aplica
+    mongo.collection_stats.update_one(guard, update, session=session)
+
+
+def _build_stats_doc(email: str, user_data: Dict[str, Any], catalog_version: int) -> Dict[str, Any]:
+    """Documento de estadísticas calculado desde cero a partir del inventario."""
+    cards: Dict[str, int] = {}
+    for guild in user_data.get("guilds") or []:
+        for card_id in guild.get("coleccionables") or []:
+            if isinstance(card_id, str):
+                cards[card_id] = cards.get(card_id, 0) + 1
+
+    cards_by_id = get_catalog().cards_by_id
+    by_collection: Dict[str, int] = {}
+    by_rarity: Dict[str, int] = {}
+    total = 0
+    for card_id in cards:
+        card = cards_by_id.get(card_id)
+        if not card:
+            continue
+        total += 1
+        if card.get("coleccion"):
+            by_collection[card["coleccion"]] = by_collection.get(card["coleccion"], 0) + 1
+        if card.get("rareza"):
+            by_rarity[card["rareza"]] = by_rarity.get(card["rareza"], 0) + 1
+
+    return {
+        "_id": email,
+        "version": int(user_data.get("inventory_version", 0)),
+        "catalog_version": catalog_version,
+        "cards": cards,
+        "distinct": {"total": total, "by_collection": by_collection, "by_rarity": by_rarity},
+    }
+
+
+def rebuild_collection_stats(email: str) -> Optional[Dict[str, Any]]:
+    """Recalcula y guarda las estadísticas del usuario (None si no existe)."""
+    from app import mongo
+
+    user_data = mongo.users.find_one(
+        {"email": email},
+        {"guilds.coleccionables": 1, "inventory_version": 1},
+    )
+    if not user_data:
+        return None
+
+    doc = _build_stats_doc(email, user_data, get_catalog().version)
+    try:
+        # No pisar un documento que ya vaya por delante
+        mongo.collection_stats.replace_one(
+            {"_id": email, "version": {"$lte": doc["version"]}},
+            doc,
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass
+    return doc
+
+
+def _percent(owned: int, total: int) -> float:
+    return round(owned * 100 / total, 1) if total else 0.0
+
+
+def get_collection_stats(email: str) -> Optional[Dict[str, Any]]:
+    """Compleción del usuario por colección y rareza, con totales del catálogo.
+
+    Lee el documento proyectado (sin ``cards``) y solo lo reconstruye si no
+    está al día con la versión de inventario o del catálogo.
+    """
+    from app import mongo
+
+    user_data = mongo.users.find_one({"email": email}, {"inventory_version": 1})
+    if not user_data:
+        return None
+
+    catalog = get_catalog()
+    stats = mongo.collection_stats.find_one({"_id": email}, {"cards": 0})
+    if (
+        not stats
+        or stats.get("version") != int(user_data.get("inventory_version", 0))
+        or stats.get("catalog_version") != catalog.version
+    ):
+        stats = rebuild_collection_stats(email)
+        if stats is None:
+            return None
+
+    distinct = stats.get("distinct") or {}
+    owned_by_collection = distinct.get("by_collection") or {}
+    owned_by_rarity = distinct.get("by_rarity") or {}
+
+    collections = []
+    for collection in catalog.collections:
+        total = len(catalog.cards_by_collection.get(collection["_id"], []))
+        owned = int(owned_by_collection.get(collection["_id"], 0))
+        collections.append({
+            "id": collection["_id"],
+            "nombre": collection.get("nombre", ""),
+            "owned": owned,
+            "total": total,
+            "percent": _percent(owned, total),
+        })
+
+    rarities = {}
+    for rarity, cards in catalog.cards_by_rarity.items():
+        owned = int(owned_by_rarity.get(rarity, 0))
+        rarities[rarity] = {
+            "owned": owned,
+            "total": len(cards),
+            "percent": _percent(owned, len(cards)),
+        }
+
+    owned_total = int(distinct.get("total", 0))
+    return {
+        "version": stats["version"],
+        "catalog_version": catalog.version,
+        "owned": owned_total,
+        "total": len(catalog.cards),
+        "percent": _percent(owned_total, len(catalog.cards)),
+        "collections": collections,
+        "rarities": rarities,
+    }
@@ -2,19 +2,26 @@
 Cargador de configuración de juego desde YAML con hot-reload.
 
 Recarga automáticamente el fichero config/game_config.yaml cada CONFIG_TTL
-segundos sin necesidad de reiniciar la aplicación.
+segundos sin necesidad de reiniciar la aplicación. Al recargar, cada tipo de
+cofre se compila a una ``RarityDistribution`` para que el sorteo no tenga que
+recorrer las probabilidades en cada carta.
 """
 
+import hashlib
 import os
 import time
 import yaml
 import logging
 from typing import Any, Dict, List, Optional
 
+from app.utils.chest_draws import RarityDistribution
+
 logger = logging.getLogger(__name__)
 
 _config_cache: Optional[Dict[str, Any]] = None
 _config_timestamp: Optional[float] = None
+_compiled_samplers: Dict[str, RarityDistribution] = {}
+_config_version: str = "default"
 CONFIG_TTL: int = 60  # Segundos entre recargas automáticas
 
 _CONFIG_PATH: str = os.path.join(
@@ -25,8 +32,13 @@ _CONFIG_PATH: str = os.path.join(
 
 
 def _load_config() -> Dict[str, Any]:
-    """Carga el fichero YAML desde disco con caché TTL."""
-    global _config_cache, _config_timestamp
+    """Carga el fichero YAML desde disco con caché TTL.
+
+    En cada recarga se validan las probabilidades de ``chest_config`` y se
+    compilan los muestreadores de cada cofre. Si el YAML nuevo es inválido
+    se conserva la última configuración buena.
+    """
+    global _config_cache, _config_timestamp, _compiled_samplers, _config_version
     now = time.monotonic()
 
     if (
@@ -38,15 +50,27 @@ def _load_config() -> Dict[str, Any]:
 
     try:
         with open(_CONFIG_PATH, "r", encoding="utf-8") as f:
-            _config_cache = yaml.safe_load(f) or {}
+            raw = f.read()
+        new_config = yaml.safe_load(raw) or {}
+        _compiled_samplers = _compile_chest_samplers(new_config)
+        _config_cache = new_config
+        _config_version = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
         logger.info("Game config (re)loaded from %s", _CONFIG_PATH)
     except FileNotFoundError:
         logger.warning("Game config file not found at %s — using defaults", _CONFIG_PATH)
         _config_cache = {}
+        _compiled_samplers = _compile_chest_samplers(_config_cache)
+        _config_version = "default"
     except yaml.YAMLError as e:
         logger.error("Error parsing game config YAML: %s", e)
         if _config_cache is None:
             _config_cache = {}
+            _compiled_samplers = _compile_chest_samplers(_config_cache)
+    except ValueError as e:
+        logger.error("Invalid chest_config in game config, keeping previous: %s", e)
+        if _config_cache is None:
+            _config_cache = {}
+            _compiled_samplers = _compile_chest_samplers(_config_cache)
 
     _config_timestamp = now
     return _config_cache
@@ -57,6 +81,12 @@ def get_game_config() -> Dict[str, Any]:
     return _load_config()
 
 
+def get_game_config_version() -> str:
+    """Huella del YAML cargado (para ETags); ``default`` si no hay fichero."""
+    _load_config()
+    return _config_version
+
+
 def clear_game_config_cache() -> None:
     """Fuerza la recarga en la siguiente llamada."""
     global _config_cache, _config_timestamp
@@ -115,3 +145,53 @@ def get_chest_images() -> Dict[str, str]:
     """Mapa rareza -> ruta imagen cofre."""
     cfg = get_game_config()
     return cfg.get("chest_images", _DEFAULT_CHEST_IMAGES)
+
+
+def get_chest_sampler(chest_type: str) -> Optional[RarityDistribution]:
+    """Muestreador de rarezas precompilado para un tipo de cofre."""
+    _load_config()
+    return _compiled_samplers.get(chest_type)
+
+
+# ---------------------------------------------------------------------------
+# Validación y compilación de probabilidades
+# ---------------------------------------------------------------------------
+
+_PROBABILITY_TOLERANCE: float = 1e-6
+
+
+def _compile_chest_samplers(cfg: Dict[str, Any]) -> Dict[str, RarityDistribution]:
+    """Valida ``chest_config`` y compila una RarityDistribution por tipo de cofre.
+
+    Raises:
+        ValueError: si algún cofre tiene probabilidades que no suman 100,
+            no coinciden con ``card_rarities`` o un número de cartas inválido.
+    """
+    chest_cfg = cfg.get("chest_config", _DEFAULT_CHEST_CONFIG)
+    rarities = cfg.get("card_rarities", _DEFAULT_CARD_RARITIES)
+    if not isinstance(chest_cfg, dict) or not chest_cfg:
+        raise ValueError("chest_config debe ser un mapa no vacío")
+    if not isinstance(rarities, list) or not rarities:
+        raise ValueError("card_rarities debe ser una lista no vacía")
+
+    samplers: Dict[str, RarityDistribution] = {}
+    for chest_type, chest in chest_cfg.items():
+        if not isinstance(chest, dict):
+            raise ValueError(f"{chest_type}: configuración inválida")
+        cards = chest.get("cards")
+        if not isinstance(cards, int) or isinstance(cards, bool) or cards < 1:
+            raise ValueError(f"{chest_type}: 'cards' debe ser un entero positivo")
+        probabilities = chest.get("probabilities")
+        if not isinstance(probabilities, list) or len(probabilities) != len(rarities):
+            raise ValueError(
+                f"{chest_type}: se esperaban {len(rarities)} probabilidades "
+                f"(una por rareza)"
+            )
+        if any(not isinstance(p, (int, float)) or isinstance(p, bool) or p < 0
+               for p in probabilities):
+            raise ValueError(f"{chest_type}: probabilidades no numéricas o negativas")
+        total = sum(probabilities)
+        if abs(total - 100) > _PROBABILITY_TOLERANCE:
+            raise ValueError(f"{chest_type}: las probabilidades suman {total}, no 100")
+        samplers[chest_type] = RarityDistribution(rarities, probabilities)
+    return samplers
@@ -0,0 +1,44 @@
+"""
+GET condicionales (ETag / If-None-Match) para endpoints de solo lectura.
+
+El ETag se deriva de una versión barata de calcular (versión del catálogo,
+huella del YAML de juego), así que un ``304`` se responde sin ejecutar la
+vista ni serializar nada.
+"""
+
+from functools import wraps
+from typing import Callable
+
+from flask import make_response, request
+
+# Datos tras login: el navegador guarda copia pero revalida siempre con ETag
+PRIVATE_REVALIDATE = "private, no-cache"
+# Configuración pública que cambia como mucho cada CONFIG_TTL segundos
+PUBLIC_SHORT = "public, max-age=60"
+
+
+def etag_cached(scope: str, version_fn: Callable[[], object], cache_control: str) -> Callable:
+    """Decorador: ETag fuerte ``<scope>-<versión>`` y ``304`` si el cliente ya lo tiene.
+
+    Solo las respuestas ``200`` llevan ETag; los errores se devuelven tal cual.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = f"{scope}-{version_fn()}"
+
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers["Cache-Control"] = cache_control
+            return response
+
+        return wrapper
+
+    return decorator
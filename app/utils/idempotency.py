@@ -0,0 +1,141 @@
+"""
+Claves de idempotencia para endpoints que modifican inventario.
+
+Si la petición trae la cabecera ``Idempotency-Key`` se reserva un registro
+``{usuario}:{clave}`` en ``idempotency_keys`` antes de ejecutar la vista y se
+guarda su respuesta al terminar. Una repetición con la misma clave devuelve
+la respuesta almacenada sin volver a tocar el inventario. Los registros
+caducan con un índice TTL sobre ``created_at`` (IDEMPOTENCY_TTL segundos).
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+from flask import jsonify, make_response, request
+from flask_login import current_user
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL: int = 600  # Segundos que se conserva cada resultado
+_MAX_KEY_LENGTH = 128
+_MAX_CLAIM_ATTEMPTS = 3
+
+
+def _fingerprint(scope: str) -> str:
+    """Huella de la petición para detectar reutilización de clave con otro cuerpo."""
+    payload = request.get_json(silent=True)
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(f"{scope}:{raw}".encode()).hexdigest()
+
+
+def _is_expired(record: Dict[str, Any]) -> bool:
+    created_at: Optional[datetime] = record.get("created_at")
+    if created_at is None:
+        return True
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created_at > timedelta(seconds=IDEMPOTENCY_TTL)
+
+
+def _replay(record: Dict[str, Any]):
+    response = jsonify(record.get("body"))
+    response.status_code = record.get("status_code", 200)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _in_progress():
+    return jsonify({
+        "error": "La operación sigue en curso, inténtalo en unos segundos"
+    }), 409
+
+
+def idempotent(scope: str) -> Callable:
+    """Decorador para vistas JSON que acepta ``Idempotency-Key``.
+
+    Debe ir después de ``login_required``: la clave se aísla por usuario.
+    Sin cabecera la vista se ejecuta como siempre.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER, "").strip()
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > _MAX_KEY_LENGTH:
+                return jsonify({"error": "Idempotency-Key demasiado larga"}), 400
+
+            from app import mongo
+
+            record_id = f"{current_user.email}:{scope}:{key}"
+            fingerprint = _fingerprint(scope)
+
+            for _ in range(_MAX_CLAIM_ATTEMPTS):
+                try:
+                    mongo.idempotency_keys.insert_one({
+                        "_id": record_id,
+                        "fingerprint": fingerprint,
+                        "status": "pending",
+                        "created_at": datetime.now(timezone.utc),
+                    })
+                    break
+                except DuplicateKeyError:
+                    existing = mongo.idempotency_keys.find_one({"_id": record_id})
+                    if not existing:
+                        continue
+                    if _is_expired(existing):
+                        # El índice TTL aún no lo borró: se trata como clave nueva
+                        mongo.idempotency_keys.delete_one(
+                            {"_id": record_id, "created_at": existing["created_at"]}
+                        )
+                        continue
+                    if existing.get("fingerprint") != fingerprint:
+                        return jsonify({
+                            "error": "La Idempotency-Key ya se usó con otra petición"
+                        }), 422
+                    if existing.get("status") != "done":
+                        return _in_progress()
+                    return _replay(existing)
+            else:
+                # Otra petición con la misma clave la reserva una y otra vez
+                return _in_progress()
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                mongo.idempotency_keys.delete_one({"_id": record_id})
+                raise
+
+            if response.status_code >= 500 or not response.is_json:
+                # Errores del servidor no se memorizan: el reintento debe ejecutarse
+                mongo.idempotency_keys.delete_one({"_id": record_id})
+                return response
+
+            try:
+                mongo.idempotency_keys.update_one(
+                    {"_id": record_id},
+                    {"$set": {
+                        "status": "done",
+                        "status_code": response.status_code,
+                        "body": response.get_json(),
+                    }},
+                )
+            except Exception as e:
+                logger.error(f"Error storing idempotent result: {e}", exc_info=True)
+                # Un registro "pending" huérfano respondería 409 hasta que caduque
+                try:
+                    mongo.idempotency_keys.delete_one({"_id": record_id})
+                except Exception as e:
+                    logger.error(f"Error releasing idempotency key: {e}", exc_info=True)
+            return response
+
+        return wrapper
+
+    return decorator
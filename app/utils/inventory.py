@@ -0,0 +1,159 @@
+"""
+Punto único de escritura del inventario de cartas de un usuario.
+
+Toda alta o baja de cartas (apertura de cofres, recompensas de eventos,
+intercambios, resets de admin) pasa por ``apply_inventory_update``, que en la
+misma escritura incrementa ``users.inventory_version`` y después anota el
+cambio en ``inventory_log`` (``{email, version, server_id, added, removed}``).
+Con ese registro ``get_inventory_delta`` devuelve solo lo que cambió desde
+una versión dada; si el historial ya caducó o tiene huecos, el llamante
+recurre a una instantánea completa. Cada cambio se refleja también en las
+estadísticas de compleción (``app.utils.collection_stats``).
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.client_session import ClientSession
+
+from app.utils.collection_stats import record_inventory_change
+
+logger = logging.getLogger(__name__)
+
+VERSION_FIELD = "inventory_version"
+INVENTORY_LOG_TTL: int = 14 * 24 * 3600  # Segundos que se conserva el historial
+
+
+def version_guard(version: int) -> Dict[str, Any]:
+    """Filtro que casa solo si el usuario sigue en ``version`` (0 incluye "sin campo")."""
+    if version:
+        return {VERSION_FIELD: version}
+    return {VERSION_FIELD: {"$in": [0, None]}}
+
+
+def apply_inventory_update(
+    query: Dict[str, Any],
+    update: Dict[str, Any],
+    email: str,
+    server_id: Optional[str],
+    added: Optional[List[str]] = None,
+    removed: Optional[List[str]] = None,
+    reset: bool = False,
+    session: Optional[ClientSession] = None,
+) -> Optional[int]:
+    """Aplica ``update`` al usuario, sube su versión de inventario y anota el cambio.
+
+    Args:
+        query: Filtro del documento de usuario (incluye las guardas del llamante).
+        update: Operadores de actualización; se les añade el ``$inc`` de versión.
+        email: Email del usuario (clave del historial).
+        server_id: Guild afectado (None en un reset completo).
+        added: IDs de cartas añadidas (una entrada por copia).
+        removed: IDs de cartas retiradas (una entrada por copia).
+        reset: True si el cambio vacía inventarios (fuerza resincronización completa).
+        session: Sesión de la transacción en curso, si la hay. Con sesión,
+            un fallo al anotar el historial o las estadísticas se propaga
+            (la transacción ya está abortada); sin ella solo se registra.
+
+    Returns:
+        La nueva versión, o None si el filtro no casó.
+    """
+    from app import mongo
+
+    full_update = dict(update)
+    full_update["$inc"] = {**update.get("$inc", {}), VERSION_FIELD: 1}
+
+    user_doc = mongo.users.find_one_and_update(
+        query,
+        full_update,
+        projection={VERSION_FIELD: 1},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+    if not user_doc:
+        return None
+
+    version = int(user_doc.get(VERSION_FIELD, 0))
+    try:
+        mongo.inventory_log.insert_one(
+            {
+                "email": email,
+                "version": version,
+                "server_id": server_id,
+                "added": list(added or []),
+                "removed": list(removed or []),
+                "reset": reset,
+                "at": datetime.now(timezone.utc),
+            },
+            session=session,
+        )
+    except Exception as e:
+        if session is not None:
+            # Dentro de una transacción el error ya la abortó: que falle entera
+            raise
+        # Sin esta entrada el historial queda con un hueco: los clientes harán
+        # una sincronización completa, que sigue siendo correcta.
+        logger.error(f"Error logging inventory change for {email}: {e}", exc_info=True)
+
+    try:
+        record_inventory_change(email, version, added, removed, reset, session=session)
+    except Exception as e:
+        if session is not None:
+            raise
+        # Las estadísticas se quedan atrás y se reconstruyen en la próxima lectura
+        logger.error(f"Error updating collection stats for {email}: {e}", exc_info=True)
+    return version
+
+
+def push_cards(email: str, server_id: str, card_ids: List[str]) -> bool:
+    """Añade copias de cartas al guild ``server_id`` del usuario."""
+    version = apply_inventory_update(
+        {"email": email, "guilds.id": server_id},
+        {"$push": {"guilds.$.coleccionables": {"$each": list(card_ids)}}},
+        email,
+        server_id,
+        added=card_ids,
+    )
+    return version is not None
+
+
+def get_inventory_delta(email: str, since: int, current: int) -> Optional[Dict[str, Any]]:
+    """Cambios del inventario entre ``since`` (exclusivo) y ``current``.
+
+    Returns:
+        ``{"version", "added", "removed"}`` con conteos ``{guild: {card_id: n}}``,
+        o None si hace falta una instantánea completa (historial caducado,
+        huecos o un reset de por medio).
+    """
+    from app import mongo
+
+    if since == current:
+        return {"version": current, "added": {}, "removed": {}}
+    if since > current or since < 0:
+        return None
+
+    entries = mongo.inventory_log.find(
+        {"email": email, "version": {"$gt": since, "$lte": current}},
+        {"version": 1, "server_id": 1, "added": 1, "removed": 1, "reset": 1},
+    ).sort("version", 1)
+
+    added: Dict[str, Dict[str, int]] = {}
+    removed: Dict[str, Dict[str, int]] = {}
+    expected = since + 1
+    for entry in entries:
+        if entry["version"] != expected or entry.get("reset"):
+            return None
+        server_id = entry.get("server_id") or ""
+        for card_id in entry.get("added") or []:
+            by_card = added.setdefault(server_id, {})
+            by_card[card_id] = by_card.get(card_id, 0) + 1
+        for card_id in entry.get("removed") or []:
+            by_card = removed.setdefault(server_id, {})
+            by_card[card_id] = by_card.get(card_id, 0) + 1
+        expected += 1
+
+    if expected - 1 != current:
+        return None
+    return {"version": current, "added": added, "removed": removed}
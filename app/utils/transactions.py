@@ -0,0 +1,59 @@
+"""
+Transacciones multi-documento de MongoDB con detección de soporte.
+
+Las transacciones solo existen en replica sets y clústeres con ``mongos``;
+en un servidor standalone ``supports_transactions()`` devuelve False y el
+llamante usa su camino no transaccional.
+"""
+
+import logging
+import threading
+from typing import Callable, Optional, TypeVar
+
+from pymongo.client_session import ClientSession
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_supported: Optional[bool] = None
+_supported_lock = threading.Lock()
+
+
+def supports_transactions() -> bool:
+    """Indica si el despliegue de MongoDB admite transacciones (se consulta una vez)."""
+    global _supported
+    if _supported is not None:
+        return _supported
+
+    from app import mongo
+
+    with _supported_lock:
+        if _supported is None:
+            try:
+                hello = mongo.client.admin.command("hello")
+                _supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+            except Exception as e:
+                logger.warning(f"Could not detect MongoDB transaction support: {e}")
+                _supported = False
+            logger.info(f"MongoDB transactions supported: {_supported}")
+    return _supported
+
+
+def run_in_transaction(callback: Callable[[ClientSession], T]) -> T:
+    """Ejecuta ``callback(session)`` dentro de una transacción.
+
+    ``with_transaction`` reintenta el cuerpo ante ``TransientTransactionError``
+    y el commit ante ``UnknownTransactionCommitResult``. Cualquier otra
+    excepción del callback aborta la transacción y se propaga.
+    """
+    from app import mongo
+
+    with mongo.client.start_session() as session:
+        return session.with_transaction(
+            callback,
+            read_concern=ReadConcern("local"),
+            write_concern=WriteConcern("majority"),
+        )
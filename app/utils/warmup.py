@@ -0,0 +1,107 @@
+"""
+Precarga de cachés compartidas al arrancar (``create_app``).
+
+Con ``CACHE_WARMUP=1`` se lanzan en paralelo las cargas que no dependen del
+usuario (snapshot del catálogo, colecciones, ``images.json``,
+``game_config.yaml`` y la lista de servidores del bot) para que el primer
+usuario tras un arranque en frío no las pague. El arranque espera como mucho
+``CACHE_WARMUP_BUDGET`` segundos; lo que no termine a tiempo sigue en su hilo
+y se completa igualmente. La duración de cada tarea queda en
+``get_warmup_report()``.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED: bool = os.getenv("CACHE_WARMUP", "0") == "1"
+WARMUP_BUDGET: float = float(os.getenv("CACHE_WARMUP_BUDGET", "3"))
+
+_report: Dict[str, Any] = {}
+_report_lock = threading.Lock()
+
+
+def _warm_catalog() -> None:
+    from app.utils.catalog import get_catalog
+    get_catalog()
+
+
+def _warm_collections() -> None:
+    from app.routes.coleccion import get_all_collections
+    get_all_collections()
+
+
+def _warm_images() -> None:
+    from app.utils.images import get_images
+    get_images()
+
+
+def _warm_game_config() -> None:
+    from app.utils.game_config import get_game_config
+    get_game_config()
+
+
+def _warm_bot_servers() -> None:
+    from app.utils.bot_servers import get_bot_servers
+    get_bot_servers()
+
+
+WARMUP_TASKS: Dict[str, Callable[[], None]] = {
+    "catalog": _warm_catalog,
+    "collections": _warm_collections,
+    "images": _warm_images,
+    "game_config": _warm_game_config,
+    "bot_servers": _warm_bot_servers,
+}
+
+
+def _run_task(name: str, task: Callable[[], None]) -> None:
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        task()
+    except Exception as e:
+        status = "error"
+        logger.warning(f"Cache warm-up task {name} failed: {e}")
+    with _report_lock:
+        _report["tasks"][name] = {
+            "status": status,
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+
+def run_warmup(budget: Optional[float] = None) -> Dict[str, Any]:
+    """Ejecuta las tareas de precarga en paralelo esperando como mucho ``budget`` segundos."""
+    budget = WARMUP_BUDGET if budget is None else budget
+    start = time.perf_counter()
+    with _report_lock:
+        _report.clear()
+        _report.update({"budget": budget, "tasks": {}})
+
+    executor = ThreadPoolExecutor(max_workers=len(WARMUP_TASKS), thread_name_prefix="cache-warmup")
+    futures = [executor.submit(_run_task, name, task) for name, task in WARMUP_TASKS.items()]
+    wait(futures, timeout=budget)
+    # Las tareas pendientes terminan en segundo plano sin bloquear el arranque
+    executor.shutdown(wait=False)
+
+    report = get_warmup_report()
+    pending = [name for name in WARMUP_TASKS if name not in report["tasks"]]
+    with _report_lock:
+        _report["seconds"] = round(time.perf_counter() - start, 4)
+        _report["timed_out"] = pending
+    logger.info(
+        f"Cache warm-up finished in {_report['seconds']}s "
+        f"({len(WARMUP_TASKS) - len(pending)}/{len(WARMUP_TASKS)} tasks, pending: {pending or 'none'})"
+    )
+    return get_warmup_report()
+
+
+def get_warmup_report() -> Dict[str, Any]:
+    """Duración y estado de cada tarea de la última precarga (vacío si no se ejecutó)."""
+    with _report_lock:
+        return {**_report, "tasks": dict(_report.get("tasks", {}))}
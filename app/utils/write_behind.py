@@ -0,0 +1,227 @@
+"""
+Buffer write-behind para inserciones de logs (``opening_history``, ``chest_logs``).
+
+Las peticiones encolan el documento y vuelven sin esperar a MongoDB; un hilo
+en segundo plano vacía la cola con ``insert_many(ordered=False)`` cuando se
+acumulan WRITE_BEHIND_BATCH_SIZE documentos o pasan
+WRITE_BEHIND_FLUSH_INTERVAL segundos, y una última vez al salir del proceso.
+
+Si la cola está llena la inserción se hace de forma síncrona (backpressure
+visible en ``sync_fallbacks``). En Vercel el proceso se congela entre
+peticiones, así que allí el buffer viene desactivado por defecto y todo se
+escribe en el momento.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED: bool = os.getenv(
+    "WRITE_BEHIND_ENABLED", "0" if os.getenv("VERCEL") else "1"
+) == "1"
+WRITE_BEHIND_MAX_QUEUE: int = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "1000"))
+WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_INTERVAL: float = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "2"))
+
+
+class WriteBehindBuffer:
+    """Cola acotada de inserciones pendientes, agrupadas por colección al vaciarse."""
+
+    def __init__(
+        self,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+    ) -> None:
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stopped = False
+
+        self._stats: Dict[str, float] = {
+            "enqueued": 0,
+            "written": 0,
+            "failed": 0,
+            "sync_fallbacks": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+        }
+
+    # ─── API pública ─────────────────────────────────────────────────
+
+    def insert(self, collection: str, doc: Dict[str, Any]) -> None:
+        """Encola ``doc`` para ``collection``; escribe en el acto si la cola está llena."""
+        with self._cond:
+            if not self._stopped and len(self._queue) < self.max_queue:
+                self._queue.append((collection, doc))
+                self._stats["enqueued"] += 1
+                self._ensure_worker()
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify()
+                return
+            self._stats["sync_fallbacks"] += 1
+
+        self._write_sync(collection, doc)
+
+    def flush(self) -> int:
+        """Vacía la cola completa. Devuelve el número de documentos escritos."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    if not self._queue:
+                        break
+                    batch = [
+                        self._queue.popleft()
+                        for _ in range(min(self.batch_size, len(self._queue)))
+                    ]
+                written += self._write_batch(batch)
+        return written
+
+    def stop(self) -> None:
+        """Detiene el hilo y escribe lo pendiente (llamado en ``atexit``)."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Profundidad de la cola y latencias de vaciado."""
+        with self._cond:
+            depth = len(self._queue)
+            stats = dict(self._stats)
+        flushes = stats.pop("flushes")
+        total_ms = stats.pop("total_flush_ms")
+        return {
+            "enabled": True,
+            "queue_depth": depth,
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "flushes": int(flushes),
+            "avg_flush_ms": round(total_ms / flushes, 2) if flushes else 0.0,
+            "last_flush_ms": round(stats.pop("last_flush_ms"), 2),
+            "max_flush_ms": round(stats.pop("max_flush_ms"), 2),
+            **{key: int(value) for key, value in stats.items()},
+        }
+
+    # ─── Internos ────────────────────────────────────────────────────
+
+    def _ensure_worker(self) -> None:
+        """Arranca el hilo de vaciado la primera vez (llamar con ``_cond`` tomado)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(
+            target=self._run, name="write-behind", daemon=True
+        )
+        self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopped and len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}", exc_info=True)
+
+    def _write_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Escribe un lote agrupado por colección con ``insert_many(ordered=False)``."""
+        from app import mongo
+
+        by_collection: Dict[str, List[Dict[str, Any]]] = {}
+        for collection, doc in batch:
+            by_collection.setdefault(collection, []).append(doc)
+
+        started = time.perf_counter()
+        written = 0
+        failed = 0
+        for collection, docs in by_collection.items():
+            try:
+                mongo[collection].insert_many(docs, ordered=False)
+                written += len(docs)
+            except BulkWriteError as bwe:
+                inserted = bwe.details.get("nInserted", 0)
+                written += inserted
+                failed += len(docs) - inserted
+                logger.error(
+                    f"Write-behind partial failure on {collection}: "
+                    f"{len(docs) - inserted} of {len(docs)} documents not written"
+                )
+            except Exception as e:
+                failed += len(docs)
+                logger.error(
+                    f"Write-behind lost {len(docs)} documents for {collection}: {e}",
+                    exc_info=True,
+                )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._cond:
+            self._stats["written"] += written
+            self._stats["failed"] += failed
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["total_flush_ms"] += elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+        return written
+
+    def _write_sync(self, collection: str, doc: Dict[str, Any]) -> None:
+        from app import mongo
+
+        mongo[collection].insert_one(doc)
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def _get_buffer() -> WriteBehindBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = WriteBehindBuffer()
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def buffered_insert(collection: str, doc: Dict[str, Any]) -> None:
+    """Inserta ``doc`` en ``collection`` a través del buffer (o en el acto si está desactivado)."""
+    if not WRITE_BEHIND_ENABLED:
+        from app import mongo
+
+        mongo[collection].insert_one(doc)
+        return
+    _get_buffer().insert(collection, doc)
+
+
+def flush_write_behind() -> int:
+    """Fuerza el vaciado del buffer. Devuelve los documentos escritos."""
+    if _buffer is None:
+        return 0
+    return _buffer.flush()
+
+
+def get_write_behind_stats() -> Dict[str, Any]:
+    """Estadísticas del buffer para el panel de administración."""
+    if not WRITE_BEHIND_ENABLED:
+        return {"enabled": False}
+    return _get_buffer().get_stats()
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark: serializadores de caché sobre payloads realistas.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_cache_serializers
+
+No necesita MongoDB: genera la forma de ``get_all_users_cached`` (usuarios
+con sus guilds y arrays de ``coleccionables``) y de
+``get_user_collectibles_data`` (conteos por guild) y mide codificación,
+decodificación y bytes en disco escribiendo en un ``FileSystemCache``
+temporal, igual que con ``CACHE_TYPE=filesystem``. En la fila de pickle el
+coste de codificar va incluido en ``set``.
+"""
+
+import os
+import random
+import tempfile
+import timeit
+from typing import Any, Dict, List, Optional
+
+from flask_caching.backends.filesystemcache import FileSystemCache
+
+from app.utils.cache_serializers import CacheSerializer
+
+USERS: int = 2_000
+GUILDS_PER_USER: int = 3
+CARDS_PER_GUILD: int = 120
+CATALOG_SIZE: int = 600
+
+SERIALIZERS: Dict[str, Optional[CacheSerializer]] = {
+    "pickle (actual)": None,
+    "pickle+zlib": CacheSerializer("pickle", "zlib"),
+    "marshal": CacheSerializer("marshal", None),
+    "marshal+zlib": CacheSerializer("marshal", "zlib"),
+    "marshal+zstd": CacheSerializer("marshal", "zstd"),
+    "msgpack+zstd": CacheSerializer("msgpack", "zstd"),
+}
+
+
+def _card_ids() -> List[str]:
+    return [f"{random.getrandbits(96):024x}" for _ in range(CATALOG_SIZE)]
+
+
+def build_users_payload(card_ids: List[str]) -> List[Dict[str, Any]]:
+    users = []
+    for i in range(USERS):
+        users.append({
+            "_id": f"{random.getrandbits(96):024x}",
+            "username": f"usuario{i}",
+            "email": f"usuario{i}@example.com",
+            "is_admin": i == 0,
+            "chest_total": random.randint(0, 40),
+            "chest_counts": {"1234567890": {"comun": 3, "rara": 1}},
+            "guilds": [
+                {
+                    "id": str(100000000000000000 + g),
+                    "name": f"Servidor {g}",
+                    "icon": f"https://cdn.discordapp.com/icons/{g}/abcdef.png",
+                    "coleccionables": random.choices(card_ids, k=CARDS_PER_GUILD),
+                }
+                for g in range(GUILDS_PER_USER)
+            ],
+        })
+    return users
+
+
+def build_collectibles_payload(card_ids: List[str]) -> Dict[str, Any]:
+    guilds = []
+    for g in range(GUILDS_PER_USER):
+        counts: Dict[str, int] = {}
+        for card_id in random.choices(card_ids, k=CARDS_PER_GUILD * 4):
+            counts[card_id] = counts.get(card_id, 0) + 1
+        guilds.append({
+            "id": str(100000000000000000 + g),
+            "name": f"Servidor {g}",
+            "icon": "",
+            "counts": counts,
+            "collectables_count": sum(counts.values()),
+        })
+    return {"version": 42, "guilds": guilds}
+
+
+def _bench(payload: Any, serializer: Optional[CacheSerializer], cache_dir: str) -> Dict[str, float]:
+    stored = serializer.encode(payload) if serializer else payload
+    encode = min(timeit.repeat(
+        lambda: serializer.encode(payload) if serializer else None,
+        number=3, repeat=3,
+    )) / 3 if serializer else 0.0
+
+    backend = FileSystemCache(cache_dir, threshold=0)
+    backend.set("payload", stored)
+    path = backend._get_filename("payload")
+    disk_bytes = os.path.getsize(path)
+
+    def roundtrip() -> Any:
+        value = backend.get("payload")
+        # Decodificar desde cero, como tras leer de disco en otro proceso
+        return value.decode() if serializer else value
+
+    write = min(timeit.repeat(lambda: backend.set("payload", stored), number=3, repeat=3)) / 3
+    read = min(timeit.repeat(roundtrip, number=3, repeat=3)) / 3
+    return {"encode": encode, "write": write, "read": read, "bytes": disk_bytes}
+
+
+def main() -> None:
+    random.seed(7)
+    card_ids = _card_ids()
+    payloads = {
+        "get_all_users_cached": build_users_payload(card_ids),
+        "get_user_collectibles_data": build_collectibles_payload(card_ids),
+    }
+
+    for payload_name, payload in payloads.items():
+        print(f"\n{payload_name}")
+        print(f"{'serializador':>16} | {'codificar (ms)':>14} | {'set (ms)':>9} | {'get+decode (ms)':>15} | {'KiB en disco':>12}")
+        print("-" * 80)
+        baseline = None
+        measured = set()
+        for name, serializer in SERIALIZERS.items():
+            if serializer is not None:
+                # Sin msgpack/zstandard instalados el serializador cae a pickle/zlib
+                name = "+".join(filter(None, (serializer.codec, serializer.compression)))
+                if name in measured:
+                    continue
+            measured.add(name)
+            with tempfile.TemporaryDirectory() as cache_dir:
+                result = _bench(payload, serializer, cache_dir)
+            baseline = baseline or result["bytes"]
+            print(
+                f"{name:>16} | {result['encode'] * 1000:>14.2f} | {result['write'] * 1000:>9.2f} | "
+                f"{result['read'] * 1000:>15.2f} | {result['bytes'] / 1024:>9.1f} "
+                f"({result['bytes'] / baseline:.0%})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: sorteo clásico carta a carta frente al motor por lotes.
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_chest_draws
+
+No necesita MongoDB: usa un pool sintético con el mismo tamaño aproximado
+que el catálogo real y la configuración de cofres de config/game_config.yaml.
+"""
+
+import random
+import timeit
+from typing import Any, Dict, List, Sequence
+
+from app.utils.chest_draws import draw_cards_bulk
+from app.utils.game_config import get_card_rarities, get_chest_config, get_chest_sampler
+
+CHEST_COUNTS: List[int] = [1, 10, 100, 10_000]
+CARDS_PER_RARITY: int = 40
+
+
+def _build_pool(rarities: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+    return {
+        rarity: [
+            {"_id": f"{rarity}-{i:04d}", "nombre": f"Carta {i}", "rareza": rarity}
+            for i in range(CARDS_PER_RARITY)
+        ]
+        for rarity in rarities
+    }
+
+
+def legacy_draw(
+    pool: Dict[str, List[Dict[str, Any]]],
+    rarities: Sequence[str],
+    probabilities: Sequence[float],
+    total_cards: int,
+) -> List[Dict[str, Any]]:
+    """Réplica del bucle original: un uniform + recorrido acumulado por carta."""
+    cards: List[Dict[str, Any]] = []
+    for _ in range(total_cards):
+        roll = random.uniform(0, 100)
+        cumulative = 0.0
+        selected_rarity = rarities[-1] if rarities else "comun"
+        for rarity, prob in zip(rarities, probabilities):
+            cumulative += prob
+            if roll <= cumulative:
+                selected_rarity = rarity
+                break
+        cards.append(dict(random.choice(pool[selected_rarity])))
+    return cards
+
+
+def main() -> None:
+    rarities = get_card_rarities()
+    config = get_chest_config()["legendaria"]
+    sampler = get_chest_sampler("legendaria")
+    pool = _build_pool(rarities)
+
+    print(f"Cofre legendario: {config['cards']} cartas, probabilidades {config['probabilities']}")
+    print(f"{'cofres':>8} | {'clásico (ms)':>13} | {'lotes (ms)':>11} | {'speedup':>8}")
+    print("-" * 50)
+    for chests in CHEST_COUNTS:
+        total = config["cards"] * chests
+        number = max(1, 2_000 // chests)
+
+        legacy = min(timeit.repeat(
+            lambda: legacy_draw(pool, rarities, config["probabilities"], total),
+            number=number, repeat=5,
+        )) / number
+        bulk = min(timeit.repeat(
+            lambda: draw_cards_bulk(pool, sampler, total),
+            number=number, repeat=5,
+        )) / number
+
+        print(
+            f"{chests:>8} | {legacy * 1000:>13.3f} | {bulk * 1000:>11.3f} | "
+            f"{legacy / bulk if bulk else float('inf'):>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Fixtures comunes: la aplicación real sobre un MongoDB en memoria (mongomock).
+
+mongomock aplica cada escritura como lectura + modificación sin bloqueo;
+MongoDB garantiza que una escritura sobre un documento es atómica. Para que
+las pruebas de concurrencia midan el código de la aplicación y no esa
+carencia del simulador, las escrituras se serializan con un lock.
+
+``update_one`` y ``find_one_and_update`` de mongomock no resuelven el
+operador posicional (``guilds.$``) cuando el filtro combina el array con
+otros campos; se resuelve aquí con el índice del elemento que casa, como
+haría el servidor.
+"""
+
+import os
+import threading
+
+import mongomock
+import pytest
+from mongomock import collection as mongomock_collection
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("WRITE_BEHIND_ENABLED", "0")
+
+_write_lock = threading.RLock()
+
+
+def _atomic(method):
+    def wrapper(self, *args, **kwargs):
+        kwargs.pop("session", None)
+        with _write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _resolve_positional(collection, filter, update):
+    """Sustituye ``<array>.$`` por el índice del primer elemento que casa con ``filter``."""
+    if not any(".$." in key for spec in update.values() if isinstance(spec, dict) for key in spec):
+        return filter, update
+    doc = collection.find_one(filter)
+    if doc is None:
+        return filter, update
+    for key, expected in filter.items():
+        array, _, field = key.partition(".")
+        if field and isinstance(doc.get(array), list):
+            index = next(i for i, item in enumerate(doc[array]) if item.get(field) == expected)
+            update = {
+                op: {k.replace(f"{array}.$.", f"{array}.{index}."): v for k, v in spec.items()}
+                for op, spec in update.items()
+            }
+            return dict(filter, _id=doc["_id"]), update
+    return filter, update
+
+
+def _positional(method):
+    def wrapper(self, filter, update, *args, **kwargs):
+        filter, update = _resolve_positional(self, filter, update)
+        return method(self, filter, update, *args, **kwargs)
+    return wrapper
+
+
+_Collection = mongomock_collection.Collection
+_Collection.update_one = _positional(_Collection.update_one)
+_Collection.find_one_and_update = _positional(_Collection.find_one_and_update)
+for _name in ("insert_one", "insert_many", "update_one", "update_many", "find_one_and_update", "delete_one"):
+    setattr(_Collection, _name, _atomic(getattr(_Collection, _name)))
+
+
+@pytest.fixture(scope="session")
+def mongo_client():
+    # Uno por sesión: las rutas importan ``mongo`` a nivel de módulo una sola vez
+    return mongomock.MongoClient()
+
+
+@pytest.fixture
+def app(monkeypatch, mongo_client):
+    import app as app_pkg
+    from app.utils import catalog, chest_registry, transactions
+
+    monkeypatch.setattr(app_pkg, "MongoClient", lambda uri: mongo_client)
+    # Cada prueba empieza con la base vacía: descartar el estado en proceso de la anterior
+    monkeypatch.setattr(catalog, "_snapshot", None)
+    monkeypatch.setattr(chest_registry, "_registry", {})
+    monkeypatch.setattr(chest_registry, "_by_type", {})
+    monkeypatch.setattr(chest_registry, "_loaded", False)
+    # mongomock es un servidor standalone: camino sin transacciones
+    monkeypatch.setattr(transactions, "_supported", False)
+    flask_app = app_pkg.create_app()
+    flask_app.config["TESTING"] = True
+    yield flask_app
+    app_pkg.cache.clear()
+    mongo_client.drop_database("tnglore")
+
+
+@pytest.fixture
+def db(app):
+    import app as app_pkg
+    return app_pkg.mongo
@@ -0,0 +1,105 @@
+"""Backends de caché propios: ``TieredCache`` y ``BoundedMemoryCache``."""
+
+import pickle
+import threading
+import time
+
+import pytest
+from flask_caching.backends.filesystemcache import FileSystemCache
+
+from app.utils.cache_backends import BoundedMemoryCache, TieredCache
+
+
+class CountingFileSystemCache(FileSystemCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reads = 0
+
+    def get(self, key):
+        self.reads += 1
+        return super().get(key)
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path)
+
+
+def test_l1_hits_do_not_read_l2(cache_dir):
+    l2 = CountingFileSystemCache(cache_dir)
+    cache = TieredCache(l2, sync_interval=3600)
+    cache.set("tag-gen:user:a", "g1", timeout=0)
+    cache.set("fn_memver", "v1", timeout=0)
+    cache.set("fn.v1.g1", {"value": 1})
+    cache._last_sync = float("inf")  # Sin sincronizaciones durante la medida
+    l2.reads = 0
+
+    for _ in range(100):
+        assert cache.get_many("fn_memver", "tag-gen:user:a") == ["v1", "g1"]
+        assert cache.get("fn.v1.g1") == {"value": 1}
+
+    assert l2.reads == 0
+
+
+def test_control_keys_revalidated_across_processes(cache_dir):
+    worker_a = TieredCache(FileSystemCache(cache_dir), sync_interval=0)
+    worker_b = TieredCache(FileSystemCache(cache_dir), sync_interval=0)
+    worker_a.set("tag-gen:user:a", "g1", timeout=0)
+    worker_a.set("fn.g1", "cached")
+    assert worker_b.get("tag-gen:user:a") == "g1"
+    assert worker_b.get("fn.g1") == "cached"
+
+    worker_a.set("tag-gen:user:a", "g2", timeout=0)
+
+    assert worker_b.get("tag-gen:user:a") == "g2"
+    # La entrada dependiente sigue en la L1 de B pero ya nadie la pide
+    assert worker_b.get_stats()["l1_entries"] == 2
+
+
+def test_delete_is_seen_by_other_processes(cache_dir):
+    worker_a = TieredCache(FileSystemCache(cache_dir), sync_interval=0)
+    worker_b = TieredCache(FileSystemCache(cache_dir), sync_interval=0)
+    worker_a.set("key", "old")
+    assert worker_b.get("key") == "old"
+
+    worker_a.delete("key")
+
+    assert worker_b.get("key") is None
+
+
+def test_bounded_cache_evicts_least_recently_used_of_the_group():
+    backend = BoundedMemoryCache(max_bytes=1024 * 1024)
+    entry_size = len(pickle.dumps("x" * 100, protocol=pickle.HIGHEST_PROTOCOL)) + 2 + backend.ENTRY_OVERHEAD
+    backend.set("o1", "x" * 100, group="other")
+    for key in ("g1", "g2", "g3"):
+        backend.set(key, "x" * 100, group="g", group_max_bytes=3 * entry_size)
+    backend.get("g1")
+    backend.set("g4", "x" * 100, group="g")
+
+    assert backend.has("g1") and not backend.has("g2")
+    assert backend.has("g3") and backend.has("g4") and backend.has("o1")
+    assert backend.get_stats()["evictions"] == 1
+
+
+class SlowToPickle:
+    def __reduce__(self):
+        time.sleep(0.01)
+        return (str, ("slow",))
+
+
+def test_bounded_cache_add_is_atomic():
+    backend = BoundedMemoryCache()
+    barrier = threading.Barrier(16)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(backend.add("lock", SlowToPickle()))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
@@ -0,0 +1,30 @@
+"""Métricas de caché y su exposición en formato Prometheus."""
+
+from app.utils import cache_metrics as metrics_module
+from app.utils.cache_metrics import CacheMetrics, render_prometheus
+
+
+def test_compute_without_serializer_does_not_measure_payload(monkeypatch):
+    def fail(value):
+        raise AssertionError("payload_size no debe llamarse por defecto")
+
+    monkeypatch.setattr(metrics_module, "payload_size", fail)
+    metrics = CacheMetrics()
+    metrics.observe_compute("fn", 0.5, {"big": "x" * 1000})
+    metrics.observe_compute("fn", 0.1, {"big": "x"}, size=42)
+
+    data = metrics.snapshot()["functions"]["fn"]
+    assert data["computes"] == 2
+    assert data["payload_bytes_last"] == 42
+
+
+def test_compute_seconds_exported_as_summary():
+    metrics = CacheMetrics()
+    metrics.observe_compute("fn", 0.25, None, size=0)
+    text = render_prometheus(metrics.snapshot(), {}, {})
+
+    assert "# TYPE tnglore_cache_compute_seconds summary" in text
+    assert 'tnglore_cache_compute_seconds_sum{function="fn"} 0.25' in text
+    assert 'tnglore_cache_compute_seconds_count{function="fn"} 1' in text
+    assert "# TYPE tnglore_cache_compute_seconds_sum" not in text
+    assert "# TYPE tnglore_cache_compute_seconds_count" not in text
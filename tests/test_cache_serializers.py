@@ -0,0 +1,38 @@
+"""``safe_memoize`` con serializador: lo que llega al backend va codificado."""
+
+from app.utils.cache_serializers import EncodedValue
+
+
+def test_serializer_applies_with_soft_ttl(app):
+    from app import cache
+    from app.utils.cache_manager import _StaleEntry, safe_memoize
+
+    payload = [{"email": f"user{i}@example.com", "guilds": ["g1"] * 20} for i in range(100)]
+
+    with app.app_context():
+        @safe_memoize(timeout=60, soft_ttl=30, serializer="pickle+zlib")
+        def users():
+            return payload
+
+        assert users() == payload
+        stored = cache.get(users._make_cache_key())
+
+    assert isinstance(stored, _StaleEntry)
+    assert isinstance(stored.value, EncodedValue)
+    assert stored.value.compression == "zlib"
+    assert stored.value.decode() == payload
+
+
+def test_serializer_roundtrip_without_soft_ttl(app):
+    from app import cache
+    from app.utils.cache_manager import safe_memoize
+
+    with app.app_context():
+        @safe_memoize(timeout=60, serializer="marshal")
+        def data():
+            return {"a": [1, 2, 3]}
+
+        assert data() == {"a": [1, 2, 3]}
+        stored = cache.get(data._make_cache_key())
+        assert isinstance(stored, EncodedValue)
+        assert data() == {"a": [1, 2, 3]}
@@ -0,0 +1,93 @@
+"""Aperturas de cofres concurrentes de un mismo usuario."""
+
+import threading
+import time
+
+import pytest
+
+RARITIES = ("comun", "rara", "epica", "legendaria")
+SERVER = "g1"
+EMAIL = "player@example.com"
+
+
+@pytest.fixture
+def player(app, db):
+    from app.utils.catalog import bump_catalog_version
+
+    collection_id = db.collections.insert_one({"nombre": "Base"}).inserted_id
+    db.collectables.insert_many([
+        {"nombre": f"{rarity}{i}", "rareza": rarity, "coleccion": collection_id}
+        for rarity in RARITIES
+        for i in range(3)
+    ])
+    bump_catalog_version()
+    db.users.insert_one({
+        "username": "player",
+        "email": EMAIL,
+        "guilds": [{"id": SERVER, "name": "G1", "coleccionables": []}],
+    })
+    return EMAIL
+
+
+@pytest.mark.parametrize("stock, openers", [(5, 20), (1, 8)])
+def test_parallel_opens_never_exceed_stock(app, db, player, monkeypatch, stock, openers):
+    from app.routes import chests
+    from app.utils.game_config import get_chest_config
+
+    # Abrir la ventana entre leer el inventario y escribir, como con latencia real
+    draw = chests._draw_cards_for_chests
+
+    def slow_draw(*args, **kwargs):
+        result = draw(*args, **kwargs)
+        time.sleep(0.02)
+        return result
+
+    monkeypatch.setattr(chests, "_draw_cards_for_chests", slow_draw)
+
+    db.users.update_one({"email": player}, {"$set": {"chest_counts": {SERVER: {"legendaria": stock}}}})
+    cards_per_chest = get_chest_config()["legendaria"]["cards"]
+
+    start = threading.Barrier(openers)
+    results = []
+    results_lock = threading.Lock()
+
+    def open_one():
+        start.wait()
+        result = chests._open_chests_sync(player, "legendaria", SERVER, quantity=1)
+        with results_lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=open_one) for _ in range(openers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    opened = [r for r in results if "results" in r]
+    assert len(results) == openers
+    assert len(opened) == stock
+    assert sum(r["results"]["chests_opened"] for r in opened) == stock
+
+    user = db.users.find_one({"email": player})
+    counts = user["chest_counts"][SERVER]
+    assert counts["legendaria"] == 0
+    assert all(amount >= 0 for amount in counts.values())
+    assert len(user["guilds"][0]["coleccionables"]) == stock * cards_per_chest
+    assert user["inventory_version"] == stock
+
+
+def test_transactional_open_fails_when_inventory_log_write_fails(app, db, player, monkeypatch):
+    from app.routes import chests
+
+    db.users.update_one({"email": player}, {"$set": {"chest_counts": {SERVER: {"legendaria": 1}}}})
+    monkeypatch.setattr(chests, "supports_transactions", lambda: True)
+    monkeypatch.setattr(chests, "run_in_transaction", lambda callback: callback(object()))
+
+    def broken_insert(*args, **kwargs):
+        raise RuntimeError("transaction aborted")
+
+    monkeypatch.setattr(db.inventory_log, "insert_one", broken_insert)
+
+    result = chests._open_chests_sync(player, "legendaria", SERVER, quantity=1)
+
+    assert "error" in result
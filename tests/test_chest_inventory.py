@@ -0,0 +1,26 @@
+"""Plegado del array legado ``chests`` en ``chest_counts``."""
+
+from bson import ObjectId
+
+
+def test_fold_keeps_unresolved_legacy_chests(app, db):
+    from app.utils.chest_inventory import fold_legacy_chests
+
+    known = str(db.chests.insert_one({"rarity": "rara", "servidor": "g1"}).inserted_id)
+    unknown = str(ObjectId())
+    user_id = db.users.insert_one({
+        "email": "legacy@example.com",
+        "chests": [known, unknown, known],
+    }).inserted_id
+
+    assert fold_legacy_chests({"_id": user_id}) is False
+
+    user = db.users.find_one({"_id": user_id})
+    assert user["chests"] == [unknown]
+    assert user["chest_counts"] == {"g1": {"rara": 2}}
+
+    # Un segundo plegado no vuelve a sumar ni toca el ID desconocido
+    assert fold_legacy_chests({"_id": user_id}) is False
+    user = db.users.find_one({"_id": user_id})
+    assert user["chests"] == [unknown]
+    assert user["chest_counts"] == {"g1": {"rara": 2}}
@@ -0,0 +1,71 @@
+"""Estadísticas de compleción incrementales frente a la reconstrucción completa."""
+
+import pytest
+
+EMAIL = "collector@example.com"
+SERVER = "g1"
+
+
+@pytest.fixture
+def card_ids(app, db):
+    from app.utils.catalog import bump_catalog_version
+
+    collection_id = db.collections.insert_one({"nombre": "Base"}).inserted_id
+    ids = db.collectables.insert_many([
+        {"nombre": f"carta{i}", "rareza": rarity, "coleccion": collection_id}
+        for i, rarity in enumerate(("comun", "comun", "rara", "epica"))
+    ]).inserted_ids
+    bump_catalog_version()
+    db.users.insert_one({
+        "email": EMAIL,
+        "username": "collector",
+        "guilds": [{"id": SERVER, "name": "G1", "coleccionables": []}],
+    })
+    return [str(card_id) for card_id in ids]
+
+
+def _distinct(db):
+    return db.collection_stats.find_one({"_id": EMAIL})["distinct"]
+
+
+def _nonzero(distinct):
+    return {
+        "total": distinct["total"],
+        "by_collection": {k: v for k, v in distinct["by_collection"].items() if v},
+        "by_rarity": {k: v for k, v in distinct["by_rarity"].items() if v},
+    }
+
+
+def test_incremental_changes_match_rebuild(db, card_ids):
+    from app.utils.collection_stats import get_collection_stats, rebuild_collection_stats
+    from app.routes.tradeo import _remove_single_card_from_user
+    from app.utils.inventory import push_cards
+
+    get_collection_stats(EMAIL)  # Documento inicial en la versión 0
+    push_cards(EMAIL, SERVER, [card_ids[0], card_ids[0], card_ids[2]])
+    push_cards(EMAIL, SERVER, [card_ids[3]])
+    assert _remove_single_card_from_user(EMAIL, card_ids[3], SERVER)
+
+    incremental = db.collection_stats.find_one({"_id": EMAIL})
+    assert incremental["version"] == 3
+    assert _distinct(db)["total"] == 2
+
+    rebuilt = rebuild_collection_stats(EMAIL)
+    assert _nonzero(incremental["distinct"]) == _nonzero(rebuilt["distinct"])
+
+
+def test_change_not_applied_leaves_old_version_for_rebuild(db, card_ids):
+    from app.utils.collection_stats import get_collection_stats, record_inventory_change
+
+    get_collection_stats(EMAIL)
+    db.users.update_one(
+        {"email": EMAIL},
+        {"$push": {"guilds.0.coleccionables": card_ids[1]}, "$set": {"inventory_version": 1}},
+    )
+    # Un cambio que no corresponde a la versión guardada no toca nada
+    record_inventory_change(EMAIL, 5, added=[card_ids[1]])
+    assert db.collection_stats.find_one({"_id": EMAIL})["version"] == 0
+
+    stats = get_collection_stats(EMAIL)
+    assert stats["version"] == 1
+    assert stats["owned"] == 1
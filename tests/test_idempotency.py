@@ -0,0 +1,71 @@
+"""Decorador ``idempotent`` sobre vistas JSON."""
+
+from types import SimpleNamespace
+
+from flask import jsonify
+
+HEADERS = {"Idempotency-Key": "k1"}
+
+
+def _view(calls):
+    from app.utils.idempotency import idempotent
+
+    @idempotent("test")
+    def view():
+        calls.append(1)
+        return jsonify({"ok": True})
+
+    return view
+
+
+def test_replays_stored_result(app, db, monkeypatch):
+    from app.utils import idempotency
+
+    monkeypatch.setattr(idempotency, "current_user", SimpleNamespace(email="a@example.com"))
+    calls = []
+    view = _view(calls)
+    for _ in range(2):
+        with app.test_request_context(json={"n": 1}, headers=HEADERS):
+            response = view()
+    assert calls == [1]
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_failed_store_releases_key(app, db, monkeypatch):
+    from app.utils import idempotency
+
+    monkeypatch.setattr(idempotency, "current_user", SimpleNamespace(email="a@example.com"))
+
+    def broken_update(*args, **kwargs):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(db.idempotency_keys, "update_one", broken_update)
+    calls = []
+    view = _view(calls)
+    with app.test_request_context(json={"n": 1}, headers=HEADERS):
+        assert view().status_code == 200
+    assert db.idempotency_keys.count_documents({}) == 0
+
+    # Sin registro "pending" huérfano el reintento se ejecuta en vez de dar 409
+    with app.test_request_context(json={"n": 1}, headers=HEADERS):
+        assert view().status_code == 200
+    assert calls == [1, 1]
+
+
+def test_claim_retries_are_bounded(app, db, monkeypatch):
+    from pymongo.errors import DuplicateKeyError
+
+    from app.utils import idempotency
+
+    monkeypatch.setattr(idempotency, "current_user", SimpleNamespace(email="a@example.com"))
+
+    def always_taken(*args, **kwargs):
+        raise DuplicateKeyError("taken")
+
+    monkeypatch.setattr(db.idempotency_keys, "insert_one", always_taken)
+    calls = []
+    view = _view(calls)
+    with app.test_request_context(json={"n": 1}, headers=HEADERS):
+        _, status = view()
+    assert status == 409
+    assert calls == []
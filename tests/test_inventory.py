@@ -0,0 +1,78 @@
+"""Escrituras de inventario que reescriben arrays: protegidas por la versión."""
+
+import pytest
+
+EMAIL = "trader@example.com"
+SERVER = "g1"
+
+
+@pytest.fixture
+def trader(app, db):
+    db.users.insert_one({
+        "username": "trader",
+        "email": EMAIL,
+        "discord_id": "42",
+        "guilds": [
+            {"id": SERVER, "name": "G1", "coleccionables": ["a", "b"]},
+            {"id": "g2", "name": "G2", "coleccionables": ["c"]},
+        ],
+    })
+    return db.users.find_one({"email": EMAIL})
+
+
+def _log_replay(db):
+    """Conteos por guild reconstruidos solo desde ``inventory_log``."""
+    counts = {}
+    for entry in db.inventory_log.find({"email": EMAIL}).sort("version", 1):
+        by_card = counts.setdefault(entry["server_id"], {})
+        for card_id in entry["added"]:
+            by_card[card_id] = by_card.get(card_id, 0) + 1
+        for card_id in entry["removed"]:
+            by_card[card_id] = by_card.get(card_id, 0) - 1
+    return counts
+
+
+def test_remove_retries_instead_of_overwriting_concurrent_grant(db, trader, monkeypatch):
+    from app.routes import tradeo
+    from app.utils.inventory import push_cards
+
+    real_apply = tradeo.apply_inventory_update
+    raced = []
+
+    def apply_after_concurrent_grant(*args, **kwargs):
+        if not raced:
+            raced.append(True)
+            push_cards(EMAIL, SERVER, ["z"])  # Entra entre la lectura y la escritura
+        return real_apply(*args, **kwargs)
+
+    monkeypatch.setattr(tradeo, "apply_inventory_update", apply_after_concurrent_grant)
+
+    assert tradeo._remove_single_card_from_user(EMAIL, "a", SERVER)
+
+    user = db.users.find_one({"email": EMAIL})
+    assert sorted(user["guilds"][0]["coleccionables"]) == ["b", "z"]
+    assert user["inventory_version"] == 2
+    assert _log_replay(db)[SERVER] == {"z": 1, "a": -1}
+
+
+def test_discord_sync_keeps_cards_and_bumps_version(db, trader):
+    from app.models.user import User
+    from app.routes.auth import _sync_discord_guilds
+
+    user = User.get_by_email(EMAIL)
+    db.users.update_one({"email": EMAIL}, {"$push": {"guilds.0.coleccionables": "late"}})
+    discord_user = {"id": "42", "avatar": None}
+    guilds = [
+        {"id": SERVER, "name": "G1 renamed", "icon": None, "owner": False,
+         "permissions": 0, "permissions_new": "0"},
+    ]
+
+    assert _sync_discord_guilds(user, discord_user, guilds)
+
+    stored = db.users.find_one({"email": EMAIL})
+    assert [g["id"] for g in stored["guilds"]] == [SERVER]
+    assert stored["guilds"][0]["name"] == "G1 renamed"
+    assert stored["guilds"][0]["coleccionables"] == ["a", "b", "late"]
+    assert stored["inventory_version"] == 1
+    # Dejó g2 con una carta: el historial marca un reset
+    assert db.inventory_log.find_one({"email": EMAIL, "version": 1})["reset"] is True
@@ -0,0 +1,25 @@
+"""Vistas de ``app/routes/main.py``."""
+
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def test_cofres_log_lists_chests_without_rarity_as_unknown(app, db):
+    from app.routes.main import cofres_log
+
+    known = db.chests.insert_one({"rarity": "epica", "servidor": "g1"}).inserted_id
+    no_servidor = db.chests.insert_one({"rarity": "rara"}).inserted_id
+    db.users.insert_one({"username": "player", "email": "p@example.com", "pfp": "p.png"})
+    db.chest_logs.insert_many([
+        {"username": "player", "chest_id": known, "date": datetime(2026, 1, 3)},
+        {"username": "player", "chest_id": no_servidor, "date": datetime(2026, 1, 2)},
+        {"username": "player", "chest_id": str(ObjectId()), "date": datetime(2026, 1, 1)},
+        {"username": "player", "date": datetime(2025, 12, 31)},
+    ])
+
+    with app.test_request_context("/api/cofres-log"):
+        response = cofres_log.__wrapped__()
+
+    rarities = [log["chest"]["rareza"] for log in response.get_json()]
+    assert rarities == ["epica", "Desconocida", "Desconocida", "Desconocida"]